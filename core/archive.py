@@ -0,0 +1,258 @@
+import os
+import sqlite3
+import time
+import zipfile
+
+from .config import Config
+from .db_files import remove_db
+from .lock import db_lock
+
+
+ZIP_METHODS = {
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+# Допустимые уровни сжатия (формат архива, метод). zipfile не передаёт
+# уровень в lzma, поэтому для zip с lzma уровень не задаётся.
+ZIP_LEVELS = {
+    ('zip', 'deflate'): range(0, 10),
+    ('zip', 'bzip2'): range(1, 10),
+    ('columnar', 'deflate'): range(0, 10),
+    ('columnar', 'bzip2'): range(1, 10),
+    ('columnar', 'lzma'): range(0, 10),
+}
+
+
+def check_zip_level(
+    method: str, level: int | None, archive_format: str = 'zip'
+):
+    """ValueError, если уровень сжатия не подходит методу и формату."""
+    if level is None:
+        return
+    levels = ZIP_LEVELS.get((archive_format, method))
+    if levels is None:
+        raise ValueError(
+            f'Метод {method} в формате {archive_format} не поддерживает '
+            'уровень сжатия')
+    if level not in levels:
+        raise ValueError(
+            f'Уровень сжатия {method}: {levels.start}-{levels.stop - 1}, '
+            f'указан {level}')
+
+
+def checkpoint_db(db_path: str):
+    """
+    Переносит содержимое WAL в основной файл и переключает БД в режим
+    DELETE, чтобы в архив попал самодостаточный файл без -wal/-shm.
+    """
+    connection = sqlite3.connect(db_path, timeout=Config.DB_BUSY_TIMEOUT)
+    try:
+        connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        connection.execute('PRAGMA journal_mode=DELETE')
+    finally:
+        connection.close()
+
+
+def compact_db(db_path: str):
+    """
+    Обновляет статистику планировщика (ANALYZE) и пересобирает файл БД
+    (VACUUM), чтобы свободные страницы не попадали в архив.
+    """
+    connection = sqlite3.connect(db_path, timeout=Config.DB_BUSY_TIMEOUT)
+    try:
+        connection.execute('ANALYZE')
+        connection.execute('VACUUM')
+    finally:
+        connection.close()
+
+
+def verify_zip(zip_path: str, arcname: str, file_size: int):
+    """Проверяет CRC и размер файла в архиве."""
+    with zipfile.ZipFile(zip_path, 'r') as zipf:
+        bad_file = zipf.testzip()
+        if bad_file is not None:
+            raise zipfile.BadZipFile(
+                f'Ошибка CRC для {bad_file} в архиве {zip_path}')
+        if zipf.getinfo(arcname).file_size != file_size:
+            raise zipfile.BadZipFile(
+                f'Размер {arcname} в архиве {zip_path} не совпадает '
+                'с исходным файлом')
+
+
+def zip_db(
+    db_path: str,
+    zip_dir: str,
+    method: str = Config.ZIP_METHOD,
+    level: int | None = Config.ZIP_LEVEL,
+    vacuum: bool = Config.ZIP_VACUUM,
+) -> dict[str, str | int | float] | None:
+    """
+    Архивирует БД и удаляет исходный файл после проверки архива по CRC.
+    Возвращает размеры до/после сжатия и время архивации.
+    На время архивации захватывается блокировка месячной БД; если пока
+    блокировка ожидалась БД заархивировал другой процесс, возвращает None.
+    """
+    with db_lock(db_path):
+        zip_path = os.path.join(
+            zip_dir, os.path.basename(db_path).replace('.db', '.zip'))
+        if not os.path.isfile(db_path) and os.path.isfile(zip_path):
+            print(f'БД {db_path} уже архивирована: {zip_path}.')
+            return None
+        return _zip_db(db_path, zip_dir, method, level, vacuum)
+
+
+def _zip_db(
+    db_path: str,
+    zip_dir: str,
+    method: str,
+    level: int | None,
+    vacuum: bool,
+) -> dict[str, str | int | float]:
+    if not os.path.isfile(db_path):
+        raise FileNotFoundError(f'Файл базы данных не найден: {db_path}')
+    if not db_path.endswith('.db'):
+        raise ValueError(f'Файл не является .db: {db_path}')
+    if method not in ZIP_METHODS:
+        raise ValueError(
+            f'Неизвестный метод сжатия: {method}. '
+            f'Доступны: {", ".join(ZIP_METHODS)}')
+    check_zip_level(method, level)
+
+    os.makedirs(zip_dir, exist_ok=True)
+    filename = os.path.basename(db_path)
+    zip_path = os.path.join(zip_dir, filename.replace('.db', '.zip'))
+
+    if os.path.exists(zip_path):
+        raise FileExistsError(f'Архив уже существует: {zip_path}.')
+
+    start_time = time.perf_counter()
+    checkpoint_db(db_path)
+    if vacuum:
+        compact_db(db_path)
+    file_size = os.path.getsize(db_path)
+
+    try:
+        compress_start = time.perf_counter()
+        with zipfile.ZipFile(
+            zip_path, 'w',
+            compression=ZIP_METHODS[method],
+            compresslevel=level,
+        ) as zipf:
+            zipf.write(db_path, arcname=filename)
+        compress_seconds = time.perf_counter() - compress_start
+        verify_zip(zip_path, filename, file_size)
+    except BaseException:
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+        raise
+
+    remove_db(db_path)
+    print(
+        f'БД {filename} архивирована в {zip_path}. Исходный файл удалён.'
+    )
+    return {
+        'filename': filename,
+        'file_size': file_size,
+        'zip_size': os.path.getsize(zip_path),
+        'seconds': time.perf_counter() - start_time,
+        'compress_seconds': compress_seconds,
+    }
+
+
+def archive_db(
+    db_path: str,
+    zip_dir: str,
+    method: str = Config.ZIP_METHOD,
+    level: int | None = Config.ZIP_LEVEL,
+    vacuum: bool = Config.ZIP_VACUUM,
+    archive_format: str = Config.ARCHIVE_FORMAT,
+) -> dict[str, str | int | float] | None:
+    """Архивирует БД в zip или в колоночный формат .cols."""
+    if archive_format == 'columnar':
+        from .columnar import columnar_db
+
+        return columnar_db(db_path, zip_dir, method, level)
+    return zip_db(db_path, zip_dir, method, level, vacuum)
+
+
+def zip_dbs(
+    db_paths: list[str],
+    zip_dir: str,
+    workers: int = Config.ZIP_WORKERS,
+    method: str = Config.ZIP_METHOD,
+    level: int | None = Config.ZIP_LEVEL,
+    vacuum: bool = Config.ZIP_VACUUM,
+    archive_format: str = Config.ARCHIVE_FORMAT,
+):
+    """
+    Архивирует несколько БД (при workers > 1 — в параллельных процессах)
+    и выводит степень сжатия и скорость архивации по каждому месяцу.
+    """
+    if not db_paths:
+        return
+    check_zip_level(method, level, archive_format)
+
+    args = (zip_dir, method, level, vacuum, archive_format)
+
+    if workers > 1 and len(db_paths) > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(db_paths))
+        ) as executor:
+            futures = [
+                executor.submit(archive_db, db_path, *args)
+                for db_path in db_paths
+            ]
+            for future in as_completed(futures):
+                print_zip_report(future.result())
+    else:
+        for db_path in db_paths:
+            print_zip_report(archive_db(db_path, *args))
+
+
+def print_zip_report(report: dict[str, str | int | float] | None):
+    if report is None:
+        return
+    file_size_mb = report['file_size'] / 1024 / 1024
+    zip_size_mb = report['zip_size'] / 1024 / 1024
+    ratio = (
+        report['zip_size'] / report['file_size'] * 100
+        if report['file_size'] else 0
+    )
+    # Скорость считается только по сжатию, без checkpoint, VACUUM и
+    # проверки архива
+    seconds = max(report['compress_seconds'], 1e-6)
+    print(
+        f'{report["filename"]}: {round(file_size_mb, 2)} МБ -> '
+        f'{round(zip_size_mb, 2)} МБ ({round(ratio, 1)}%), '
+        f'сжатие {round(file_size_mb / seconds, 2)} МБ/с., '
+        f'всего {round(report["seconds"], 2)} сек.'
+    )
+
+
+def unzip_db(zip_path: str, extract_dir: str, overwrite: bool = False):
+    if not os.path.isfile(zip_path):
+        raise FileNotFoundError(f'Архив не найден: {zip_path}')
+    if not zip_path.endswith('.zip'):
+        raise ValueError(f'Файл не является .zip архивом: {zip_path}')
+
+    os.makedirs(extract_dir, exist_ok=True)
+
+    with zipfile.ZipFile(zip_path, 'r') as zipf:
+        for member in zipf.namelist():
+            target_path = os.path.join(extract_dir, member)
+
+            if os.path.exists(target_path) and not overwrite:
+                raise FileExistsError(
+                    f'Файл {target_path} уже существует.')
+
+        zipf.extractall(path=extract_dir)
+
+    if overwrite:
+        os.remove(zip_path)
+        print(f'Архив {zip_path} распакован в {extract_dir} и удален.')
+    else:
+        print(f'Архив {zip_path} распакован в {extract_dir}.')
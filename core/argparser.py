@@ -1,4 +1,7 @@
 import argparse
+import datetime as dt
+
+from .config import Config
 
 
 def parse_args():
@@ -30,6 +33,55 @@ def parse_args():
             '(zip_and_remove_old_dbs).'
         )
     )
+    parser.add_argument(
+        '--vacuum',
+        action=argparse.BooleanOptionalAction,
+        default=Config.ZIP_VACUUM,
+        help=(
+            'Выполнить (--no-vacuum — не выполнять) ANALYZE и VACUUM перед '
+            'архивацией, по умолчанию Config.ZIP_VACUUM '
+            '(с --zip_and_remove_old_dbs).'
+        )
+    )
+    parser.add_argument(
+        '--zip_workers',
+        type=int,
+        default=Config.ZIP_WORKERS,
+        help='Количество процессов для архивации (с --zip_and_remove_old_dbs).'
+    )
+    parser.add_argument(
+        '--zip_method',
+        choices=['deflate', 'bzip2', 'lzma'],
+        default=Config.ZIP_METHOD,
+        help='Метод сжатия архива (с --zip_and_remove_old_dbs).'
+    )
+    parser.add_argument(
+        '--zip_level',
+        type=int,
+        default=Config.ZIP_LEVEL,
+        help=(
+            'Уровень сжатия: 0-9 для deflate, 1-9 для bzip2; для lzma '
+            'только с --archive_format columnar, 0-9 '
+            '(с --zip_and_remove_old_dbs).'
+        )
+    )
+    parser.add_argument(
+        '--archive_format',
+        choices=['zip', 'columnar'],
+        default=Config.ARCHIVE_FORMAT,
+        help=(
+            'Формат архива: zip или колоночный .cols с индексом по модемам '
+            '(с --zip_and_remove_old_dbs).'
+        )
+    )
+    parser.add_argument(
+        '--compact_deltas',
+        action='store_true',
+        help=(
+            'Перенести дельта-файлы поздних строк в архивы месяцев '
+            '(compact_deltas).'
+        )
+    )
     parser.add_argument(
         '--statistics_2_db',
         action='store_true',
@@ -38,6 +90,31 @@ def parse_args():
             '(save_counter_statistic). Требует --modem_ip.'
         )
     )
+    parser.add_argument(
+        '--ingest_worker',
+        action='store_true',
+        help=(
+            'Распределённая загрузка: захватить незагруженные файлы '
+            'статистики через аренды в Config.QUEUE_DIR и записать их в '
+            'промежуточные БД узла (ingest_worker).'
+        )
+    )
+    parser.add_argument(
+        '--merge_staging',
+        action='store_true',
+        help=(
+            'Перенести промежуточные БД узлов в основные месячные БД '
+            '(merge_staging).'
+        )
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help=(
+            'Продолжить с последней контрольной точки '
+            '(с --split_statistics_by_month и --statistics_2_db).'
+        )
+    )
     parser.add_argument(
         '--modem_ip',
         type=str,
@@ -51,4 +128,117 @@ def parse_args():
         action='store_true',
         help=('Удаление лишних .csv.gz файлов (remove_processed_csv_gz)')
     )
-    return parser.parse_args()
+    parser.add_argument(
+        '--coverage',
+        action='store_true',
+        help=(
+            'Отчёт о полноте данных по модемам и пропусках за период '
+            '(coverage). Можно ограничить --modem_ip, --start и --end.'
+        )
+    )
+    parser.add_argument(
+        '--coverage_by',
+        choices=['day', 'hour'],
+        default='day',
+        help='Период группировки для --coverage.'
+    )
+    parser.add_argument(
+        '--power_quality',
+        action='store_true',
+        help=(
+            'Сводка качества электроэнергии по модемам: статистика по '
+            'фазам, небаланс и события (power_quality). Можно ограничить '
+            '--modem_ip, --start и --end.'
+        )
+    )
+    parser.add_argument(
+        '--start',
+        type=dt.datetime.fromisoformat,
+        help=(
+            'Начало периода в формате ISO (с --coverage и --power_quality), '
+            'по умолчанию Config.MONTH_AGO месяцев назад.'
+        )
+    )
+    parser.add_argument(
+        '--end',
+        type=dt.datetime.fromisoformat,
+        help=(
+            'Конец периода в формате ISO (с --coverage и --power_quality), '
+            'по умолчанию текущее время.'
+        )
+    )
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help=(
+            'Запустить локальный сервис запросов статистики (serve), '
+            'адрес задаётся в Config.SERVER_*.'
+        )
+    )
+    parser.add_argument(
+        '--backfill_decoded',
+        action='store_true',
+        help=(
+            'Заполнить колонки декодированных значений в уже загруженных '
+            'месячных БД (backfill_decoded).'
+        )
+    )
+    parser.add_argument(
+        '--convert_layout',
+        choices=['rowid', 'clustered'],
+        help=(
+            'Перестроить таблицу statistic всех месячных БД в структуру '
+            'rowid или clustered (WITHOUT ROWID) (convert_layout).'
+        )
+    )
+    parser.add_argument(
+        '--benchmark_layout',
+        action='store_true',
+        help=(
+            'Сравнить размер и скорость выборки по модему для структур '
+            'rowid и clustered на копии последней месячной БД '
+            '(benchmark_layout).'
+        )
+    )
+    parser.add_argument(
+        '--benchmark_import_time',
+        action='store_true',
+        help=(
+            'Проверить время импорта для лёгких команд '
+            '(benchmark_import_time).'
+        )
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help=(
+            'Профилировать команду: cProfile (.pstats) и стеки для '
+            'flamegraph (.collapsed) в Config.PROFILE_DIR.'
+        )
+    )
+    parser.add_argument(
+        '--profile_memory',
+        action='store_true',
+        help=(
+            'С --profile: пик памяти и места выделений по этапам '
+            '(tracemalloc, заметно замедляет работу).'
+        )
+    )
+    args = parser.parse_args()
+    if args.profile_memory and not args.profile:
+        parser.error('--profile_memory используется только с --profile')
+    # cProfile видит только поток команды, а запросы сервиса выполняются
+    # в потоках сервера, замеры импорта — в отдельных процессах
+    if args.profile and (args.serve or args.benchmark_import_time):
+        parser.error(
+            '--profile не поддерживается для --serve и '
+            '--benchmark_import_time')
+    if args.zip_level is not None:
+        from .archive import check_zip_level
+
+        try:
+            check_zip_level(
+                args.zip_method, args.zip_level, args.archive_format)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
@@ -0,0 +1,286 @@
+import json
+import logging
+import math
+import os
+import socket
+import sys
+import time
+
+from .config import Config
+from .lock import db_lock
+
+
+# Имя -> (начальный размер, минимум, максимум). Начальные размеры — прежние
+# постоянные значения. Ключ поиска дубликатов занимает 4 параметра
+# запроса, а SQLite допускает не больше 32766 параметров.
+BATCH_LIMITS = {
+    'ingest_batch': (100_000, 5_000, 1_000_000),
+    'split_page': (100_000, 5_000, 1_000_000),
+    'export_page': (100_000, 5_000, 1_000_000),
+    'key_lookup': (1_000, 100, 8_000),
+}
+# Порция короче этой доли размера (хвост файла) не сравнивается по скорости
+MIN_FULL_BATCH = 0.5
+# Столько коротких порций подряд означают, что вход меньше порции
+# (небольшие файлы): размер ограничивается входом
+SHORT_BATCHES = 3
+# Падение скорости меньше этой доли считается шумом
+TOLERANCE = 0.05
+# Отклонение скорости от лучшей, после которого подобранный размер
+# подбирается заново (DRIFT_BATCHES полных порций подряд)
+DRIFT = 0.25
+DRIFT_BATCHES = 3
+# Вес нового замера в скользящем среднем прироста памяти на строку
+BYTES_PER_ROW_WEIGHT = 0.3
+
+# Сообщения попадают в лог приложения (FileRotatingLogger)
+logger = logging.getLogger('core.logger').getChild('autotune')
+
+
+def current_rss() -> int | None:
+    """Текущий RSS процесса в байтах (Linux) или None."""
+    try:
+        with open('/proc/self/statm') as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss() -> int | None:
+    """Наибольший RSS процесса за всё время работы в байтах или None."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _load_state() -> dict:
+    try:
+        with open(Config.AUTOTUNE_PATH, encoding='utf-8') as file:
+            return json.load(file).get(socket.gethostname(), {})
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_state(name: str, state: dict):
+    """
+    Сохраняет состояние подбора этого узла (атомарно). Файл общий для
+    процессов и узлов, поэтому чтение и запись идут под блокировкой.
+    """
+    os.makedirs(os.path.dirname(Config.AUTOTUNE_PATH), exist_ok=True)
+    with db_lock(Config.AUTOTUNE_PATH, retry_interval=0.1):
+        try:
+            with open(Config.AUTOTUNE_PATH, encoding='utf-8') as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            data = {}
+        data.setdefault(socket.gethostname(), {})[name] = state
+
+        tmp_path = f'{Config.AUTOTUNE_PATH}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, Config.AUTOTUNE_PATH)
+
+
+class BatchTuner:
+    """
+    Подбирает размер порции по скорости обработки (строк/сек.): размер
+    меняется в factor раз, пока скорость растёт; при падении скорости
+    направление меняется, а шаг уменьшается, пока не станет меньше 10% —
+    тогда остаётся размер с лучшей скоростью; если скорость при нём
+    устойчиво изменилась, подбор начинается заново. Размер ограничен
+    памятью: прирост RSS за порцию (среднее на строку, умноженное на
+    размер) не должен превышать Config.MEMORY_BUDGET_MB. Состояние
+    сохраняется в Config.AUTOTUNE_PATH отдельно для каждого узла, поэтому
+    следующий запуск продолжает с подобранного размера.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        memory_budget: int = Config.MEMORY_BUDGET_MB * 1024 ** 2,
+        enabled: bool = Config.AUTOTUNE,
+    ):
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.memory_budget = memory_budget
+        self.enabled = enabled
+        self.state = {
+            'size': initial,
+            'factor': 2.0,
+            'direction': 1,
+            'best_size': initial,
+            'best_speed': 0.0,
+            'bytes_per_row': 0.0,
+            'settled': False,
+        }
+        if enabled:
+            self.state.update(_load_state().get(name, {}))
+        self.last_speed: float | None = None
+        self._short_rows: list[int] = []
+        self._drift_batches = 0
+        self._saved = False
+        self._start_time = 0.0
+        self._start_rss: int | None = None
+        self._start_peak: int | None = None
+
+    @property
+    def size(self) -> int:
+        return self.state['size']
+
+    def start(self):
+        """Начало порции: запоминает время и RSS."""
+        self._start_time = time.perf_counter()
+        self._start_rss = current_rss()
+        self._start_peak = peak_rss()
+
+    def memory_limit(self) -> int:
+        """
+        Наибольший размер порции, прирост памяти за которую укладывается в
+        бюджет. Память, занятая до порции (например, прочитанным файлом),
+        не учитывается.
+        """
+        if not self.state['bytes_per_row']:
+            return self.maximum
+        return max(
+            int(self.memory_budget / self.state['bytes_per_row']),
+            self.minimum)
+
+    def _measure_memory(self, rows: int):
+        rss = current_rss()
+        if rss is None or self._start_rss is None:
+            return
+        # Если пик RSS вырос во время порции, рост считается до пика
+        peak = peak_rss()
+        if peak is not None and peak > (self._start_peak or 0):
+            rss = max(rss, peak)
+        # Без прироста порция заняла освобождённую ранее память, и замер
+        # ничего не говорит о её размере
+        if rss <= self._start_rss:
+            return
+        per_row = (rss - self._start_rss) / rows
+        bytes_per_row = self.state['bytes_per_row']
+        self.state['bytes_per_row'] = (
+            bytes_per_row + BYTES_PER_ROW_WEIGHT * (per_row - bytes_per_row)
+            if bytes_per_row else per_row
+        )
+
+    def _reverse(self):
+        self.state['direction'] *= -1
+        self.state['factor'] = math.sqrt(self.state['factor'])
+
+    def _step(self, size: int):
+        """Следующий размер от size или выбор лучшего, если шаг мал."""
+        if self.state['factor'] < 1.1:
+            self.state.update(settled=True, size=self.state['best_size'])
+            logger.info(
+                f'{self.name}: выбран размер порции '
+                f'{self.state["best_size"]} '
+                f'({self.state["best_speed"]:.0f} строк/с)'
+            )
+        else:
+            self.state['size'] = int(
+                size * self.state['factor'] ** self.state['direction'])
+
+    def _explore(self, speed: float, size: int):
+        if speed > self.state['best_speed']:
+            self.state.update(best_size=size, best_speed=speed)
+        if (
+            self.last_speed is not None
+            and speed < self.last_speed * (1 - TOLERANCE)
+        ):
+            self._reverse()
+        self.last_speed = speed
+        self._step(size)
+
+    def _watch(self, speed: float):
+        """Подобранный размер: подбор заново, если скорость ушла."""
+        best_speed = self.state['best_speed']
+        if abs(speed - best_speed) > best_speed * DRIFT:
+            self._drift_batches += 1
+        else:
+            self._drift_batches = 0
+        if self._drift_batches < DRIFT_BATCHES:
+            return
+
+        logger.info(
+            f'{self.name}: скорость {speed:.0f} строк/с вместо '
+            f'{best_speed:.0f}, размер порции подбирается заново'
+        )
+        self._drift_batches = 0
+        self.state.update(
+            settled=False, factor=2.0, direction=1,
+            best_size=self.size, best_speed=speed)
+        self.last_speed = speed
+        self._step(self.size)
+
+    def _short_batch(self, rows: int):
+        self._short_rows.append(rows)
+        if len(self._short_rows) < SHORT_BATCHES:
+            return
+        # Вход меньше порции: порция не вырастет больше входа, поэтому
+        # подбор продолжается вниз от наибольшей из коротких порций
+        size = max(self._short_rows)
+        self._short_rows = []
+        if self.state['direction'] == 1:
+            self._reverse()
+        self.last_speed = None
+        self._step(size)
+
+    def record(self, rows: int):
+        """Конец порции из rows строк: пересчитывает размер."""
+        if not self.enabled or rows <= 0:
+            return
+        seconds = time.perf_counter() - self._start_time
+        self._measure_memory(rows)
+        old_size = self.size
+        was_settled = self.state['settled']
+        speed = rows / max(seconds, 1e-9)
+
+        if rows < old_size * MIN_FULL_BATCH:
+            if not was_settled:
+                self._short_batch(rows)
+        else:
+            self._short_rows = []
+            if was_settled:
+                self._watch(speed)
+            else:
+                self._explore(speed, old_size)
+
+        memory_limit = self.memory_limit()
+        size = min(max(self.size, self.minimum), self.maximum, memory_limit)
+        self.state['size'] = size
+        # Лучший размер тоже не должен выходить за бюджет памяти
+        self.state['best_size'] = min(self.state['best_size'], memory_limit)
+        if size != old_size:
+            rss = current_rss()
+            logger.info(
+                f'{self.name}: размер порции {old_size} -> {size} '
+                f'({speed:.0f} строк/с, RSS '
+                f'{(rss or 0) / 1024 ** 2:.0f} МБ, '
+                f'{self.state["bytes_per_row"]:.0f} Б/строку)'
+            )
+        if (
+            not self._saved
+            or size != old_size
+            or self.state['settled'] != was_settled
+        ):
+            _save_state(self.name, self.state)
+            self._saved = True
+
+
+_tuners: dict[str, BatchTuner] = {}
+
+
+def get_tuner(name: str) -> BatchTuner:
+    """Общий для процесса подборщик размера порции из BATCH_LIMITS."""
+    if name not in _tuners:
+        _tuners[name] = BatchTuner(name, *BATCH_LIMITS[name])
+    return _tuners[name]
@@ -0,0 +1,89 @@
+import json
+import os
+import re
+from typing import Any, Callable
+
+from .config import Config
+
+
+class CheckpointStore:
+    """
+    Хранилище контрольных точек долгих задач: по одному JSON-файлу на
+    задачу. Запись атомарная (временный файл + fsync + os.replace), поэтому
+    после сбоя в файле остаётся либо старая, либо новая позиция. В файле
+    хранится версия формата задачи (без поля version — версия 1).
+    """
+
+    def __init__(self, checkpoint_dir: str | None = None):
+        self.checkpoint_dir = checkpoint_dir or Config.CHECKPOINT_DIR
+
+    def path(self, job: str) -> str:
+        filename = re.sub(r'[^\w.-]', '_', job)
+        return os.path.join(self.checkpoint_dir, f'{filename}.json')
+
+    def load(
+        self,
+        job: str,
+        version: int = 1,
+        upgrade: Callable[[dict], dict | None] | None = None,
+    ) -> dict[str, Any] | None:
+        """
+        Контрольная точка задачи версии version. Точка другой версии
+        преобразуется функцией upgrade (None — преобразовать нельзя);
+        непреобразуемая или повреждённая точка не используется, и задача
+        начинается заново.
+        """
+        path = self.path(job)
+        try:
+            with open(path, encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            state = None
+
+        if isinstance(state, dict) and state.get('version', 1) != version:
+            state = upgrade(state) if upgrade is not None else None
+        if not isinstance(state, dict):
+            print(
+                f'Контрольная точка {path} в неизвестном формате и не '
+                'используется, задача начнётся заново.'
+            )
+            return None
+        state['version'] = version
+        return state
+
+    def save(self, job: str, state: dict[str, Any], version: int = 1):
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self.path(job)
+        tmp_path = f'{path}.tmp'
+
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {**state, 'version': version}, file,
+                ensure_ascii=False, default=str
+            )
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+        # Фиксируем переименование в каталоге (недоступно в Windows)
+        if hasattr(os, 'O_DIRECTORY'):
+            dir_fd = os.open(self.checkpoint_dir, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    def clear(self, job: str):
+        if os.path.exists(self.path(job)):
+            os.remove(self.path(job))
+
+
+def file_signature(file_path: str) -> list[int]:
+    """
+    Размер и время изменения файла: по ним проверяется, что файл-источник
+    не изменился с момента записи контрольной точки.
+    """
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
@@ -0,0 +1,352 @@
+import bz2
+import datetime as dt
+import json
+import lzma
+import os
+import sqlite3
+import struct
+import time
+import zlib
+from array import array
+from typing import Iterator
+
+from .config import Config
+from .db_files import remove_db
+from .lock import db_lock
+
+
+# Формат .cols:
+#   MAGIC | offset заголовка (uint64) | длина заголовка (uint64)
+#   | сжатые блоки | заголовок (JSON, zlib)
+# Заголовок — индекс: modem_ip -> список блоков с их смещением, длиной,
+# CRC, числом строк и диапазоном времени. Блок содержит строки одного
+# модема, разложенные по колонкам.
+MAGIC = b'CSCOLv1\x00'
+PREFIX = struct.Struct('<8sQQ')
+EPOCH = dt.datetime(1970, 1, 1)
+BLOB_COLUMNS = (
+    'voltage_1', 'current_1', 'angle_1',
+    'voltage_2', 'current_2', 'angle_2',
+    'voltage_3', 'current_3', 'angle_3',
+)
+COLUMNS = ('timestamp', 'modem_ip', 'mac', 'local_id') + BLOB_COLUMNS
+# Метод сжатия -> (сжатие(данные, уровень | None), распаковка)
+COMPRESSORS = {
+    'deflate': (
+        lambda data, level: zlib.compress(
+            data, -1 if level is None else level),
+        zlib.decompress,
+    ),
+    'bzip2': (
+        lambda data, level: bz2.compress(data, level or 9),
+        bz2.decompress,
+    ),
+    'lzma': (
+        lambda data, level: lzma.compress(
+            data, preset=6 if level is None else level),
+        lzma.decompress,
+    ),
+}
+
+
+def _to_micros(timestamp: dt.datetime) -> int:
+    return (timestamp - EPOCH) // dt.timedelta(microseconds=1)
+
+
+def _from_micros(micros: int) -> dt.datetime:
+    return EPOCH + dt.timedelta(microseconds=micros)
+
+
+def _pack_chunk(rows: list[tuple]) -> bytes:
+    """Раскладывает строки по колонкам: время дельтами, mac словарём."""
+    micros = [_to_micros(row[0]) for row in rows]
+    deltas = array('q', [micros[0]] + [
+        current - previous for previous, current in zip(micros, micros[1:])
+    ])
+
+    macs = sorted({row[2] for row in rows})
+    mac_index = {mac: index for index, mac in enumerate(macs)}
+    mac_ids = array('I', [mac_index[row[2]] for row in rows])
+    local_ids = array('q', [row[3] for row in rows])
+
+    parts = [
+        deltas.tobytes(),
+        '\n'.join(macs).encode(),
+        mac_ids.tobytes(),
+        local_ids.tobytes(),
+    ]
+    for column in range(4, 4 + len(BLOB_COLUMNS)):
+        # Длина -1 означает NULL
+        lengths = array('i', [
+            -1 if row[column] is None else len(row[column]) for row in rows
+        ])
+        parts.append(lengths.tobytes())
+        parts.append(b''.join(row[column] or b'' for row in rows))
+
+    return b''.join(struct.pack('<I', len(part)) + part for part in parts)
+
+
+def _unpack_chunk(data: bytes, modem_ip: str) -> dict[str, list]:
+    parts = []
+    position = 0
+    while position < len(data):
+        (length,) = struct.unpack_from('<I', data, position)
+        position += 4
+        parts.append(data[position:position + length])
+        position += length
+
+    deltas = array('q')
+    deltas.frombytes(parts[0])
+    micros = 0
+    timestamps = []
+    for delta in deltas:
+        micros += delta
+        timestamps.append(_from_micros(micros))
+
+    macs = parts[1].decode().split('\n')
+    mac_ids = array('I')
+    mac_ids.frombytes(parts[2])
+    local_ids = array('q')
+    local_ids.frombytes(parts[3])
+
+    columns = {
+        'timestamp': timestamps,
+        'modem_ip': [modem_ip] * len(timestamps),
+        'mac': [macs[index] for index in mac_ids],
+        'local_id': local_ids.tolist(),
+    }
+    for index, column in enumerate(BLOB_COLUMNS):
+        lengths = array('i')
+        lengths.frombytes(parts[4 + index * 2])
+        blob = parts[5 + index * 2]
+        values = []
+        offset = 0
+        for length in lengths:
+            if length < 0:
+                values.append(None)
+                continue
+            values.append(blob[offset:offset + length])
+            offset += length
+        columns[column] = values
+
+    return columns
+
+
+def write_columnar(
+    db_path: str,
+    cols_path: str,
+    method: str = 'lzma',
+    level: int | None = None,
+    chunk_rows: int = Config.COLUMNAR_CHUNK_ROWS,
+) -> int:
+    """
+    Записывает таблицу statistic из SQLite в файл .cols. Возвращает
+    количество записанных строк.
+    """
+    compress, _ = COMPRESSORS[method]
+    connection = sqlite3.connect(
+        f'file:{db_path}?mode=ro', uri=True, timeout=Config.DB_BUSY_TIMEOUT)
+    index: dict[str, list[dict]] = {}
+    total_rows = 0
+
+    def flush(file, modem_ip: str, rows: list[tuple]):
+        chunk = compress(_pack_chunk(rows), level)
+        index.setdefault(modem_ip, []).append({
+            'offset': file.tell(),
+            'length': len(chunk),
+            'crc': zlib.crc32(chunk),
+            'rows': len(rows),
+            'start': rows[0][0].isoformat(),
+            'end': rows[-1][0].isoformat(),
+        })
+        file.write(chunk)
+
+    try:
+        cursor = connection.execute(
+            f'SELECT {", ".join(COLUMNS)} FROM statistic '
+            'ORDER BY modem_ip, timestamp, mac, local_id'
+        )
+        with open(cols_path, 'wb') as file:
+            file.write(PREFIX.pack(MAGIC, 0, 0))
+            modem_ip = None
+            rows = []
+
+            for row in cursor:
+                row = (dt.datetime.fromisoformat(row[0]),) + row[1:]
+                if row[1] != modem_ip or len(rows) >= chunk_rows:
+                    if rows:
+                        flush(file, modem_ip, rows)
+                    modem_ip = row[1]
+                    rows = []
+                rows.append(row)
+                total_rows += 1
+
+            if rows:
+                flush(file, modem_ip, rows)
+
+            header = zlib.compress(json.dumps({
+                'version': 1,
+                'method': method,
+                'rows': total_rows,
+                'modems': index,
+            }).encode())
+            header_offset = file.tell()
+            file.write(header)
+            file.seek(0)
+            file.write(PREFIX.pack(MAGIC, header_offset, len(header)))
+            file.flush()
+            os.fsync(file.fileno())
+    finally:
+        connection.close()
+
+    return total_rows
+
+
+class ColumnarArchive:
+    """
+    Чтение архива .cols: читается только заголовок, а блоки нужного модема
+    распаковываются по запросу.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            magic, header_offset, header_length = PREFIX.unpack(
+                file.read(PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError(f'Файл не является архивом .cols: {path}')
+            file.seek(header_offset)
+            header = json.loads(zlib.decompress(file.read(header_length)))
+
+        self.rows = header['rows']
+        self.index: dict[str, list[dict]] = header['modems']
+        self.method = header['method']
+        _, self.decompress = COMPRESSORS[self.method]
+
+    def modems(self) -> list[str]:
+        return sorted(self.index)
+
+    def _read_chunk(self, file, chunk: dict) -> bytes:
+        file.seek(chunk['offset'])
+        data = file.read(chunk['length'])
+        if zlib.crc32(data) != chunk['crc']:
+            raise ValueError(
+                f'Ошибка CRC блока со смещением {chunk["offset"]} '
+                f'в архиве {self.path}')
+        return self.decompress(data)
+
+    def read_modem(
+        self,
+        modem_ip: str,
+        start: dt.datetime | None = None,
+        end: dt.datetime | None = None,
+    ) -> dict[str, list]:
+        """
+        Показания модема за период по колонкам (COLUMNS). Распаковываются
+        только блоки модема, пересекающиеся с периодом.
+        """
+        result = {column: [] for column in COLUMNS}
+        chunks = [
+            chunk for chunk in self.index.get(modem_ip, [])
+            if (
+                end is None
+                or dt.datetime.fromisoformat(chunk['start']) <= end
+            ) and (
+                start is None
+                or dt.datetime.fromisoformat(chunk['end']) >= start
+            )
+        ]
+
+        with open(self.path, 'rb') as file:
+            for chunk in chunks:
+                columns = _unpack_chunk(
+                    self._read_chunk(file, chunk), modem_ip)
+                keep = [
+                    index for index, timestamp
+                    in enumerate(columns['timestamp'])
+                    if (start is None or timestamp >= start)
+                    and (end is None or timestamp <= end)
+                ]
+                for column, values in columns.items():
+                    result[column].extend(values[index] for index in keep)
+
+        return result
+
+    def iter_modems(self) -> Iterator[tuple[str, dict[str, list]]]:
+        for modem_ip in self.modems():
+            yield modem_ip, self.read_modem(modem_ip)
+
+    def verify(self) -> int:
+        """Проверяет CRC и распаковку всех блоков, возвращает число строк."""
+        total_rows = 0
+        with open(self.path, 'rb') as file:
+            for modem_ip, chunks in self.index.items():
+                for chunk in chunks:
+                    columns = _unpack_chunk(
+                        self._read_chunk(file, chunk), modem_ip)
+                    if len(columns['timestamp']) != chunk['rows']:
+                        raise ValueError(
+                            f'Неверное число строк в блоке {modem_ip} '
+                            f'архива {self.path}')
+                    total_rows += chunk['rows']
+        if total_rows != self.rows:
+            raise ValueError(f'Неверное число строк в архиве {self.path}')
+        return total_rows
+
+
+def columnar_db(
+    db_path: str,
+    out_dir: str,
+    method: str = Config.ZIP_METHOD,
+    level: int | None = Config.ZIP_LEVEL,
+) -> dict[str, str | int | float] | None:
+    """
+    Архивирует месячную БД в колоночный формат .cols и удаляет исходный
+    файл после проверки архива (CRC блоков и число строк). VACUUM не
+    нужен: в архив попадают только строки, а не страницы БД.
+    """
+    from .archive import check_zip_level, checkpoint_db
+
+    check_zip_level(method, level, 'columnar')
+    os.makedirs(out_dir, exist_ok=True)
+    filename = os.path.basename(db_path)
+    cols_path = os.path.join(out_dir, filename.replace('.db', '.cols'))
+
+    with db_lock(db_path):
+        if not os.path.isfile(db_path) and os.path.isfile(cols_path):
+            print(f'БД {db_path} уже архивирована: {cols_path}.')
+            return None
+        if not os.path.isfile(db_path):
+            raise FileNotFoundError(f'Файл базы данных не найден: {db_path}')
+        if os.path.exists(cols_path):
+            raise FileExistsError(f'Архив уже существует: {cols_path}.')
+
+        start_time = time.perf_counter()
+        checkpoint_db(db_path)
+        file_size = os.path.getsize(db_path)
+        tmp_path = f'{cols_path}.tmp'
+
+        try:
+            compress_start = time.perf_counter()
+            rows = write_columnar(db_path, tmp_path, method, level)
+            compress_seconds = time.perf_counter() - compress_start
+            if ColumnarArchive(tmp_path).verify() != rows:
+                raise ValueError(f'Архив {cols_path} не прошёл проверку')
+            os.replace(tmp_path, cols_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        remove_db(db_path)
+        print(
+            f'БД {filename} архивирована в {cols_path}. '
+            'Исходный файл удалён.'
+        )
+        return {
+            'filename': filename,
+            'file_size': file_size,
+            'zip_size': os.path.getsize(cols_path),
+            'seconds': time.perf_counter() - start_time,
+            'compress_seconds': compress_seconds,
+        }
@@ -5,9 +5,60 @@ class Config:
     ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..'))
     DATA_DIR = os.path.join(ROOT_DIR, 'data')
     LOG_DIR = os.path.join(ROOT_DIR, 'log')
+    CHECKPOINT_DIR = os.path.join(DATA_DIR, 'checkpoints')
     STATISTIC_DIR = '/var/www/data/counters_history'
 
     DB_PREFIX = 'counters_statistics'
+    DB_PARTITION = 'month'  # month, week или day — период одного файла БД
     STATISTIC_PATH = os.path.join(ROOT_DIR, 'data', f'{DB_PREFIX}.xlsx')
     MONTH_AGO = 2
     DEBUG = False
+    IMPORT_TIME_LIMIT_MS = 150
+
+    ZIP_METHOD = 'deflate'  # deflate, bzip2, lzma
+    ZIP_LEVEL = None  # None - уровень сжатия по умолчанию для метода
+    ZIP_WORKERS = 1
+    ZIP_VACUUM = False
+    ARCHIVE_FORMAT = 'zip'  # zip или columnar (.cols)
+    COLUMNAR_CHUNK_ROWS = 50_000  # Строк одного модема в блоке .cols
+
+    DB_LAYOUT = 'rowid'  # rowid или clustered (WITHOUT ROWID) для новых БД
+    STORE_DECODED = False  # Сохранять декодированные значения при загрузке
+    DB_JOURNAL_MODE = 'WAL'  # Читатели не блокируются писателями
+    DB_BUSY_TIMEOUT = 60  # сек. ожидания занятой БД внутри SQLite
+    LOCK_TIMEOUT = 60 * 60  # сек. ожидания блокировки месячной БД
+    LOCK_RETRY_INTERVAL = 5  # сек. между попытками захвата блокировки
+
+    # Общий для узлов каталог распределённой загрузки
+    QUEUE_DIR = os.path.join(STATISTIC_DIR, '.ingest_queue')
+    LEASE_TTL = 10 * 60  # сек. действия аренды файла без продления
+    LEASE_RENEW_INTERVAL = 60  # сек. между продлениями аренды
+
+    PROFILE_DIR = os.path.join(LOG_DIR, 'profile')  # Файлы --profile
+    PROFILE_SAMPLE_INTERVAL = 0.005  # сек. между снимками стека
+    PROFILE_PRINT_LIMIT = 20  # Функций в выводе профиля
+    PROFILE_TOP_ALLOCATIONS = 10  # Мест выделения памяти на этап
+
+    AUTOTUNE = True  # Подбирать размеры порций по скорости и памяти
+    AUTOTUNE_PATH = os.path.join(DATA_DIR, 'autotune.json')
+    MEMORY_BUDGET_MB = 1024  # Допустимый прирост RSS за одну порцию
+
+    SAMPLING_INTERVAL_MINUTES = 30  # Ожидаемый интервал опроса счётчика
+    COVERAGE_THRESHOLD = 0.9  # Доля ожидаемых записей, ниже — пропуск
+    COVERAGE_WORKERS = os.cpu_count() or 1
+
+    EXPORT_CACHE_DIR = os.path.join(DATA_DIR, 'export_cache')
+    EXPORT_CACHE_SIZE = 512 * 1024 ** 2  # Байт на диске, сверх — LRU
+    EXPORT_CACHE = True  # Кэшировать экспорт завершённых месяцев
+
+    POWER_QUALITY_PATH = os.path.join(DATA_DIR, 'power_quality.xlsx')
+    NOMINAL_VOLTAGE = 230  # В, номинальное фазное напряжение
+    VOLTAGE_SAG = 0.9  # Доля номинала, ниже — провал напряжения
+    VOLTAGE_SWELL = 1.1  # Доля номинала, выше — перенапряжение
+    CURRENT_LIMIT = 100  # А, выше — превышение тока
+
+    SERVER_HOST = '127.0.0.1'
+    SERVER_PORT = 8765
+    SERVER_SOCKET = None  # Путь к Unix-сокету вместо HTTP-порта
+    SERVER_MAX_ENGINES = 3  # Открытых движков последних месяцев
+    SERVER_CACHE_SIZE = 128  # Выборок в LRU-кэше результатов
@@ -0,0 +1,209 @@
+import datetime as dt
+import sqlite3
+from collections import defaultdict
+
+from .config import Config
+from .db_files import find_monthly_dbs
+
+
+PERIODS = {
+    # Длина префикса timestamp ('YYYY-MM-DD HH:MM:SS') и длительность периода
+    'day': (10, dt.timedelta(days=1)),
+    'hour': (13, dt.timedelta(hours=1)),
+}
+PERIOD_FORMATS = {'day': '%Y-%m-%d', 'hour': '%Y-%m-%d %H'}
+# Формат хранения DateTime в SQLite (SQLAlchemy)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def count_records_by_period(
+    db_path: str,
+    start: dt.datetime,
+    end: dt.datetime,
+    by: str = 'day',
+    modem_ip: str | None = None,
+) -> list[tuple[str, str, int, int]]:
+    """
+    Количество записей и счётчиков (mac, local_id) по модему и периоду,
+    посчитанное GROUP BY внутри одной месячной БД.
+    Возвращает строки (modem_ip, период, записей, счётчиков).
+    """
+    prefix_length, _ = PERIODS[by]
+    query = (
+        'SELECT modem_ip, substr(timestamp, 1, ?) AS period, COUNT(*), '
+        "COUNT(DISTINCT mac || '/' || local_id) "
+        'FROM statistic WHERE timestamp BETWEEN ? AND ?'
+    )
+    params = [
+        prefix_length,
+        start.strftime(TIMESTAMP_FORMAT),
+        end.strftime(TIMESTAMP_FORMAT),
+    ]
+    if modem_ip is not None:
+        query += ' AND modem_ip = ?'
+        params.append(modem_ip)
+    query += ' GROUP BY modem_ip, period'
+
+    connection = sqlite3.connect(
+        f'file:{db_path}?mode=ro', uri=True, timeout=Config.DB_BUSY_TIMEOUT)
+    try:
+        return connection.execute(query, params).fetchall()
+    finally:
+        connection.close()
+
+
+def collect_coverage(
+    start: dt.datetime,
+    end: dt.datetime,
+    by: str = 'day',
+    modem_ip: str | None = None,
+    workers: int = Config.COVERAGE_WORKERS,
+) -> dict[str, dict[str, tuple[int, int]]]:
+    """
+    Считает покрытие по всем незаархивированным месячным БД, которые
+    пересекаются с периодом (при workers > 1 — в параллельных процессах).
+    Возвращает {modem_ip: {период: (записей, счётчиков)}}.
+    """
+    db_paths = [
+        db_file.path for db_file in find_monthly_dbs()
+        if db_file.start <= end and db_file.end > start
+    ]
+    coverage: dict[str, dict[str, tuple[int, int]]] = defaultdict(dict)
+
+    def add_rows(rows: list[tuple[str, str, int, int]]):
+        for row_modem_ip, period, records, meters in rows:
+            coverage[row_modem_ip][period] = (records, meters)
+
+    if workers > 1 and len(db_paths) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(db_paths))
+        ) as executor:
+            for rows in executor.map(
+                count_records_by_period,
+                db_paths,
+                [start] * len(db_paths),
+                [end] * len(db_paths),
+                [by] * len(db_paths),
+                [modem_ip] * len(db_paths),
+            ):
+                add_rows(rows)
+    else:
+        for db_path in db_paths:
+            add_rows(count_records_by_period(
+                db_path, start, end, by, modem_ip))
+
+    return coverage
+
+
+def expected_periods(
+    start: dt.datetime, end: dt.datetime, by: str
+) -> dict[str, float]:
+    """
+    Ожидаемое количество показаний одного счётчика в каждом периоде с учётом
+    неполных первого и последнего периодов.
+    """
+    _, duration = PERIODS[by]
+    interval = Config.SAMPLING_INTERVAL_MINUTES * 60
+    if by == 'day':
+        period_start = dt.datetime(start.year, start.month, start.day)
+    else:
+        period_start = start.replace(minute=0, second=0, microsecond=0)
+
+    expected = {}
+    while period_start < end:
+        period_end = period_start + duration
+        overlap = min(period_end, end) - max(period_start, start)
+        expected[period_start.strftime(PERIOD_FORMATS[by])] = (
+            overlap.total_seconds() / interval
+        )
+        period_start = period_end
+    return expected
+
+
+def find_gaps(
+    coverage: dict[str, dict[str, tuple[int, int]]],
+    start: dt.datetime,
+    end: dt.datetime,
+    by: str = 'day',
+) -> list[tuple[str, int, int, float, list[tuple[str, str, float]]]]:
+    """
+    Сравнивает количество записей с ожидаемым по интервалу опроса
+    (Config.SAMPLING_INTERVAL_MINUTES). Период считается пропуском, если
+    записей меньше Config.COVERAGE_THRESHOLD от ожидаемого; подряд идущие
+    пустые периоды объединяются в один диапазон.
+    Возвращает строки (modem_ip, записей, счётчиков, покрытие,
+    [(первый период, последний период, покрытие)]), отсортированные по
+    покрытию.
+    """
+    expected = expected_periods(start, min(end, dt.datetime.now()), by)
+    report = []
+
+    for modem_ip, periods in coverage.items():
+        meters = max(meters for _, meters in periods.values())
+        gaps = []
+        empty_run = None
+        total_records = 0
+        total_expected = 0.0
+
+        for period, meter_expected in expected.items():
+            records, _ = periods.get(period, (0, 0))
+            period_expected = meter_expected * meters
+            total_records += records
+            total_expected += period_expected
+
+            # Период, в котором не ожидается ни одного полного опроса,
+            # не проверяется
+            if meter_expected < 1:
+                continue
+            if records == 0:
+                empty_run = (empty_run[0] if empty_run else period, period)
+                continue
+            if empty_run:
+                gaps.append((*empty_run, 0.0))
+                empty_run = None
+            if records < period_expected * Config.COVERAGE_THRESHOLD:
+                gaps.append((period, period, records / period_expected))
+
+        if empty_run:
+            gaps.append((*empty_run, 0.0))
+
+        ratio = (
+            min(total_records / total_expected, 1.0)
+            if total_expected else 1.0
+        )
+        report.append((modem_ip, total_records, meters, ratio, gaps))
+
+    return sorted(report, key=lambda row: (row[3], row[0]))
+
+
+def format_gaps(gaps: list[tuple[str, str, float]], limit: int = 5) -> str:
+    parts = [
+        f'{first}..{last} (0%)' if first != last
+        else f'{first} ({round(ratio * 100)}%)'
+        for first, last, ratio in gaps
+    ]
+    if len(parts) > limit:
+        return ', '.join(parts[:limit]) + f' и ещё {len(parts) - limit}'
+    return ', '.join(parts)
+
+
+def print_coverage_report(
+    report: list[tuple[str, int, int, float, list[tuple[str, str, float]]]]
+):
+    with_gaps = [row for row in report if row[4]]
+
+    if with_gaps:
+        print(f'{"IP модема":<16} {"Записей":>10} {"Счётч.":>6} '
+              f'{"Покр.":>6}  Пропуски')
+    for modem_ip, records, meters, ratio, gaps in with_gaps:
+        print(
+            f'{modem_ip:<16} {records:>10} {meters:>6} '
+            f'{round(ratio * 100, 1):>5}%  {format_gaps(gaps)}'
+        )
+
+    print(
+        f'Модемов: {len(report)}, с пропусками: {len(with_gaps)}, '
+        f'без пропусков: {len(report) - len(with_gaps)}.'
+    )
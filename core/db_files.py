@@ -0,0 +1,220 @@
+import datetime as dt
+import os
+from typing import NamedTuple
+
+from .config import Config
+
+
+# Деление месячной БД на файлы (Config.DB_PARTITION): суффикс имени файла
+# пустой для месяца, w1..w5 для недели (дни 1-7, 8-14, ...) и DD для дня.
+# Неделя не выходит за границы месяца, поэтому каждый файл относится к
+# одному месяцу.
+PARTITIONS = ('month', 'week', 'day')
+# Архивы месяца, которые не распаковываются при поздней загрузке: строки
+# за такой месяц пишутся в дельта-файл <имя>.delta.db рядом с архивом
+ARCHIVE_EXTENSIONS = ('.zip', '.cols')
+DELTA_EXTENSION = '.delta.db'
+
+
+def remove_db(db_path: str, journals_only: bool = False):
+    """
+    Удаляет файл БД вместе с журналами (-wal, -shm, -journal). При
+    journals_only=True удаляются только журналы — после замены файла
+    (os.replace) журналы прежнего файла к новому не относятся.
+    """
+    suffixes = ('-wal', '-shm', '-journal')
+    for suffix in suffixes if journals_only else ('',) + suffixes:
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+
+def shard_name(date: dt.date, partition: str = Config.DB_PARTITION) -> str:
+    """Суффикс имени файла БД, в который попадает дата."""
+    if partition == 'week':
+        return f'w{(date.day - 1) // 7 + 1}'
+    if partition == 'day':
+        return f'{date.day:02d}'
+    return ''
+
+
+def db_filename(
+    year: int, month: int, shard: str = '', extension: str = '.db'
+) -> str:
+    """Имя файла вида Config.DB_PREFIX_YYYY_MM[_шард]<расширение>."""
+    name = f'{Config.DB_PREFIX}_{year}_{month:02d}'
+    if shard:
+        name += f'_{shard}'
+    return name + extension
+
+
+class MonthlyDBFile(NamedTuple):
+    """Файл месячной БД или её части (шарда недели или дня)."""
+    path: str
+    year: int
+    month: int
+    extension: str
+    shard: str = ''
+
+    @property
+    def start(self) -> dt.datetime:
+        if not self.shard:
+            return dt.datetime(self.year, self.month, 1)
+        if self.shard.startswith('w'):
+            day = (int(self.shard[1:]) - 1) * 7 + 1
+        else:
+            day = int(self.shard)
+        return dt.datetime(self.year, self.month, day)
+
+    @property
+    def end(self) -> dt.datetime:
+        """Начало следующего периода (граница не включается)."""
+        if self.month == 12:
+            month_end = dt.datetime(self.year + 1, 1, 1)
+        else:
+            month_end = dt.datetime(self.year, self.month + 1, 1)
+
+        if not self.shard:
+            return month_end
+        if self.shard.startswith('w'):
+            return min(self.start + dt.timedelta(days=7), month_end)
+        return self.start + dt.timedelta(days=1)
+
+    @property
+    def label(self) -> str:
+        """Период файла для сообщений и имён листов: YYYY_MM[_шард]."""
+        label = f'{self.year}_{self.month:02d}'
+        return f'{label}_{self.shard}' if self.shard else label
+
+
+def db_signature(db_path: str) -> tuple[int, ...]:
+    """
+    Размер и время изменения файла месяца, его дельта-файла и их WAL:
+    меняются при любой записи, поэтому служат ключом инвалидации кэша
+    результатов. Пустой WAL (создаётся при открытии БД читателем) не
+    учитывается.
+    """
+    signature = []
+    delta = delta_path(db_path)
+    for path in (db_path, f'{db_path}-wal', delta, f'{delta}-wal'):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_size == 0 and path.endswith('-wal'):
+            signature.extend((0, 0))
+        else:
+            signature.extend((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+def parse_db_filename(
+    filename: str, extensions: tuple[str, ...] = ('.db',)
+) -> tuple[int, int, str, str] | None:
+    """
+    Разбирает имя вида Config.DB_PREFIX_YYYY_MM[_шард]<расширение> и
+    возвращает (год, месяц, шард, расширение) или None, если имя не
+    подходит.
+    """
+    prefix = f'{Config.DB_PREFIX}_'
+    if not filename.startswith(prefix):
+        return None
+
+    extension = next(
+        (ext for ext in extensions if filename.endswith(ext)), None)
+    if extension is None:
+        return None
+
+    parts = filename[len(prefix):-len(extension)].split('_')
+    if len(parts) not in (2, 3):
+        return None
+
+    try:
+        year = int(parts[0])
+        month = int(parts[1])
+        dt.datetime(year, month, 1)
+    except ValueError:
+        return None
+
+    shard = parts[2] if len(parts) == 3 else ''
+    if shard:
+        try:
+            MonthlyDBFile('', year, month, extension, shard).start
+        except ValueError:
+            return None
+
+    return year, month, shard, extension
+
+
+def find_monthly_dbs(
+    data_dir: str | None = None,
+    extensions: tuple[str, ...] = ('.db',),
+) -> list[MonthlyDBFile]:
+    """Месячные БД (и их шарды) в каталоге, отсортированные по дате."""
+    data_dir = data_dir or Config.DATA_DIR
+    db_files = []
+    for filename in os.listdir(data_dir):
+        parsed = parse_db_filename(filename, extensions)
+        if parsed is None:
+            continue
+        year, month, shard, extension = parsed
+        db_files.append(MonthlyDBFile(
+            os.path.join(data_dir, filename), year, month, extension, shard))
+
+    return sorted(db_files, key=lambda db_file: (db_file.start, db_file.path))
+
+
+def find_month_sources(
+    extensions: tuple[str, ...] = ('.db', '.cols'),
+    data_dir: str | None = None,
+) -> list[MonthlyDBFile]:
+    """
+    По одному файлу на месяц (или шард): если он есть в нескольких
+    форматах, выбирается расширение, стоящее раньше в extensions.
+    """
+    sources: dict[tuple[int, int, str], MonthlyDBFile] = {}
+    for db_file in find_monthly_dbs(data_dir, extensions):
+        key = (db_file.year, db_file.month, db_file.shard)
+        if key not in sources or (
+            extensions.index(db_file.extension)
+            < extensions.index(sources[key].extension)
+        ):
+            sources[key] = db_file
+    return sorted(
+        sources.values(), key=lambda db_file: (db_file.start, db_file.path))
+
+
+def delta_path(db_path: str) -> str:
+    """Дельта-файл поздних строк месяца (шарда) по пути к .db или архиву."""
+    return os.path.splitext(db_path)[0] + DELTA_EXTENSION
+
+
+def is_archived(db_path: str) -> bool:
+    """Месяц (шард) есть только в архиве .zip или .cols, без .db."""
+    stem = os.path.splitext(db_path)[0]
+    return not os.path.isfile(db_path) and any(
+        os.path.isfile(stem + extension) for extension in ARCHIVE_EXTENSIONS)
+
+
+def find_partition_path(
+    date: dt.date,
+    data_dir: str | None = None,
+    partition: str = Config.DB_PARTITION,
+) -> str:
+    """
+    Путь к файлу БД для записи показаний за дату. Если для даты уже есть
+    файл другой гранулярности (.db или архив, созданный до смены
+    Config.DB_PARTITION), запись продолжается в него, чтобы строки одного
+    периода не расходились по двум файлам. Для заархивированного периода
+    возвращается путь к его дельта-файлу, чтобы не распаковывать архив.
+    """
+    data_dir = data_dir or Config.DATA_DIR
+    for existing_partition in PARTITIONS:
+        name = db_filename(
+            date.year, date.month, shard_name(date, existing_partition))
+        path = os.path.join(data_dir, name)
+        if os.path.isfile(path):
+            return path
+        if is_archived(path):
+            return delta_path(path)
+    name = db_filename(date.year, date.month, shard_name(date, partition))
+    return os.path.join(data_dir, name)
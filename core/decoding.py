@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+
+MEASUREMENTS = ('voltage', 'current', 'angle')
+PHASES = (1, 2, 3)
+# Колонки БД с упакованными компонентами значений (pack_statistics)
+DECODED_COLUMNS = tuple(
+    f'decoded_{measurement}_{phase}'
+    for phase in PHASES for measurement in MEASUREMENTS
+)
+# Префикс ответа счётчика, который может храниться перед 3 байтами значения
+VALUE_PREFIX = 0x07
+# Сохранённое значение для BLOB, который не декодируется (пустой или
+# короткий): строка уже обработана, и --backfill_decoded её не выбирает.
+# NULL в колонке означает, что строка ещё не декодировалась.
+NO_VALUE = -1
+
+
+def _to_bytes(value: bytes | str | None) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return bytes.fromhex(value)
+    return b''
+
+
+def decode_bytes_column(values: pd.Series) -> list[pd.Series]:
+    """
+    Векторный аналог CountersStatisticDB._bytes_to_float для колонки BLOB.
+
+    Значения укладываются в массив фиксированной ширины (4 байта на строку),
+    который читается через np.frombuffer. Если значение начинается с 0x07,
+    компоненты берутся из байтов 1-3, иначе из байтов 0-2. Слишком короткие
+    и пустые значения дают <NA>. Возвращает три колонки UInt8.
+    """
+    raw = [_to_bytes(value) for value in values]
+    size = len(raw)
+    lengths = np.fromiter(map(len, raw), dtype=np.int64, count=size)
+    fixed = b''.join(value[:4].ljust(4, b'\x00') for value in raw)
+    matrix = np.frombuffer(fixed, dtype=np.uint8).reshape(size, 4)
+
+    offset = (matrix[:, 0] == VALUE_PREFIX).astype(np.int64)
+    missing = lengths < 3 + offset
+    rows = np.arange(size)
+
+    return [
+        pd.Series(
+            pd.arrays.IntegerArray(
+                matrix[rows, offset + component].copy(), missing.copy()
+            ),
+            index=values.index,
+        )
+        for component in range(3)
+    ]
+
+
+def decode_statistics(df: pd.DataFrame) -> pd.DataFrame:
+    """Десятичные компоненты всех 9 колонок BLOB в виде 27 колонок UInt8."""
+    decoded = {}
+    for phase in PHASES:
+        for measurement in MEASUREMENTS:
+            components = decode_bytes_column(df[f'{measurement}_{phase}'])
+            for component, series in enumerate(components, start=1):
+                name = f'decimal_{measurement}_{phase}_{component}'
+                decoded[name] = series
+    return pd.DataFrame(decoded, index=df.index)
+
+
+def pack_statistics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Компактная форма decode_statistics для хранения в БД: три компоненты
+    каждой колонки BLOB упаковываются в одно целое (c1 << 16 | c2 << 8 | c3),
+    недекодируемое значение — NO_VALUE. Возвращает 9 колонок
+    DECODED_COLUMNS типа Int64.
+    """
+    packed = {}
+    for phase in PHASES:
+        for measurement in MEASUREMENTS:
+            components = decode_bytes_column(df[f'{measurement}_{phase}'])
+            values = np.zeros(len(df), dtype=np.int64)
+            for series in components:
+                values = (values << 8) | series.to_numpy(
+                    dtype=np.int64, na_value=0)
+            values[components[0].isna().to_numpy()] = NO_VALUE
+            packed[f'decoded_{measurement}_{phase}'] = pd.Series(
+                values, index=df.index, dtype='Int64')
+    return pd.DataFrame(packed, index=df.index)
+
+
+def unpack_statistics(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Результат decode_statistics по сохранённым колонкам DECODED_COLUMNS
+    (NO_VALUE — <NA>). Строки без сохранённого значения (загруженные до
+    включения Config.STORE_DECODED) декодируются из BLOB.
+    """
+    decoded = {}
+    for phase in PHASES:
+        for measurement in MEASUREMENTS:
+            packed = pd.array(
+                df[f'decoded_{measurement}_{phase}'], dtype='Int64')
+            values = packed.to_numpy(dtype=np.int64, na_value=0)
+            missing = packed.isna()
+            empty = missing | (values == NO_VALUE)
+            data = [(values >> shift) & 0xFF for shift in (16, 8, 0)]
+            masks = [empty.copy() for _ in range(3)]
+
+            raw = df[f'{measurement}_{phase}']
+            fallback = np.flatnonzero(missing & raw.notna().to_numpy())
+            if fallback.size:
+                components = decode_bytes_column(raw.iloc[fallback])
+                for component, series in enumerate(components):
+                    data[component][fallback] = series.to_numpy(
+                        dtype=np.int64, na_value=0)
+                    masks[component][fallback] = series.isna().to_numpy()
+
+            for component in range(3):
+                name = f'decimal_{measurement}_{phase}_{component + 1}'
+                decoded[name] = pd.Series(
+                    pd.arrays.IntegerArray(
+                        data[component].astype(np.uint8), masks[component]),
+                    index=df.index,
+                )
+    return pd.DataFrame(decoded, index=df.index)
@@ -0,0 +1,295 @@
+import datetime as dt
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+from sqlalchemy import create_engine
+
+from .archive import (
+    ZIP_METHODS, check_zip_level, checkpoint_db, unzip_db, zip_db
+)
+from .columnar import COLUMNS, ColumnarArchive, write_columnar
+from .config import Config
+from .db_files import (
+    DELTA_EXTENSION, MonthlyDBFile, delta_path, find_monthly_dbs, remove_db
+)
+from .decoding import DECODED_COLUMNS
+from .lock import db_lock
+from .models import LAYOUT_MODELS
+
+
+# Дельта-файл <имя>.delta.db — обычная БД со схемой statistic, в которую
+# пишутся поздние строки заархивированного месяца (шарда). Чтение архива
+# .cols добавляет строки дельты, распаковка .zip переносит дельту в БД,
+# а --compact_deltas пересобирает архивы вместе с дельтами.
+
+
+def _table_columns(connection: sqlite3.Connection, schema: str) -> set[str]:
+    return {
+        row[1] for row
+        in connection.execute(f'PRAGMA {schema}.table_info(statistic)')
+    }
+
+
+def merge_rows(
+    target_path: str, source_path: str, days: list[str] | None = None
+) -> int:
+    """
+    Переносит строки таблицы statistic из source_path в target_path (при
+    days — только за эти дни YYYY-MM-DD). Дубликаты отбрасываются
+    уникальным ключом таблицы (INSERT OR IGNORE). Возвращает число
+    добавленных строк.
+    """
+    connection = sqlite3.connect(target_path, timeout=Config.DB_BUSY_TIMEOUT)
+    try:
+        connection.execute('ATTACH DATABASE ? AS source', (source_path,))
+        target_columns = _table_columns(connection, 'main')
+        source_columns = _table_columns(connection, 'source')
+        columns = ', '.join(COLUMNS + tuple(
+            name for name in DECODED_COLUMNS
+            if name in target_columns and name in source_columns
+        ))
+        query = (
+            f'INSERT OR IGNORE INTO main.statistic ({columns}) '
+            f'SELECT {columns} FROM source.statistic'
+        )
+        params = []
+        if days is not None:
+            query += (
+                ' WHERE substr(timestamp, 1, 10) IN '
+                f'({", ".join("?" * len(days))})'
+            )
+            params = days
+        with connection:
+            added = connection.execute(
+                query + ' ORDER BY timestamp', params).rowcount
+        connection.execute('DETACH DATABASE source')
+    finally:
+        connection.close()
+    return added
+
+
+def fold_delta(db_path: str, delta: str | None = None) -> int:
+    """
+    Переносит дельта-файл в распакованную БД месяца и удаляет его.
+    Вызывается под блокировкой месяца.
+    """
+    delta = delta or delta_path(db_path)
+    added = merge_rows(db_path, delta)
+    remove_db(delta)
+    return added
+
+
+def _read_delta(path: str, query: str, params: list) -> list[tuple]:
+    connection = sqlite3.connect(
+        f'file:{path}?mode=ro', uri=True, timeout=Config.DB_BUSY_TIMEOUT)
+    try:
+        return connection.execute(query, params).fetchall()
+    except sqlite3.OperationalError:
+        # Дельта только что создана и ещё без таблицы
+        return []
+    finally:
+        connection.close()
+
+
+def archive_modems(
+    db_file: MonthlyDBFile, archive: ColumnarArchive | None = None
+) -> list[str]:
+    """Модемы архива .cols и его дельта-файла."""
+    archive = archive or ColumnarArchive(db_file.path)
+    modem_ips = set(archive.modems())
+    path = delta_path(db_file.path)
+    if os.path.isfile(path):
+        modem_ips.update(row[0] for row in _read_delta(
+            path, 'SELECT DISTINCT modem_ip FROM statistic', []))
+    return sorted(modem_ips)
+
+
+def read_modem_rows(
+    db_file: MonthlyDBFile,
+    modem_ip: str,
+    start: dt.datetime | None = None,
+    end: dt.datetime | None = None,
+    archive: ColumnarArchive | None = None,
+) -> dict[str, list]:
+    """
+    Показания модема из архива .cols по колонкам (как
+    ColumnarArchive.read_modem) вместе со строками дельта-файла месяца.
+    Строки дельты, уже попавшие в архив, пропускаются.
+    """
+    archive = archive or ColumnarArchive(db_file.path)
+    result = archive.read_modem(modem_ip, start, end)
+    path = delta_path(db_file.path)
+    if not os.path.isfile(path):
+        return result
+
+    query = f'SELECT {", ".join(COLUMNS)} FROM statistic WHERE modem_ip = ?'
+    params: list = [modem_ip]
+    if start is not None:
+        query += ' AND timestamp >= ?'
+        params.append(start.strftime('%Y-%m-%d %H:%M:%S.%f'))
+    if end is not None:
+        query += ' AND timestamp <= ?'
+        params.append(end.strftime('%Y-%m-%d %H:%M:%S.%f'))
+
+    delta_rows = _read_delta(path, query, params)
+    if not delta_rows:
+        return result
+
+    rows = list(zip(*(result[column] for column in COLUMNS)))
+    keys = {row[:4] for row in rows}
+    for row in delta_rows:
+        row = (dt.datetime.fromisoformat(row[0]),) + row[1:]
+        if row[:4] not in keys:
+            keys.add(row[:4])
+            rows.append(row)
+    rows.sort(key=lambda row: row[0])
+
+    return {
+        column: [row[index] for row in rows]
+        for index, column in enumerate(COLUMNS)
+    }
+
+
+def _create_statistic_db(db_path: str):
+    engine = create_engine(f'sqlite:///{db_path}')
+    try:
+        LAYOUT_MODELS['rowid'].metadata.create_all(engine)
+    finally:
+        engine.dispose()
+
+
+def _archive_level(method: str, archive_format: str) -> int | None:
+    """
+    Уровень сжатия для пересборки архива: уровень в архиве не хранится,
+    поэтому берётся Config.ZIP_LEVEL, если он подходит методу архива.
+    """
+    try:
+        check_zip_level(method, Config.ZIP_LEVEL, archive_format)
+    except ValueError:
+        return None
+    return Config.ZIP_LEVEL
+
+
+def _compact_zip(zip_path: str, delta: str) -> int:
+    """
+    Распаковывает архив во временный каталог, добавляет дельту и заменяет
+    архив новым, сжатым тем же методом.
+    """
+    with zipfile.ZipFile(zip_path) as zipf:
+        compress_type = zipf.infolist()[0].compress_type
+    method = next((
+        name for name, value in ZIP_METHODS.items()
+        if value == compress_type
+    ), Config.ZIP_METHOD)
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(zip_path)) as tmp:
+        unzip_db(zip_path, tmp)
+        db_path = os.path.join(
+            tmp, os.path.basename(zip_path)[:-len('.zip')] + '.db')
+        added = merge_rows(db_path, delta)
+        zip_db(
+            db_path, tmp, method, _archive_level(method, 'zip'),
+            Config.ZIP_VACUUM)
+        os.replace(
+            os.path.join(tmp, os.path.basename(zip_path)), zip_path)
+    return added
+
+
+def _compact_columnar(cols_path: str, delta: str) -> int:
+    """
+    Собирает из архива .cols и дельты временную БД и записывает из неё
+    новый архив .cols.
+    """
+    archive = ColumnarArchive(cols_path)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(cols_path)) as tmp:
+        db_path = os.path.join(tmp, 'statistic.db')
+        _create_statistic_db(db_path)
+        connection = sqlite3.connect(db_path)
+        try:
+            with connection:
+                for _, columns in archive.iter_modems():
+                    connection.executemany(
+                        f'INSERT INTO statistic ({", ".join(COLUMNS)}) '
+                        f'VALUES ({", ".join("?" * len(COLUMNS))})',
+                        zip(*(
+                            [
+                                timestamp.strftime('%Y-%m-%d %H:%M:%S.%f')
+                                for timestamp in columns['timestamp']
+                            ] if column == 'timestamp' else columns[column]
+                            for column in COLUMNS
+                        ))
+                    )
+        finally:
+            connection.close()
+
+        added = merge_rows(db_path, delta)
+        tmp_cols = os.path.join(tmp, os.path.basename(cols_path))
+        rows = write_columnar(
+            db_path, tmp_cols, archive.method,
+            _archive_level(archive.method, 'columnar'))
+        if (
+            rows != archive.rows + added
+            or ColumnarArchive(tmp_cols).verify() != rows
+        ):
+            raise ValueError(f'Архив {cols_path} не прошёл проверку')
+        os.replace(tmp_cols, cols_path)
+    return added
+
+
+def compact_delta(delta: str) -> dict | None:
+    """
+    Переносит дельта-файл в его месяц: в распакованную БД, в архив .zip
+    или .cols (архив пересобирается и заменяется только после проверки).
+    Возвращает {filename, rows, seconds} или None, если дельту уже
+    перенёс другой процесс.
+    """
+    stem = delta[:-len(DELTA_EXTENSION)]
+    with db_lock(delta):
+        if not os.path.isfile(delta):
+            return None
+
+        start_time = time.perf_counter()
+        # Строки дельты из WAL переносятся в её основной файл
+        checkpoint_db(delta)
+        if os.path.isfile(stem + '.db'):
+            target = stem + '.db'
+            rows = merge_rows(target, delta)
+        elif os.path.isfile(stem + '.zip'):
+            target = stem + '.zip'
+            rows = _compact_zip(target, delta)
+        elif os.path.isfile(stem + '.cols'):
+            target = stem + '.cols'
+            rows = _compact_columnar(target, delta)
+        else:
+            # Архива больше нет: дельта становится БД месяца
+            target = stem + '.db'
+            os.replace(delta, target)
+            rows = None
+
+        remove_db(delta)
+        return {
+            'filename': os.path.basename(target),
+            'rows': rows,
+            'seconds': time.perf_counter() - start_time,
+        }
+
+
+def compact_deltas(data_dir: str | None = None) -> list[dict]:
+    """Переносит все дельта-файлы каталога в их месяцы."""
+    reports = []
+    for delta_file in find_monthly_dbs(data_dir, (DELTA_EXTENSION,)):
+        report = compact_delta(delta_file.path)
+        if report is not None:
+            reports.append(report)
+    return reports
+
+
+def print_compact_report(report: dict):
+    if report['rows'] is None:
+        result = 'архива нет, дельта сохранена как БД месяца'
+    else:
+        result = f'добавлено строк: {report["rows"]}'
+    print(f'{report["filename"]}: {result} ({report["seconds"]:.2f} сек.)')
@@ -0,0 +1,159 @@
+import datetime as dt
+import hashlib
+import os
+import pickle
+import zlib
+
+import pandas as pd
+
+from .autotune import get_tuner
+from .config import Config
+from .db_files import MonthlyDBFile, db_signature
+from .delta import read_modem_rows
+from .utils import CountersStatisticDB
+
+
+# Запись кэша — подготовленные показания одного модема за весь файл
+# месяца (или шарда): DataFrame в pickle, сжатый zlib. Имя записи:
+#   <хэш файла и модема>_<хэш сигнатуры файла>.pkl.z
+# Сигнатура (размер и время изменения файла, дельты и WAL) меняется при
+# записи в БД, поэтому устаревшая запись просто перестаёт находиться и
+# удаляется при следующем сохранении или вытесняется по LRU (время
+# изменения записи обновляется при каждом чтении).
+ENTRY_SUFFIX = '.pkl.z'
+
+
+class ExportCache:
+    """Дисковый LRU-кэш показаний модема по месяцам для экспорта."""
+
+    def __init__(
+        self,
+        cache_dir: str | None = None,
+        max_size: int = Config.EXPORT_CACHE_SIZE,
+    ):
+        self.cache_dir = cache_dir or Config.EXPORT_CACHE_DIR
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _hash(*parts) -> str:
+        return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+    def entry_prefix(self, db_file: MonthlyDBFile, modem_ip: str) -> str:
+        return f'{self._hash(db_file.path, modem_ip)}_'
+
+    def entry_path(self, db_file: MonthlyDBFile, modem_ip: str) -> str:
+        return os.path.join(
+            self.cache_dir,
+            self.entry_prefix(db_file, modem_ip)
+            + self._hash(db_signature(db_file.path))
+            + ENTRY_SUFFIX
+        )
+
+    @staticmethod
+    def is_cacheable(db_file: MonthlyDBFile) -> bool:
+        """Текущий месяц ещё пополняется, поэтому не кэшируется."""
+        return Config.EXPORT_CACHE and db_file.end <= dt.datetime.now()
+
+    def get(
+        self, db_file: MonthlyDBFile, modem_ip: str
+    ) -> pd.DataFrame | None:
+        path = self.entry_path(db_file, modem_ip)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+
+        try:
+            df = pickle.loads(zlib.decompress(data))
+        except (zlib.error, pickle.UnpicklingError, EOFError):
+            # Повреждённая запись пересчитывается
+            os.remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return df
+
+    def put(self, db_file: MonthlyDBFile, modem_ip: str, df: pd.DataFrame):
+        path = self.entry_path(db_file, modem_ip)
+        prefix = self.entry_prefix(db_file, modem_ip)
+        for filename in os.listdir(self.cache_dir):
+            stale_path = os.path.join(self.cache_dir, filename)
+            if filename.startswith(prefix) and stale_path != path:
+                self._remove(stale_path)
+
+        data = zlib.compress(
+            pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Удаляет давно не читавшиеся записи сверх max_size байт."""
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if not filename.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, filename)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def read_month(
+        self, db_file: MonthlyDBFile, modem_ip: str
+    ) -> tuple[pd.DataFrame, bool]:
+        """
+        Все подготовленные показания модема из файла месяца (.db или .cols).
+        Возвращает DataFrame и признак того, что он взят из кэша.
+        """
+        cacheable = self.is_cacheable(db_file)
+        if cacheable:
+            df = self.get(db_file, modem_ip)
+            if df is not None:
+                return df, True
+
+        # Если БД изменилась во время чтения, результат не сохраняется
+        signature_path = self.entry_path(db_file, modem_ip)
+
+        if db_file.extension == '.cols':
+            df = CountersStatisticDB.prepare_statistics(pd.DataFrame(
+                read_modem_rows(db_file, modem_ip)))
+        else:
+            db = CountersStatisticDB(db_file.path, read_only=True)
+            try:
+                df = db.get_statistics_dataframe(
+                    db_file.start,
+                    db_file.end - dt.timedelta(microseconds=1),
+                    modem_ip,
+                    tuner=get_tuner('export_page'),
+                )
+            finally:
+                db.engine.dispose()
+
+        if cacheable and signature_path == self.entry_path(
+            db_file, modem_ip
+        ):
+            self.put(db_file, modem_ip, df)
+        return df, False
@@ -0,0 +1,83 @@
+import json
+import subprocess
+import sys
+import tempfile
+
+from .config import Config
+
+
+# Лёгкие команды: каждая запускается целиком (вместе с отложенными
+# импортами внутри команды) в отдельном интерпретаторе на пустых каталогах.
+LIGHTWEIGHT_COMMANDS = ('remove_processed_csv_gz', 'zip_and_remove_old_dbs')
+HEAVY_MODULES = ('pandas', 'numpy', 'sqlalchemy', 'openpyxl', 'dateutil')
+
+# Каталоги Config (*_DIR) подменяются пустым временным каталогом, команда
+# выполняется через __main__, после неё печатаются загруженные модули.
+_RUN_COMMAND = '''
+import json, runpy, sys
+from core.config import Config
+for name in dir(Config):
+    if name.endswith('_DIR') and name != 'ROOT_DIR':
+        setattr(Config, name, sys.argv[1])
+sys.argv = ['counters_statistics.py', '--' + sys.argv[2]]
+runpy.run_path('counters_statistics.py', run_name='__main__')
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+def measure_command(command: str) -> tuple[float, set[str]]:
+    """
+    Выполняет команду в отдельном интерпретаторе с `-X importtime` и
+    возвращает суммарное время импорта (мс) и множество модулей,
+    загруженных к концу команды.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result = subprocess.run(
+            [
+                sys.executable, '-X', 'importtime', '-c', _RUN_COMMAND,
+                tmp_dir, command,
+            ],
+            cwd=Config.ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        # Модули верхнего уровня не имеют отступа в имени
+        if not name[1:].startswith(' '):
+            total_us += int(cumulative)
+
+    modules = set(json.loads(result.stdout.splitlines()[-1]))
+    return total_us / 1000, modules
+
+
+def benchmark_import_time() -> bool:
+    """
+    Проверяет, что лёгкие команды (LIGHTWEIGHT_COMMANDS) не импортируют
+    тяжёлые зависимости и укладываются в Config.IMPORT_TIME_LIMIT_MS.
+    """
+    success = True
+
+    for command in LIGHTWEIGHT_COMMANDS:
+        total_ms, modules = measure_command(command)
+        heavy = sorted(
+            {module.split('.')[0] for module in modules} & set(HEAVY_MODULES))
+        ok = total_ms <= Config.IMPORT_TIME_LIMIT_MS and not heavy
+        success = success and ok
+
+        status = 'OK' if ok else 'FAIL'
+        print(
+            f'[{status}] --{command}: {round(total_ms, 2)} мс. '
+            f'(лимит {Config.IMPORT_TIME_LIMIT_MS} мс.)'
+        )
+        if heavy:
+            print(f'    Тяжёлые модули: {", ".join(heavy)}')
+
+    return success
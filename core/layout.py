@@ -0,0 +1,214 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from .config import Config
+from .db_files import remove_db
+from .decoding import DECODED_COLUMNS
+from .lock import db_lock
+from .models import LAYOUT_MODELS
+
+
+# Порядок вставки строк: для rowid — как при загрузке (по времени),
+# для clustered — по первичному ключу, чтобы страницы B-дерева заполнялись
+# последовательно
+LAYOUT_ORDER = {
+    'rowid': 'timestamp, modem_ip, mac, local_id',
+    'clustered': 'modem_ip, mac, local_id, timestamp',
+}
+LAYOUT_COLUMNS = (
+    'timestamp', 'modem_ip', 'mac', 'local_id',
+    'voltage_1', 'current_1', 'angle_1',
+    'voltage_2', 'current_2', 'angle_2',
+    'voltage_3', 'current_3', 'angle_3',
+)
+
+
+def detect_layout(db_path: str) -> str | None:
+    """Структура таблицы statistic: rowid, clustered или None (нет таблицы)."""
+    connection = sqlite3.connect(
+        f'file:{db_path}?mode=ro', uri=True, timeout=Config.DB_BUSY_TIMEOUT)
+    try:
+        columns = {
+            row[1] for row
+            in connection.execute('PRAGMA table_info(statistic)')
+        }
+    finally:
+        connection.close()
+
+    if not columns:
+        return None
+    return 'rowid' if 'id' in columns else 'clustered'
+
+
+def _copy_statistics(db_path: str, tmp_path: str, layout: str) -> int:
+    """
+    Создаёт в tmp_path таблицу нужной структуры и копирует в неё строки
+    в порядке LAYOUT_ORDER (вместе с колонками декодированных значений,
+    если они есть в исходной БД). Возвращает количество строк.
+    """
+    engine = create_engine(f'sqlite:///{tmp_path}')
+    try:
+        LAYOUT_MODELS[layout].metadata.create_all(engine)
+    finally:
+        engine.dispose()
+
+    connection = sqlite3.connect(tmp_path, timeout=Config.DB_BUSY_TIMEOUT)
+    try:
+        connection.execute('ATTACH DATABASE ? AS source', (db_path,))
+        source_columns = {
+            row[1] for row
+            in connection.execute('PRAGMA source.table_info(statistic)')
+        }
+        decoded = [
+            name for name in DECODED_COLUMNS if name in source_columns]
+        for name in decoded:
+            connection.execute(
+                f'ALTER TABLE main.statistic ADD COLUMN {name} INTEGER')
+        columns = ', '.join(LAYOUT_COLUMNS + tuple(decoded))
+        with connection:
+            connection.execute(
+                f'INSERT INTO main.statistic ({columns}) '
+                f'SELECT {columns} FROM source.statistic '
+                f'ORDER BY {LAYOUT_ORDER[layout]}'
+            )
+        copied, = connection.execute(
+            'SELECT COUNT(*) FROM main.statistic').fetchone()
+        source_rows, = connection.execute(
+            'SELECT COUNT(*) FROM source.statistic').fetchone()
+        connection.execute('DETACH DATABASE source')
+        connection.execute('ANALYZE')
+    finally:
+        connection.close()
+
+    if copied != source_rows:
+        raise ValueError(
+            f'Скопировано {copied} строк из {source_rows} в {tmp_path}')
+    return copied
+
+
+def convert_layout(db_path: str, layout: str) -> dict | None:
+    """
+    Перестраивает таблицу statistic месячной БД в структуру layout
+    (rowid или clustered — WITHOUT ROWID с ключом modem_ip, mac, local_id,
+    timestamp). Новый файл собирается рядом и заменяет исходный только
+    после сверки числа строк. Возвращает None, если БД уже в нужной
+    структуре.
+    """
+    from .archive import checkpoint_db
+
+    with db_lock(db_path):
+        if not os.path.isfile(db_path):
+            raise FileNotFoundError(f'Файл базы данных не найден: {db_path}')
+        if detect_layout(db_path) == layout:
+            return None
+
+        start_time = time.perf_counter()
+        checkpoint_db(db_path)
+        file_size = os.path.getsize(db_path)
+        tmp_path = f'{db_path}.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        try:
+            rows = _copy_statistics(db_path, tmp_path, layout)
+            os.replace(tmp_path, db_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        remove_db(db_path, journals_only=True)
+
+        return {
+            'filename': os.path.basename(db_path),
+            'rows': rows,
+            'file_size': file_size,
+            'new_size': os.path.getsize(db_path),
+            'seconds': time.perf_counter() - start_time,
+        }
+
+
+def _time_modem_queries(
+    db_path: str, modem_ips: list[str], repeat: int
+) -> float:
+    """Среднее время (сек.) выборки всех показаний одного модема."""
+    connection = sqlite3.connect(
+        f'file:{db_path}?mode=ro', uri=True, timeout=Config.DB_BUSY_TIMEOUT)
+    columns = ', '.join(LAYOUT_COLUMNS)
+    try:
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            for modem_ip in modem_ips:
+                connection.execute(
+                    f'SELECT {columns} FROM statistic WHERE modem_ip = ? '
+                    'ORDER BY timestamp',
+                    (modem_ip,)
+                ).fetchall()
+        seconds = time.perf_counter() - start_time
+    finally:
+        connection.close()
+    return seconds / (repeat * len(modem_ips))
+
+
+def benchmark_layout(
+    db_path: str, sample_size: int = 20, repeat: int = 3
+) -> list[tuple[str, int, float]]:
+    """
+    Сравнивает размер файла и время выборки по модему для обеих структур
+    таблицы на копиях месячной БД (исходный файл не меняется).
+    Возвращает строки (структура, размер, среднее время запроса).
+    """
+    from .archive import checkpoint_db
+
+    with tempfile.TemporaryDirectory(dir=Config.DATA_DIR) as tmp_dir:
+        # Месяц блокируется только на время копирования: замеры идут на
+        # копиях и не задерживают загрузку в этот месяц
+        layout_paths = {}
+        with db_lock(db_path):
+            checkpoint_db(db_path)
+            connection = sqlite3.connect(
+                f'file:{db_path}?mode=ro', uri=True,
+                timeout=Config.DB_BUSY_TIMEOUT)
+            try:
+                modem_ips = [
+                    row[0] for row in connection.execute(
+                        'SELECT DISTINCT modem_ip FROM statistic')
+                ]
+            finally:
+                connection.close()
+
+            if not modem_ips:
+                return []
+            for layout in LAYOUT_MODELS:
+                layout_paths[layout] = os.path.join(tmp_dir, f'{layout}.db')
+                _copy_statistics(db_path, layout_paths[layout], layout)
+
+        sample = random.Random(0).sample(
+            modem_ips, min(sample_size, len(modem_ips)))
+        results = []
+        for layout, layout_path in layout_paths.items():
+            # Прогрев кэша ОС, чтобы сравнивать структуры, а не диск
+            _time_modem_queries(layout_path, sample, 1)
+            results.append((
+                layout,
+                os.path.getsize(layout_path),
+                _time_modem_queries(layout_path, sample, repeat),
+            ))
+    return results
+
+
+def print_layout_benchmark(
+    db_path: str, results: list[tuple[str, int, float]]
+):
+    print(f'Структура таблицы {os.path.basename(db_path)}:')
+    print(f'{"Структура":<10} {"Размер, МБ":>11} {"Запрос модема, мс":>18}')
+    for layout, size, seconds in results:
+        print(
+            f'{layout:<10} {size / 1024 ** 2:>11.1f} '
+            f'{seconds * 1000:>18.2f}'
+        )
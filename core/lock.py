@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from .config import Config
+from .db_files import DELTA_EXTENSION
+
+
+class DBLockTimeoutError(TimeoutError):
+    pass
+
+
+# Блокировки, уже удерживаемые потоками процесса: (путь, поток) ->
+# (fd, счётчик). flock на новый дескриптор того же файла заблокировал бы
+# сам себя, поэтому повторный захват в том же потоке только увеличивает
+# счётчик. Другой поток открывает свой дескриптор и ждёт, как другой
+# процесс.
+_held_locks: dict[tuple[str, int], list[int]] = {}
+
+
+def lock_path_for(db_path: str) -> str:
+    """
+    Файл блокировки общий для .db, архивов и дельта-файла одного месяца.
+    """
+    db_path = os.path.abspath(db_path)
+    if db_path.endswith(DELTA_EXTENSION):
+        db_path = db_path[:-len(DELTA_EXTENSION)]
+    stem = os.path.splitext(db_path)[0]
+    return f'{stem}.lock'
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def _unlock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def db_lock(
+    db_path: str,
+    timeout: float = Config.LOCK_TIMEOUT,
+    retry_interval: float = Config.LOCK_RETRY_INTERVAL,
+) -> Iterator[None]:
+    """
+    Эксклюзивная межпроцессная блокировка месячной БД. Используется
+    загрузкой, разбиением по месяцам и архивацией, чтобы задачи cron
+    дожидались друг друга, а не падали на полузаархивированном месяце.
+    Повторный захват в том же потоке не блокирует.
+    """
+    path = lock_path_for(db_path)
+    key = (path, threading.get_ident())
+
+    if key in _held_locks:
+        _held_locks[key][1] += 1
+        try:
+            yield
+        finally:
+            _held_locks[key][1] -= 1
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o664)
+    deadline = time.monotonic() + timeout
+    waiting = False
+
+    try:
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                raise DBLockTimeoutError(
+                    f'Не удалось дождаться блокировки {path} '
+                    f'за {timeout} сек.')
+            if not waiting:
+                print(f'БД {db_path} занята другой задачей, ожидание...')
+                waiting = True
+            time.sleep(retry_interval)
+    except BaseException:
+        os.close(fd)
+        raise
+
+    _held_locks[key] = [fd, 1]
+    try:
+        yield
+    finally:
+        del _held_locks[key]
+        _unlock(fd)
+        os.close(fd)
@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, DateTime, BLOB, UniqueConstraint
+    Column, Integer, String, DateTime, BLOB, UniqueConstraint, Index
 )
 from sqlalchemy.orm import DeclarativeBase
 
@@ -8,14 +8,11 @@ class Base(DeclarativeBase):
     pass
 
 
-class Statistic(Base):
-    __tablename__ = 'statistic'
+class ClusteredBase(DeclarativeBase):
+    pass
 
-    id = Column(Integer, primary_key=True, nullable=False)
-    timestamp = Column(DateTime, nullable=False, index=True)
-    modem_ip = Column(String(length=32), nullable=False, index=True)
-    mac = Column(String(length=32), nullable=False, index=True)
-    local_id = Column(Integer, nullable=False)
+
+class StatisticValuesMixin:
     voltage_1 = Column(BLOB, nullable=True)
     current_1 = Column(BLOB, nullable=True)
     angle_1 = Column(BLOB, nullable=True)
@@ -26,14 +23,49 @@ class Statistic(Base):
     current_3 = Column(BLOB, nullable=True)
     angle_3 = Column(BLOB, nullable=True)
 
+    def __str__(self):
+        return (
+            f'{self.timestamp} - {self.modem_ip} - '
+            f'{self.mac} - {self.local_id}'
+        )
+
+
+class Statistic(StatisticValuesMixin, Base):
+    __tablename__ = 'statistic'
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    timestamp = Column(DateTime, nullable=False, index=True)
+    modem_ip = Column(String(length=32), nullable=False, index=True)
+    mac = Column(String(length=32), nullable=False, index=True)
+    local_id = Column(Integer, nullable=False)
+
     __table_args__ = (
         UniqueConstraint(
             'timestamp', 'modem_ip', 'mac', 'local_id', name='unique_statistic'
         ),
     )
 
-    def __str__(self):
-        return (
-            f'{self.timestamp} - {self.modem_ip} - '
-            f'{self.mac} - {self.local_id}'
-        )
+
+class ClusteredStatistic(StatisticValuesMixin, ClusteredBase):
+    """
+    Таблица statistic без rowid: строки физически упорядочены по первичному
+    ключу (modem_ip, mac, local_id, timestamp), поэтому показания одного
+    модема лежат рядом, а отдельный уникальный индекс не нужен.
+    """
+    __tablename__ = 'statistic'
+
+    modem_ip = Column(String(length=32), primary_key=True)
+    mac = Column(String(length=32), primary_key=True)
+    local_id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime, primary_key=True)
+
+    __table_args__ = (
+        Index('ix_statistic_timestamp', 'timestamp'),
+        {'sqlite_with_rowid': False},
+    )
+
+
+LAYOUT_MODELS = {
+    'rowid': Statistic,
+    'clustered': ClusteredStatistic,
+}
@@ -0,0 +1,326 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from .columnar import ColumnarArchive
+from .config import Config
+from .db_files import find_month_sources
+from .delta import archive_modems, read_modem_rows
+from .decoding import PHASES
+from .progress_bar import progress_bar
+from .utils import CountersStatisticDB
+
+
+# Значение из трёх байт ответа счётчика (колонки decimal_*_1..3): старший
+# байт без двух флаговых битов, затем младший и средний байты
+# (порядок ответа счётчиков «Меркурий»), умноженные на масштаб величины.
+MEASUREMENT_SCALES = {'voltage': 0.01, 'current': 0.001, 'angle': 0.01}
+# События: провал напряжения, перенапряжение и превышение тока хотя бы
+# в одной фазе
+EVENTS = ('sag', 'swell', 'overcurrent')
+
+
+def measurement_values(df: pd.DataFrame, measurement: str) -> np.ndarray:
+    """
+    Значения величины по фазам в виде массива (строки, 3) с NaN на месте
+    пустых значений.
+    """
+    values = np.empty((len(df), len(PHASES)))
+    for index, phase in enumerate(PHASES):
+        high, low, middle = (
+            df[f'decimal_{measurement}_{phase}_{component}'].to_numpy(
+                dtype=float, na_value=np.nan)
+            for component in (1, 2, 3)
+        )
+        values[:, index] = (
+            (high % 64) * 65536 + middle * 256 + low
+        ) * MEASUREMENT_SCALES[measurement]
+    return values
+
+
+def imbalance(values: np.ndarray) -> np.ndarray:
+    """
+    Небаланс фаз, %: (максимум - минимум) / среднее по трём фазам.
+    NaN, если значение одной из фаз отсутствует или среднее равно нулю.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = values.mean(axis=1)
+        result = (values.max(axis=1) - values.min(axis=1)) / mean * 100
+    result[~(mean > 0)] = np.nan
+    return result
+
+
+class PowerQualityStats:
+    """
+    Накопитель показателей качества электроэнергии по модемам. Страницы
+    данных добавляются по очереди (в порядке времени), поэтому месяц не
+    нужно держать в памяти целиком. События считаются как переходы
+    счётчика из нормального состояния в состояние с нарушением; состояние
+    каждого счётчика переносится между страницами и месяцами.
+    """
+
+    def __init__(
+        self,
+        nominal_voltage: float = Config.NOMINAL_VOLTAGE,
+        sag: float = Config.VOLTAGE_SAG,
+        swell: float = Config.VOLTAGE_SWELL,
+        current_limit: float = Config.CURRENT_LIMIT,
+    ):
+        self.sag_voltage = nominal_voltage * sag
+        self.swell_voltage = nominal_voltage * swell
+        self.current_limit = current_limit
+        self.modems: dict[str, dict[str, np.ndarray]] = {}
+        self.meters: dict[str, set[tuple[str, int]]] = {}
+        # (modem_ip, mac, local_id) -> нарушения в последней строке
+        self.states: dict[tuple[str, str, int], np.ndarray] = {}
+
+    def _modem(self, modem_ip: str) -> dict[str, np.ndarray]:
+        if modem_ip not in self.modems:
+            phases = len(PHASES)
+            stats = {'records': np.zeros(1)}
+            for measurement in ('voltage', 'current'):
+                stats.update({
+                    f'{measurement}_count': np.zeros(phases),
+                    f'{measurement}_sum': np.zeros(phases),
+                    f'{measurement}_min': np.full(phases, np.inf),
+                    f'{measurement}_max': np.full(phases, -np.inf),
+                    f'{measurement}_imbalance_count': np.zeros(1),
+                    f'{measurement}_imbalance_sum': np.zeros(1),
+                    f'{measurement}_imbalance_max': np.full(1, -np.inf),
+                })
+            stats.update({event: np.zeros(1) for event in EVENTS})
+            self.modems[modem_ip] = stats
+            self.meters[modem_ip] = set()
+        return self.modems[modem_ip]
+
+    def add(self, df: pd.DataFrame):
+        """Добавляет страницу подготовленных данных (prepare_statistics)."""
+        if df.empty:
+            return
+        modem_ips, modem_index = np.unique(
+            df['modem_ip'].to_numpy(dtype=str), return_inverse=True)
+        groups = len(modem_ips)
+        aggregates: dict[str, np.ndarray] = {
+            'records': np.bincount(modem_index, minlength=groups)[:, None]}
+
+        flags = {}
+        for measurement in ('voltage', 'current'):
+            values = measurement_values(df, measurement)
+            valid = ~np.isnan(values)
+
+            count = np.zeros((groups, len(PHASES)))
+            total = np.zeros((groups, len(PHASES)))
+            lowest = np.full((groups, len(PHASES)), np.inf)
+            highest = np.full((groups, len(PHASES)), -np.inf)
+            for phase in range(len(PHASES)):
+                count[:, phase] = np.bincount(
+                    modem_index, valid[:, phase], groups)
+                total[:, phase] = np.bincount(
+                    modem_index,
+                    np.where(valid[:, phase], values[:, phase], 0),
+                    groups)
+                np.fmin.at(lowest[:, phase], modem_index, values[:, phase])
+                np.fmax.at(highest[:, phase], modem_index, values[:, phase])
+            aggregates.update({
+                f'{measurement}_count': count,
+                f'{measurement}_sum': total,
+                f'{measurement}_min': lowest,
+                f'{measurement}_max': highest,
+            })
+
+            ratio = imbalance(values)
+            has_ratio = ~np.isnan(ratio)
+            ratio_max = np.full(groups, -np.inf)
+            np.fmax.at(ratio_max, modem_index, ratio)
+            aggregates.update({
+                f'{measurement}_imbalance_count': np.bincount(
+                    modem_index, has_ratio, groups)[:, None],
+                f'{measurement}_imbalance_sum': np.bincount(
+                    modem_index, np.where(has_ratio, ratio, 0),
+                    groups)[:, None],
+                f'{measurement}_imbalance_max': ratio_max[:, None],
+            })
+
+            with np.errstate(invalid='ignore'):
+                if measurement == 'voltage':
+                    flags['sag'] = (values < self.sag_voltage).any(axis=1)
+                    flags['swell'] = (values > self.swell_voltage).any(axis=1)
+                else:
+                    flags['overcurrent'] = (
+                        values > self.current_limit).any(axis=1)
+
+        for event, crossings in self._crossings(df, flags).items():
+            aggregates[event] = np.bincount(
+                modem_index, crossings, groups)[:, None]
+
+        for group, modem_ip in enumerate(modem_ips):
+            stats = self._modem(modem_ip)
+            for name, values in aggregates.items():
+                if name.endswith('_min'):
+                    stats[name] = np.fmin(stats[name], values[group])
+                elif name.endswith('_max'):
+                    stats[name] = np.fmax(stats[name], values[group])
+                else:
+                    stats[name] = stats[name] + values[group]
+
+        for modem_ip, mac, local_id in df[
+            ['modem_ip', 'mac', 'local_id']
+        ].drop_duplicates().itertuples(index=False):
+            self.meters[modem_ip].add((mac, local_id))
+
+    def _crossings(
+        self, df: pd.DataFrame, flags: dict[str, np.ndarray]
+    ) -> dict[str, np.ndarray]:
+        """
+        Для каждой строки — начинается ли в ней событие: нарушение есть,
+        а в предыдущей по времени строке того же счётчика его не было.
+        """
+        meter_index, meter_keys = pd.factorize(pd.MultiIndex.from_frame(
+            df[['modem_ip', 'mac', 'local_id']]))
+        order = np.lexsort((
+            df['timestamp'].to_numpy(dtype='datetime64[ns]'), meter_index))
+        sorted_meters = meter_index[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sorted_meters[1:] != sorted_meters[:-1]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = first[1:]
+
+        meter_tuples = [meter_keys[code] for code in sorted_meters[first]]
+        carried = np.array([
+            self.states.get(meter, np.zeros(len(EVENTS), dtype=bool))
+            for meter in meter_tuples
+        ]).reshape(-1, len(EVENTS))
+
+        crossings = {}
+        new_states = np.zeros((len(meter_tuples), len(EVENTS)), dtype=bool)
+        for event_index, event in enumerate(EVENTS):
+            current = flags[event][order]
+            previous = np.empty_like(current)
+            previous[1:] = current[:-1]
+            previous[first] = carried[:, event_index]
+            result = np.zeros(len(order), dtype=bool)
+            result[order] = current & ~previous
+            crossings[event] = result
+            new_states[:, event_index] = current[last]
+
+        for meter, state in zip(meter_tuples, new_states):
+            self.states[meter] = state
+        return crossings
+
+    def summary(self) -> pd.DataFrame:
+        """Сводная таблица: одна строка на модем."""
+        rows = []
+        for modem_ip in sorted(self.modems):
+            stats = self.modems[modem_ip]
+            row = {
+                'modem_ip': modem_ip,
+                'meters': len(self.meters[modem_ip]),
+                'records': int(stats['records'][0]),
+            }
+            for measurement in ('voltage', 'current'):
+                count = stats[f'{measurement}_count']
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    mean = stats[f'{measurement}_sum'] / count
+                for index, phase in enumerate(PHASES):
+                    has_values = count[index] > 0
+                    for name, values in (
+                        ('mean', mean),
+                        ('min', stats[f'{measurement}_min']),
+                        ('max', stats[f'{measurement}_max']),
+                    ):
+                        row[f'{measurement}_{name}_{phase}'] = (
+                            round(float(values[index]), 3)
+                            if has_values else np.nan
+                        )
+                imbalance_count = stats[f'{measurement}_imbalance_count'][0]
+                row[f'{measurement}_imbalance_mean'] = (
+                    round(float(
+                        stats[f'{measurement}_imbalance_sum'][0]
+                        / imbalance_count), 2)
+                    if imbalance_count else np.nan
+                )
+                row[f'{measurement}_imbalance_max'] = (
+                    round(float(stats[f'{measurement}_imbalance_max'][0]), 2)
+                    if imbalance_count else np.nan
+                )
+            for event in EVENTS:
+                row[event] = int(stats[event][0])
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def collect_power_quality(
+    start: dt.datetime,
+    end: dt.datetime,
+    modem_ip: str | None = None,
+    page_size: int = 100_000,
+) -> PowerQualityStats:
+    """
+    Считает показатели по всем месячным БД и архивам .cols (вместе с их
+    дельта-файлами), пересекающимся с периодом. Данные каждой БД читаются
+    (только чтение) страницами по ключу из одного снимка.
+    """
+    stats = PowerQualityStats()
+    sources = [
+        db_file for db_file in find_month_sources(('.db', '.cols'))
+        if db_file.start <= end and db_file.end > start
+    ]
+
+    for index, db_file in enumerate(sources):
+        progress_bar(index, len(sources), 'Анализ данных: ')
+        if db_file.extension == '.cols':
+            archive = ColumnarArchive(db_file.path)
+            modem_ips = (
+                [modem_ip] if modem_ip else archive_modems(db_file, archive))
+            for archive_modem_ip in modem_ips:
+                stats.add(CountersStatisticDB.prepare_statistics(
+                    pd.DataFrame(read_modem_rows(
+                        db_file, archive_modem_ip, start, end, archive)),
+                    drop_duplicates=False,
+                ))
+            continue
+
+        db = CountersStatisticDB(db_file.path, read_only=True)
+        try:
+            for df in db.iter_statistics_pages(
+                start, end, modem_ip, page_size=page_size
+            ):
+                stats.add(db.prepare_statistics(df, drop_duplicates=False))
+        finally:
+            db.engine.dispose()
+
+    if sources:
+        progress_bar(len(sources) - 1, len(sources), 'Анализ данных: ')
+    return stats
+
+
+def print_power_quality_report(summary: pd.DataFrame, limit: int = 50):
+    """
+    Краткая сводка: модемы с наибольшим числом событий и небалансом.
+    """
+    report = summary.assign(events=summary[list(EVENTS)].sum(axis=1))
+    report = report.sort_values(
+        ['events', 'voltage_imbalance_max'], ascending=False).head(limit)
+
+    print(
+        f'{"IP модема":<16} {"Счётч.":>6} {"Записей":>9} '
+        f'{"U ср. L1/L2/L3, В":>21} {"Неб. U ср/макс %":>17} '
+        f'{"Неб. I макс %":>13} {"Провал":>6} {"Перенапр.":>9} '
+        f'{"Перегр. I":>9}'
+    )
+    for row in report.itertuples(index=False):
+        voltage = '/'.join(
+            f'{getattr(row, f"voltage_mean_{phase}"):.1f}' for phase in PHASES)
+        print(
+            f'{row.modem_ip:<16} {row.meters:>6} {row.records:>9} '
+            f'{voltage:>21} '
+            f'{row.voltage_imbalance_mean:>8.2f}/'
+            f'{row.voltage_imbalance_max:<8.2f} '
+            f'{row.current_imbalance_max:>13.2f} {row.sag:>6} '
+            f'{row.swell:>9} {row.overcurrent:>9}'
+        )
+    print(
+        f'Модемов: {len(summary)}, с событиями: '
+        f'{int((summary[list(EVENTS)].sum(axis=1) > 0).sum())}.'
+    )
@@ -0,0 +1,213 @@
+import datetime as dt
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator, TypeVar
+
+from .config import Config
+
+
+T = TypeVar('T')
+
+# Включается флагом --profile до запуска команды. Профилируется внешняя
+# команда (execution_time), вложенные команды попадают в её профиль.
+# Процессы ProcessPoolExecutor (--zip_workers, --coverage) не
+# профилируются.
+_options: dict | None = None
+_active = False
+_memory_stages: 'MemoryStages | None' = None
+
+
+def enable_profiling(memory: bool = False):
+    global _options
+    _options = {'memory': memory}
+
+
+class StackSampler:
+    """
+    Снимает стек потока команды каждые interval сек. и считает одинаковые
+    стеки — формат collapsed stacks для flamegraph.pl и speedscope.
+    """
+
+    def __init__(
+        self,
+        thread_id: int,
+        interval: float = Config.PROFILE_SAMPLE_INTERVAL,
+    ):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(
+                    f'{code.co_name} ({os.path.basename(code.co_filename)}'
+                    f':{code.co_firstlineno})'
+                )
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+
+class MemoryStages:
+    """
+    Пик памяти (tracemalloc) по этапам: для каждого этапа — наибольший пик
+    и прирост за вызов, а для первого вызова — места наибольших выделений,
+    оставшихся к концу этапа. Вложенные этапы учитываются и в пике
+    внешнего.
+    """
+
+    def __init__(self, top: int = Config.PROFILE_TOP_ALLOCATIONS):
+        self.top = top
+        self.stack: list[list] = []
+        self.stats: dict[str, dict] = {}
+
+    def enter(self, name: str, sites: bool = True):
+        import tracemalloc
+
+        current, peak = tracemalloc.get_traced_memory()
+        if self.stack:
+            self.stack[-1][2] = max(self.stack[-1][2], peak)
+        tracemalloc.reset_peak()
+        # Сравнение снимков долгое (секунды на миллионы блоков), поэтому
+        # места выделений снимаются только для первого вызова этапа
+        snapshot = None
+        if sites and name not in self.stats:
+            snapshot = tracemalloc.take_snapshot()
+        self.stack.append([name, current, current, snapshot])
+
+    def exit(self):
+        import tracemalloc
+
+        name, start, peak, snapshot = self.stack.pop()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if self.stack:
+            self.stack[-1][2] = max(self.stack[-1][2], peak)
+
+        stats = self.stats.setdefault(
+            name, {'calls': 0, 'peak': 0, 'growth': 0, 'top': []})
+        stats['calls'] += 1
+        stats['peak'] = max(stats['peak'], peak)
+        stats['growth'] = max(stats['growth'], peak - start)
+        if snapshot is not None:
+            stats['top'] = [
+                stat for stat
+                in tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+                if stat.size_diff > 0
+            ][:self.top]
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        self.enter(name)
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as file:
+            for name, stats in sorted(
+                self.stats.items(), key=lambda item: -item[1]['peak']
+            ):
+                file.write(
+                    f'{name}: вызовов {stats["calls"]}, '
+                    f'пик {stats["peak"] / 1024 ** 2:.1f} МБ, '
+                    f'прирост за вызов до '
+                    f'{stats["growth"] / 1024 ** 2:.1f} МБ\n'
+                )
+                for stat in stats['top']:
+                    frame = stat.traceback[0]
+                    file.write(
+                        f'    {frame.filename}:{frame.lineno}: '
+                        f'+{stat.size_diff / 1024:.1f} КБ '
+                        f'({stat.count_diff:+d} блоков)\n'
+                    )
+
+
+def profile_stage(func: Callable[..., T]) -> Callable[..., T]:
+    """Этап команды, для которого при --profile_memory считается пик."""
+    @wraps(func)
+    def wrapper(*args, **kwargs) -> T:
+        if _memory_stages is None:
+            return func(*args, **kwargs)
+        with _memory_stages.stage(func.__qualname__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def profile_command(name: str) -> Iterator[None]:
+    """
+    При включённом профилировании выполняет команду под cProfile и
+    сэмплером стеков и сохраняет в Config.PROFILE_DIR файлы
+    <команда>_<время>.pstats, .collapsed и (с --profile_memory)
+    .memory.txt.
+    """
+    global _active, _memory_stages
+
+    if _options is None or _active:
+        yield
+        return
+
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    base_path = os.path.join(
+        Config.PROFILE_DIR,
+        f'{name}_{dt.datetime.now().strftime("%Y%m%d_%H%M%S")}'
+    )
+
+    _active = True
+    if _options['memory']:
+        tracemalloc.start()
+        _memory_stages = MemoryStages()
+        _memory_stages.enter(name, sites=False)
+    sampler = StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        paths = [f'{base_path}.pstats', f'{base_path}.collapsed']
+        profiler.dump_stats(paths[0])
+        sampler.save(paths[1])
+        if _memory_stages is not None:
+            _memory_stages.exit()
+            paths.append(f'{base_path}.memory.txt')
+            _memory_stages.save(paths[2])
+            _memory_stages = None
+            tracemalloc.stop()
+        _active = False
+
+        print(f'Профиль {name} (по суммарному времени):')
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats(
+            'cumulative').print_stats(Config.PROFILE_PRINT_LIMIT)
+        for path in paths:
+            print(f'Сохранено: {path}')
@@ -0,0 +1,272 @@
+import datetime as dt
+import json
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from .config import Config
+from .db_files import MonthlyDBFile, db_signature, find_month_sources
+from .delta import read_modem_rows
+from .utils import CountersStatisticDB
+
+
+class StatisticsService:
+    """
+    Держит открытыми движки БД последних месяцев и кэширует (LRU) готовые
+    выборки по модему и месяцу. Заархивированные в .cols месяцы читаются
+    из архива. БД открываются только для чтения: сервис не распаковывает
+    архивы и не создаёт файлы.
+    """
+
+    def __init__(
+        self,
+        max_engines: int = Config.SERVER_MAX_ENGINES,
+        cache_size: int = Config.SERVER_CACHE_SIZE,
+    ):
+        self.max_engines = max_engines
+        self.cache_size = cache_size
+        self.engines: OrderedDict[str, CountersStatisticDB] = OrderedDict()
+        # Сигнатура БД при последней проверке структуры движка из пула
+        self.signatures: dict[str, tuple[int, ...]] = {}
+        self.cache: OrderedDict[tuple, pd.DataFrame] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def is_recent(self, db_file: MonthlyDBFile) -> bool:
+        cutoff = dt.datetime.now() - relativedelta(months=Config.MONTH_AGO)
+        return db_file.end > cutoff
+
+    def get_db(self, db_file: MonthlyDBFile) -> CountersStatisticDB:
+        """
+        Движок месяца из пула. В пуле держатся только последние месяцы, чтобы
+        не мешать архивации старых БД. Если БД изменилась, структура
+        таблицы перечитывается (колонки декодированных значений могли
+        появиться после --backfill_decoded). Если файла уже нет,
+        FileNotFoundError.
+        """
+        signature = db_signature(db_file.path)
+        with self.lock:
+            if db_file.path in self.engines:
+                self.engines.move_to_end(db_file.path)
+                db = self.engines[db_file.path]
+                if self.signatures[db_file.path] != signature:
+                    db.refresh_schema()
+                    self.signatures[db_file.path] = signature
+                return db
+
+        db = CountersStatisticDB(db_file.path, read_only=True)
+        if not self.is_recent(db_file):
+            return db
+
+        with self.lock:
+            if db_file.path in self.engines:
+                db.engine.dispose()
+                return self.engines[db_file.path]
+            self.engines[db_file.path] = db
+            self.signatures[db_file.path] = signature
+            while len(self.engines) > self.max_engines:
+                old_path, old_db = self.engines.popitem(last=False)
+                del self.signatures[old_path]
+                old_db.engine.dispose()
+        return db
+
+    def release_db(self, db_file: MonthlyDBFile, db: CountersStatisticDB):
+        if db_file.path not in self.engines:
+            db.engine.dispose()
+
+    def query_month(
+        self,
+        db_file: MonthlyDBFile,
+        modem_ip: str,
+        mac: str | None,
+    ) -> pd.DataFrame:
+        """
+        Все показания модема за месяц. Кэшируется месяц целиком, поэтому
+        запросы с разными периодами используют одну запись кэша.
+        """
+        key = (db_file.path, db_signature(db_file.path), modem_ip, mac)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        if db_file.extension == '.cols':
+            df = CountersStatisticDB.prepare_statistics(pd.DataFrame(
+                read_modem_rows(db_file, modem_ip)))
+            if mac is not None:
+                df = df[df['mac'] == mac].reset_index(drop=True)
+        else:
+            db = self.get_db(db_file)
+            try:
+                df = db.get_statistics_dataframe(
+                    db_file.start,
+                    db_file.end - dt.timedelta(microseconds=1),
+                    modem_ip,
+                    mac
+                )
+            finally:
+                self.release_db(db_file, db)
+
+        with self.lock:
+            # Результаты по изменившейся БД больше не понадобятся
+            for stale_key in [
+                cached for cached in self.cache
+                if cached[0] == key[0] and cached[1] != key[1]
+            ]:
+                del self.cache[stale_key]
+            self.cache[key] = df
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return df
+
+    def query(
+        self,
+        start: dt.datetime,
+        end: dt.datetime,
+        modem_ip: str,
+        mac: str | None = None,
+    ) -> pd.DataFrame:
+        """Показания модема за период из всех подходящих месячных БД."""
+        frames = []
+        for db_file in find_month_sources(('.db', '.cols')):
+            if db_file.start > end or db_file.end <= start:
+                continue
+            df = self.query_month(db_file, modem_ip, mac)
+            df = df[df['timestamp'].between(start, end)]
+            if not df.empty:
+                frames.append(df)
+
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+
+def dataframe_to_response(df: pd.DataFrame, fmt: str) -> tuple[bytes, str]:
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].map(
+                lambda value: value.hex()
+                if isinstance(value, bytes) else value
+            )
+
+    if fmt == 'csv':
+        return df.to_csv(index=False).encode(), 'text/csv; charset=utf-8'
+    return (
+        df.to_json(orient='records', date_format='iso').encode(),
+        'application/json',
+    )
+
+
+class StatisticsRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /statistics?modem_ip=...&start=...&end=...&mac=...&format=json|csv
+    start и end в формате ISO (по умолчанию — последние Config.MONTH_AGO
+    месяцев). GET /health — проверка работы сервиса.
+    """
+
+    service: StatisticsService
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {
+            name: values[-1] for name, values in parse_qs(url.query).items()
+        }
+
+        if url.path == '/health':
+            self.send_body(b'{"status": "ok"}', 'application/json')
+            return
+        if url.path != '/statistics':
+            self.send_error_json(404, 'Неизвестный путь')
+            return
+        if not params.get('modem_ip'):
+            self.send_error_json(400, 'Необходимо указать modem_ip')
+            return
+
+        try:
+            end = (
+                dt.datetime.fromisoformat(params['end'])
+                if 'end' in params else dt.datetime.now()
+            )
+            start = (
+                dt.datetime.fromisoformat(params['start'])
+                if 'start' in params
+                else end - relativedelta(months=Config.MONTH_AGO)
+            )
+        except ValueError:
+            self.send_error_json(400, 'Неверный формат даты start/end')
+            return
+
+        try:
+            df = self.service.query(
+                start, end, params['modem_ip'], params.get('mac'))
+        except FileNotFoundError:
+            # Месяц архивируется или распаковывается прямо сейчас
+            self.send_error_json(
+                404, 'Файл месяца недоступен, повторите запрос позже')
+            return
+        except Exception as e:
+            self.send_error_json(500, str(e))
+            raise
+        body, content_type = dataframe_to_response(
+            df, params.get('format', 'json'))
+        self.send_body(body, content_type)
+
+    def send_body(self, body: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: int, message: str):
+        body = json.dumps({'error': message}, ensure_ascii=False).encode()
+        self.send_body(body, 'application/json; charset=utf-8', status)
+
+    def address_string(self) -> str:
+        # У Unix-сокета нет адреса клиента
+        return self.client_address[0] if self.client_address else 'unix'
+
+
+class ThreadingUnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+def serve(
+    host: str = Config.SERVER_HOST,
+    port: int = Config.SERVER_PORT,
+    socket_path: str | None = Config.SERVER_SOCKET,
+):
+    """
+    Запускает сервис запросов (HTTP на host:port или на Unix-сокете
+    socket_path) и работает до прерывания.
+    """
+    handler = type(
+        'Handler', (StatisticsRequestHandler,),
+        {'service': StatisticsService()}
+    )
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, handler)
+        print(f'Сервис статистики слушает {socket_path}')
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        print(f'Сервис статистики слушает http://{host}:{port}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
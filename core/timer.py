@@ -3,6 +3,8 @@ from typing import Callable, TypeVar
 
 from colorama import Fore, Style
 
+from .profiling import profile_command
+
 
 T = TypeVar('T')
 
@@ -11,7 +13,8 @@ def execution_time(func: Callable[..., T]) -> Callable[..., T]:
     def wrapper(*args: tuple, **kwargs: dict) -> T:
         start_time = datetime.now()
         try:
-            result = func(*args, **kwargs)
+            with profile_command(func.__name__):
+                result = func(*args, **kwargs)
             return result
         finally:
             execution_time = datetime.now() - start_time
@@ -1,63 +1,296 @@
 import gzip
 import os
-import zipfile
 import datetime as dt
 from collections import defaultdict
+from contextlib import nullcontext
 from typing import Iterator
 
 import pandas as pd
 from dateutil.relativedelta import relativedelta
 from pandas.core.series import Series
 from sqlalchemy import (
-    create_engine as sqlalchemy_create_engine, inspect, MetaData, tuple_, func
+    create_engine as sqlalchemy_create_engine, inspect, MetaData, tuple_, func,
+    event, literal_column, text, bindparam, DateTime
 )
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.engine import Engine
 
-from .models import Statistic, Base
+from .archive import zip_db, unzip_db
+from .autotune import BatchTuner, get_tuner
+from .checkpoint import CheckpointStore, file_signature
+from .models import Statistic, ClusteredStatistic, LAYOUT_MODELS
 from .config import Config
+from .db_files import (
+    db_filename, delta_path, find_month_sources, find_partition_path
+)
+from .decoding import (
+    DECODED_COLUMNS, decode_statistics, pack_statistics, unpack_statistics
+)
+from .delta import fold_delta
+from .lock import db_lock
+from .profiling import profile_stage
 from .progress_bar import progress_bar
 
 
+STATISTIC_COLUMNS = [
+    'timestamp', 'modem_ip', 'mac', 'local_id',
+    'voltage_1', 'current_1', 'angle_1',
+    'voltage_2', 'current_2', 'angle_2',
+    'voltage_3', 'current_3', 'angle_3',
+]
+
+
 class CountersStatisticDB(Config):
 
-    def __init__(self, db_path: str | None = None):
-        today = dt.datetime.now()
-        db_name = f'{self.DB_PREFIX}_{today.year}_{today.month:02d}.db'
-        db_path = db_path or os.path.join(self.DATA_DIR, db_name)
-        self.engine = self.create_engine(db_path)
-        Base.metadata.create_all(self.engine)
+    def __init__(self, db_path: str | None = None, read_only: bool = False):
+        """
+        Без db_path БД не открывается и файлы не создаются: загрузка сама
+        выбирает файл шарда (add_statistics_to_monthly_db), а чтение
+        переключается на файлы из find_month_sources (switch_database).
+        read_only: открыть существующую БД только для чтения (mode=ro) —
+        без распаковки архива, создания файла, таблиц и смены журнала.
+        Если файла нет, FileNotFoundError.
+        """
+        self.read_only = read_only
         self.metadata = MetaData()
-        self.inspector = inspect(self.engine)
-        self.session = sessionmaker(bind=self.engine)
+        if db_path is None:
+            self.engine = None
+            self.model = LAYOUT_MODELS[self.DB_LAYOUT]
+            self.has_decoded = False
+            self.inspector = None
+            self.session = None
+            return
+        self.switch_database(db_path)
 
     def create_engine(self, db_path: str) -> Engine:
         """Создаёт движок базы данных, распаковывая zip при необходимости."""
-        # Если передан zip-файл — распаковать
-        if db_path.endswith('.zip') and os.path.isfile(db_path):
-            extract_dir = os.path.dirname(db_path)
-            db_name = os.path.basename(db_path).replace('.zip', '.db')
-            db_path = os.path.join(extract_dir, db_name)
-            self.unzip_db(
-                db_path.replace('.db', '.zip'), extract_dir, overwrite=True)
-
-        # Если указан .db, но файл отсутствует, а zip с таким же именем есть
-        elif db_path.endswith('.db') and not os.path.isfile(db_path):
-            zip_path = db_path.replace('.db', '.zip')
-            if os.path.isfile(zip_path):
-                extract_dir = os.path.dirname(db_path)
-                self.unzip_db(zip_path, extract_dir, overwrite=True)
-
-        return sqlalchemy_create_engine(
-            f'sqlite:///{db_path}', echo=self.DEBUG)
+        if self.read_only:
+            if not os.path.isfile(db_path):
+                raise FileNotFoundError(
+                    f'Файл базы данных не найден: {db_path}')
+            engine = sqlalchemy_create_engine(
+                f'sqlite:///file:{db_path}?mode=ro&uri=true',
+                echo=self.DEBUG,
+                connect_args={'timeout': self.DB_BUSY_TIMEOUT},
+            )
+            event.listen(engine, 'connect', self._on_connect)
+            event.listen(engine, 'begin', self._on_begin)
+            return engine
+
+        if db_path.endswith('.zip') or (
+            db_path.endswith('.db') and not os.path.isfile(db_path)
+        ):
+            # Распаковка под блокировкой месяца: архиватор или другая
+            # загрузка могут работать с тем же месяцем
+            with db_lock(db_path):
+                db_path = self._unzip_if_needed(db_path)
+
+        engine = sqlalchemy_create_engine(
+            f'sqlite:///{db_path}',
+            echo=self.DEBUG,
+            connect_args={'timeout': self.DB_BUSY_TIMEOUT},
+        )
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'begin', self._on_begin)
+        return engine
+
+    def _unzip_if_needed(self, db_path: str) -> str:
+        """Распаковывает архив месяца и возвращает путь к .db файлу."""
+        extract_dir = os.path.dirname(db_path)
+        zip_requested = db_path.endswith('.zip')
+        db_path = db_path.replace('.zip', '.db')
+        zip_path = db_path.replace('.db', '.zip')
+
+        # Архив мог распаковать другой процесс, пока ожидалась блокировка
+        if os.path.isfile(zip_path) and (
+            zip_requested or not os.path.isfile(db_path)
+        ):
+            self.unzip_db(zip_path, extract_dir, overwrite=True)
+            # Поздние строки, записанные, пока месяц был в архиве
+            if os.path.isfile(delta_path(db_path)):
+                fold_delta(db_path)
+
+        return db_path
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        """
+        Включает WAL и отключает неявное управление транзакциями pysqlite,
+        чтобы каждая сессия читала согласованный снимок БД.
+        """
+        dbapi_connection.isolation_level = None
+        if self.read_only:
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={self.DB_JOURNAL_MODE}')
+        cursor.close()
+
+    @staticmethod
+    def _on_begin(connection):
+        connection.exec_driver_sql('BEGIN')
+
+    def create_schema(self, engine: Engine) -> type[Statistic]:
+        """
+        Возвращает модель таблицы statistic по фактической структуре БД
+        (таблица без колонки id — кластеризованная WITHOUT ROWID). Новая БД
+        создаётся со структурой Config.DB_LAYOUT и, при
+        Config.STORE_DECODED, с колонками декодированных значений.
+        """
+        table = Statistic.__tablename__
+        if self.read_only and not inspect(engine).has_table(table):
+            # Файл только что создан другим процессом и ещё пуст
+            raise FileNotFoundError(
+                f'В БД {engine.url.database} нет таблицы {table}')
+        if not inspect(engine).has_table(table):
+            # Таблицу может одновременно создавать другой процесс
+            with db_lock(engine.url.database):
+                if not inspect(engine).has_table(table):
+                    LAYOUT_MODELS[self.DB_LAYOUT].metadata.create_all(engine)
+                    if self.STORE_DECODED:
+                        self.add_decoded_columns(engine)
+
+        columns = {
+            column['name'] for column in inspect(engine).get_columns(table)
+        }
+        return Statistic if 'id' in columns else ClusteredStatistic
+
+    @staticmethod
+    def decoded_columns_exist(engine: Engine) -> bool:
+        columns = {
+            column['name'] for column
+            in inspect(engine).get_columns(Statistic.__tablename__)
+        }
+        return set(DECODED_COLUMNS) <= columns
+
+    @staticmethod
+    def add_decoded_columns(engine: Engine):
+        """
+        Добавляет в таблицу statistic колонки DECODED_COLUMNS (INTEGER,
+        упакованные компоненты значений). Колонки не входят в модели ORM,
+        поэтому БД без них продолжают работать как прежде.
+        """
+        columns = {
+            column['name'] for column
+            in inspect(engine).get_columns(Statistic.__tablename__)
+        }
+        with engine.begin() as connection:
+            for name in DECODED_COLUMNS:
+                if name not in columns:
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE {Statistic.__tablename__} '
+                        f'ADD COLUMN {name} INTEGER'
+                    )
+
+    def update_decoded(self, session: Session, df: pd.DataFrame) -> int:
+        """
+        Записывает упакованные значения (pack_statistics) для строк df,
+        найденных по уникальному ключу (timestamp, modem_ip, mac, local_id).
+        Возвращает количество обновлённых строк.
+        """
+        if df.empty:
+            return 0
+        packed = pack_statistics(df)
+        values = {
+            name: [int(value) for value in packed[name]]
+            for name in DECODED_COLUMNS
+        }
+        statement = text(
+            f'UPDATE {Statistic.__tablename__} SET '
+            + ', '.join(f'{name} = :{name}' for name in DECODED_COLUMNS)
+            + ' WHERE timestamp = :key_timestamp AND modem_ip = :key_modem_ip'
+            ' AND mac = :key_mac AND local_id = :key_local_id'
+        ).bindparams(bindparam('key_timestamp', type_=DateTime))
+        result = session.execute(statement, [
+            {
+                'key_timestamp': timestamp.to_pydatetime(),
+                'key_modem_ip': modem_ip,
+                'key_mac': mac,
+                'key_local_id': int(local_id),
+                **{name: values[name][index] for name in DECODED_COLUMNS},
+            }
+            for index, (timestamp, modem_ip, mac, local_id) in enumerate(
+                df[['timestamp', 'modem_ip', 'mac', 'local_id']]
+                .itertuples(index=False)
+            )
+        ])
+        return result.rowcount
+
+    def backfill_decoded(self, page_size: int = 50_000) -> int:
+        """
+        Заполняет колонки декодированных значений для уже загруженных строк
+        (колонки добавляются при необходимости). Каждая порция записывается
+        под блокировкой месяца, поэтому загрузка не ждёт весь месяц.
+        Недекодируемые значения сохраняются как NO_VALUE, поэтому повторный
+        запуск выбирает только новые строки. Возвращает количество
+        обновлённых строк.
+        """
+        db_path = self.engine.url.database
+        with db_lock(db_path):
+            self.add_decoded_columns(self.engine)
+        self.has_decoded = True
+
+        columns = [getattr(self.model, name) for name in STATISTIC_COLUMNS]
+        updated = 0
+        after = None
+        while True:
+            with db_lock(db_path), self.session() as session:
+                query = session.query(*columns, *self.keyset_columns).filter(
+                    literal_column(DECODED_COLUMNS[0]).is_(None))
+                if after is not None:
+                    query = query.filter(tuple_(*self.keyset_columns) > after)
+                rows = query.order_by(*self.keyset_columns).limit(
+                    page_size).all()
+                if not rows:
+                    break
+
+                updated += self.update_decoded(
+                    session, pd.DataFrame.from_records(
+                        [row[:len(columns)] for row in rows],
+                        columns=STATISTIC_COLUMNS
+                    )
+                )
+                session.commit()
+
+            after = tuple(rows[-1][len(columns):])
+        return updated
+
+    def keyset(self, statistic: Statistic) -> tuple:
+        """Позиция записи для keyset-пагинации в порядке обхода БД."""
+        return tuple(
+            getattr(statistic, column.key)
+            for column in self.keyset_columns
+        )
+
+    @property
+    def keyset_columns(self) -> tuple:
+        if self.model is ClusteredStatistic:
+            return (
+                ClusteredStatistic.timestamp,
+                ClusteredStatistic.modem_ip,
+                ClusteredStatistic.mac,
+                ClusteredStatistic.local_id,
+            )
+        return (Statistic.timestamp, Statistic.id)
 
     def switch_database(self, db_path: str):
         """Переключение на другую базу данных"""
         self.engine = self.create_engine(db_path)
-        Base.metadata.create_all(self.engine)
+        self.model = self.create_schema(self.engine)
+        self.has_decoded = self.decoded_columns_exist(self.engine)
         self.inspector = inspect(self.engine)
         self.session = sessionmaker(bind=self.engine)
 
+    def refresh_schema(self):
+        """
+        Перечитывает структуру таблицы у открытой БД: колонки
+        декодированных значений (--backfill_decoded) и структуру
+        (--convert_layout, файл заменяется, поэтому соединения пула
+        закрываются).
+        """
+        self.engine.dispose()
+        self.model = self.create_schema(self.engine)
+        self.has_decoded = self.decoded_columns_exist(self.engine)
+        self.inspector = inspect(self.engine)
+
     def db_structure(self):
         """Структура базы данных"""
         self.metadata.reflect(bind=self.engine)
@@ -76,10 +309,11 @@ class CountersStatisticDB(Config):
     ) -> tuple[dt.datetime | None, dt.datetime | None]:
         with self.session() as session:
             min_statistic = (
-                session.query(Statistic).order_by(Statistic.timestamp).first()
+                session.query(self.model).order_by(self.model.timestamp)
+                .first()
             )
             max_statistic = (
-                session.query(Statistic).order_by(Statistic.timestamp.desc())
+                session.query(self.model).order_by(self.model.timestamp.desc())
                 .first()
             )
 
@@ -95,20 +329,21 @@ class CountersStatisticDB(Config):
         with self.session() as session:
             filters = []
             if start is not None:
-                filters.append(Statistic.timestamp >= start)
+                filters.append(self.model.timestamp >= start)
             if end is not None:
-                filters.append(Statistic.timestamp <= end)
+                filters.append(self.model.timestamp <= end)
 
-            count = session.query(func.count()).select_from(Statistic)
+            count = session.query(func.count()).select_from(self.model)
             if filters:
                 count = count.filter(*filters)
         return count.scalar()
 
-    def create_monthly_db(self, year: int, month: int):
-        """Создание базы данных для заданного месяца"""
-        db_name = f'{self.DB_PREFIX}_{year}_{month:02d}.db'
-        db_path = os.path.join(self.DATA_DIR, db_name)
-        return self.create_engine(db_path)
+    def monthly_db_path(self, year: int, month: int, shard: str = '') -> str:
+        return os.path.join(self.DATA_DIR, db_filename(year, month, shard))
+
+    def create_monthly_db(self, year: int, month: int, shard: str = ''):
+        """Создание базы данных для заданного месяца (или его шарда)"""
+        return self.create_engine(self.monthly_db_path(year, month, shard))
 
     @staticmethod
     def str_to_bytes(s: str | bytes | None) -> bytes | None:
@@ -118,15 +353,42 @@ class CountersStatisticDB(Config):
             return None
         return bytes.fromhex(s)
 
+    @profile_stage
     def add_statistics_to_monthly_db(self, statistics: list[Statistic]):
-        """Добавление статистики в соответствующую базу данных по месяцам"""
-        grouped = defaultdict(list)
+        """
+        Добавление статистики в соответствующие базы данных по месяцам или,
+        при Config.DB_PARTITION week/day, по неделям или дням месяца.
+        Строки заархивированных месяцев пишутся в их дельта-файлы.
+        Каждый файл блокируется отдельно, поэтому загрузки в разные шарды
+        не ждут друг друга.
+        """
+        by_date = defaultdict(list)
         for stat in statistics:
-            grouped[(stat.timestamp.year, stat.timestamp.month)].append(stat)
+            by_date[stat.timestamp.date()].append(stat)
 
-        for (year, month), stats_group in grouped.items():
-            monthly_engine = self.create_monthly_db(year, month)
-            Base.metadata.create_all(monthly_engine)
+        grouped = defaultdict(list)
+        for date, stats in by_date.items():
+            db_path = find_partition_path(
+                date, self.DATA_DIR, self.DB_PARTITION)
+            grouped[db_path].extend(stats)
+
+        for db_path, stats_group in grouped.items():
+            with db_lock(db_path):
+                self._add_statistics_group(db_path, stats_group)
+
+    def _add_statistics_group(
+        self, db_path: str, stats_group: list[Statistic]
+    ):
+        """Добавление статистики одного месяца (шарда) без дубликатов"""
+        monthly_engine = self.create_engine(db_path)
+        try:
+            model = self.create_schema(monthly_engine)
+            store_decoded = (
+                self.STORE_DECODED
+                or self.decoded_columns_exist(monthly_engine)
+            )
+            if store_decoded:
+                self.add_decoded_columns(monthly_engine)
             Session = sessionmaker(bind=monthly_engine)
             with Session() as session:
                 keys = [
@@ -134,29 +396,32 @@ class CountersStatisticDB(Config):
                     for s in stats_group
                 ]
 
-                def chunked(iterable, size):
-                    for i in range(0, len(iterable), size):
-                        yield iterable[i:i + size]
-
+                # Размер порции ключей подбирается по скорости запроса
+                # (не больше лимита параметров SQLite, см. BATCH_LIMITS)
+                tuner = get_tuner('key_lookup')
                 existing_keys = set()
-                chunk_size = 1000  # Ограничение БД
-                for chunk in chunked(keys, chunk_size):
+                start = 0
+                while start < len(keys):
+                    tuner.start()
+                    chunk = keys[start:start + tuner.size]
                     partial_keys = set(
                         session.query(
-                            Statistic.timestamp,
-                            Statistic.modem_ip,
-                            Statistic.mac,
-                            Statistic.local_id
+                            model.timestamp,
+                            model.modem_ip,
+                            model.mac,
+                            model.local_id
                         ).filter(
                             tuple_(
-                                Statistic.timestamp,
-                                Statistic.modem_ip,
-                                Statistic.mac,
-                                Statistic.local_id
+                                model.timestamp,
+                                model.modem_ip,
+                                model.mac,
+                                model.local_id
                             ).in_(chunk)
                         ).all()
                     )
                     existing_keys.update(partial_keys)
+                    tuner.record(len(chunk))
+                    start += len(chunk)
 
                 to_add = []
                 for stat in stats_group:
@@ -170,7 +435,7 @@ class CountersStatisticDB(Config):
                     ):
                         continue
 
-                    new_statistic = Statistic(
+                    new_statistic = model(
                         timestamp=stat.timestamp,
                         modem_ip=stat.modem_ip,
                         mac=stat.mac,
@@ -189,7 +454,27 @@ class CountersStatisticDB(Config):
 
                 if to_add:
                     session.add_all(to_add)
+                    if store_decoded:
+                        session.flush()
+                        self.update_decoded(
+                            session, self.statistics_to_dataframe(to_add))
                     session.commit()
+        finally:
+            monthly_engine.dispose()
+
+    def _period_filters(
+        self,
+        start: dt.datetime,
+        end: dt.datetime,
+        modem_ip: None | str = None,
+        mac: None | str = None,
+    ) -> list:
+        filters = [self.model.timestamp.between(start, end)]
+        if modem_ip is not None:
+            filters.append(self.model.modem_ip == modem_ip)
+        if mac is not None:
+            filters.append(self.model.mac == mac)
+        return filters
 
     def get_statistics_by_period(
         self,
@@ -198,32 +483,154 @@ class CountersStatisticDB(Config):
         page_number: int = 1,
         page_size: int = 100_000,
         modem_ip: None | str = None,
-        mac: None | str = None
+        mac: None | str = None,
+        session: Session | None = None
     ) -> list[Statistic]:
-        """Статистика по счётчикам за выбранный период с пагинацией"""
+        """
+        Статистика по счётчикам за выбранный период с пагинацией.
+        Если передана открытая сессия, все страницы читаются из одного
+        снимка БД (одной транзакции).
+        """
         offset_value = (page_number - 1) * page_size
-        with self.session() as session:
-            query = session.query(Statistic)
-            filters = []
+        with nullcontext(session) if session else self.session() as session:
+            return (
+                session.query(self.model)
+                .filter(*self._period_filters(start, end, modem_ip, mac))
+                .order_by(self.model.timestamp)
+                .limit(page_size)
+                .offset(offset_value)
+                .all()
+            )
 
-            filters.append(Statistic.timestamp.between(start, end))
+    def _page_columns(self) -> tuple[list[str], list]:
+        """
+        Колонки страницы DataFrame: если в БД есть колонки декодированных
+        значений, они читаются вместе с BLOB и используются в
+        prepare_statistics.
+        """
+        names = list(STATISTIC_COLUMNS)
+        columns = [getattr(self.model, name) for name in names]
+        if self.has_decoded:
+            names += DECODED_COLUMNS
+            columns += [literal_column(name) for name in DECODED_COLUMNS]
+        return names, columns
+
+    def get_statistics_page(
+        self,
+        start: dt.datetime,
+        end: dt.datetime,
+        page_number: int = 1,
+        page_size: int = 100_000,
+        modem_ip: None | str = None,
+        mac: None | str = None,
+        session: Session | None = None,
+    ) -> pd.DataFrame:
+        """
+        Страница статистики за период сразу в виде DataFrame (без объектов
+        ORM). Для обхода всего периода — iter_statistics_pages.
+        """
+        names, columns = self._page_columns()
+        offset_value = (page_number - 1) * page_size
+        with nullcontext(session) if session else self.session() as session:
+            rows = (
+                session.query(*columns)
+                .filter(*self._period_filters(start, end, modem_ip, mac))
+                .order_by(*self.keyset_columns)
+                .limit(page_size)
+                .offset(offset_value)
+                .all()
+            )
+        return pd.DataFrame.from_records(rows, columns=names)
 
-            if modem_ip is not None:
-                filters.append(Statistic.modem_ip == modem_ip)
+    def iter_statistics_pages(
+        self,
+        start: dt.datetime,
+        end: dt.datetime,
+        modem_ip: None | str = None,
+        mac: None | str = None,
+        page_size: int = 100_000,
+        tuner: BatchTuner | None = None,
+        session: Session | None = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Страницы статистики за период (как get_statistics_page) с
+        keyset-пагинацией: каждая страница продолжается после ключа
+        последней строки предыдущей, поэтому строки с одинаковым timestamp
+        не теряются и не повторяются, а страница не пересчитывает
+        пропущенные строки, как OFFSET. С tuner размер страницы
+        подбирается по скорости чтения.
+        """
+        names, columns = self._page_columns()
+        after = None
+        with nullcontext(session) if session else self.session() as session:
+            while True:
+                if tuner is not None:
+                    tuner.start()
+                    page_size = tuner.size
+                query = session.query(*columns, *self.keyset_columns).filter(
+                    *self._period_filters(start, end, modem_ip, mac))
+                if after is not None:
+                    query = query.filter(tuple_(*self.keyset_columns) > after)
+                rows = query.order_by(*self.keyset_columns).limit(
+                    page_size).all()
+                if not rows:
+                    return
+
+                df = pd.DataFrame.from_records(
+                    [row[:len(columns)] for row in rows], columns=names)
+                if tuner is not None:
+                    tuner.record(len(df))
+                after = tuple(rows[-1][len(columns):])
+                yield df
+
+    def get_statistics_after(
+        self,
+        after: tuple | None = None,
+        end: dt.datetime | None = None,
+        page_size: int = 100_000,
+    ) -> list[Statistic]:
+        """
+        Следующая страница статистики после позиции keyset (timestamp, id)
+        или для кластеризованной таблицы (timestamp, modem_ip, mac, local_id).
+        Keyset-пагинация не пересчитывает пропущенные строки, как OFFSET, и
+        позволяет продолжить обход с сохранённой позиции.
+        """
+        with self.session() as session:
+            query = session.query(self.model)
 
-            if mac is not None:
-                filters.append(Statistic.mac == mac)
+            if after is not None:
+                query = query.filter(tuple_(*self.keyset_columns) > after)
 
-            query = query.filter(*filters)
+            if end is not None:
+                query = query.filter(self.model.timestamp <= end)
 
             return (
                 query
-                .order_by(Statistic.timestamp)
+                .order_by(*self.keyset_columns)
                 .limit(page_size)
-                .offset(offset_value)
                 .all()
             )
 
+    def get_statistics_dataframe(
+        self,
+        start: dt.datetime,
+        end: dt.datetime,
+        modem_ip: None | str = None,
+        mac: None | str = None,
+        page_size: int = 100_000,
+        tuner: BatchTuner | None = None,
+    ) -> pd.DataFrame:
+        """
+        Все показания за период в виде подготовленного DataFrame
+        (prepare_statistics). Страницы читаются из одного снимка БД; с
+        tuner размер страницы подбирается по скорости чтения.
+        """
+        frames = list(self.iter_statistics_pages(
+            start, end, modem_ip, mac, page_size, tuner))
+        if not frames:
+            return self.prepare_statistics(self.statistics_to_dataframe([]))
+        return self.prepare_statistics(pd.concat(frames, ignore_index=True))
+
     def statistics_to_dataframe(
         self, statistics: list[Statistic]
     ) -> pd.DataFrame:
@@ -246,77 +653,32 @@ class CountersStatisticDB(Config):
                     'angle_3': s.angle_3,
                 }
                 for s in statistics
-            )
+            ),
+            columns=STATISTIC_COLUMNS
         )
 
-    def prepare_statistics(self, df: pd.DataFrame) -> pd.DataFrame:
+    @staticmethod
+    @profile_stage
+    def prepare_statistics(
+        df: pd.DataFrame, drop_duplicates: bool = True
+    ) -> pd.DataFrame:
         """
         Преобразует байтовые значения напряжения, тока и углов в десятичный
-        формат.
-        """
-        columns = [
-            'decimal_voltage_1_1',
-            'decimal_voltage_1_2',
-            'decimal_voltage_1_3',
-            'decimal_current_1_1',
-            'decimal_current_1_2',
-            'decimal_current_1_3',
-            'decimal_angle_1_1',
-            'decimal_angle_1_2',
-            'decimal_angle_1_3',
-
-            'decimal_voltage_2_1',
-            'decimal_voltage_2_2',
-            'decimal_voltage_2_3',
-            'decimal_current_2_1',
-            'decimal_current_2_2',
-            'decimal_current_2_3',
-            'decimal_angle_2_1',
-            'decimal_angle_2_2',
-            'decimal_angle_2_3',
-
-            'decimal_voltage_3_1',
-            'decimal_voltage_3_2',
-            'decimal_voltage_3_3',
-            'decimal_current_3_1',
-            'decimal_current_3_2',
-            'decimal_current_3_3',
-            'decimal_angle_3_1',
-            'decimal_angle_3_2',
-            'decimal_angle_3_3',
-        ]
-        df[columns] = None
-
-        for index, row in df.iterrows():
-            for i in range(1, 4):
-                decimal_voltage = self._bytes_to_float(row[f'voltage_{i}'])
-                df.at[
-                    index, f'decimal_voltage_{i}_1'
-                ], df.at[
-                    index, f'decimal_voltage_{i}_2'
-                ], df.at[
-                    index, f'decimal_voltage_{i}_3'
-                ] = decimal_voltage
-
-                decimal_current = self._bytes_to_float(row[f'current_{i}'])
-                df.at[
-                    index, f'decimal_current_{i}_1'
-                ], df.at[
-                    index, f'decimal_current_{i}_2'
-                ], df.at[
-                    index, f'decimal_current_{i}_3'
-                ] = decimal_current
-
-                decimal_angle = self._bytes_to_float(row[f'angle_{i}'])
-                df.at[
-                    index, f'decimal_angle_{i}_1'
-                ], df.at[
-                    index, f'decimal_angle_{i}_2'
-                ], df.at[
-                    index, f'decimal_angle_{i}_3'
-                ] = decimal_angle
-
-        return df.drop_duplicates().reset_index(drop=True)
+        формат (27 колонок decimal_* с типом UInt8, пустые значения — <NA>).
+        Если в df есть сохранённые колонки DECODED_COLUMNS, значения берутся
+        из них без повторного декодирования BLOB. drop_duplicates=False
+        пропускает удаление дубликатов для данных одной БД, где они
+        исключены уникальным ключом.
+        """
+        if set(DECODED_COLUMNS) <= set(df.columns):
+            decoded = unpack_statistics(df)
+            df = df.drop(columns=list(DECODED_COLUMNS))
+        else:
+            decoded = decode_statistics(df)
+        df = pd.concat([df, decoded], axis=1)
+        if drop_duplicates:
+            df = df.drop_duplicates()
+        return df.reset_index(drop=True)
 
     def _bytes_to_float(
         self, byte_data: bytes
@@ -339,59 +701,13 @@ class CountersStatisticDB(Config):
 
         return (hex_value[1], hex_value[2], hex_value[3])
 
-    @staticmethod
-    def zip_db(db_path: str, zip_dir: str):
-        if not os.path.isfile(db_path):
-            raise FileNotFoundError(f'Файл базы данных не найден: {db_path}')
-        if not db_path.endswith('.db'):
-            raise ValueError(f'Файл не является .db: {db_path}')
-
-        os.makedirs(zip_dir, exist_ok=True)
-        filename = os.path.basename(db_path)
-        zip_path = os.path.join(zip_dir, filename.replace('.db', '.zip'))
-
-        if os.path.exists(zip_path):
-            raise FileExistsError(f'Архив уже существует: {zip_path}.')
-
-        with zipfile.ZipFile(
-            zip_path, 'w', compression=zipfile.ZIP_DEFLATED
-        ) as zipf:
-            zipf.write(db_path, arcname=filename)
-
-        os.remove(db_path)
-        print(
-            f'БД {filename} архивирована в {zip_path}. Исходный файл удалён.'
-        )
-
-    @staticmethod
-    def unzip_db(zip_path: str, extract_dir: str, overwrite: bool = False):
-        if not os.path.isfile(zip_path):
-            raise FileNotFoundError(f'Архив не найден: {zip_path}')
-        if not zip_path.endswith('.zip'):
-            raise ValueError(f'Файл не является .zip архивом: {zip_path}')
-
-        os.makedirs(extract_dir, exist_ok=True)
-
-        with zipfile.ZipFile(zip_path, 'r') as zipf:
-            for member in zipf.namelist():
-                target_path = os.path.join(extract_dir, member)
-
-                if os.path.exists(target_path) and not overwrite:
-                    raise FileExistsError(
-                        f'Файл {target_path} уже существует.')
-
-            zipf.extractall(path=extract_dir)
-
-        if overwrite:
-            os.remove(zip_path)
-            print(f'Архив {zip_path} распакован в {extract_dir} и удален.')
-        else:
-            print(f'Архив {zip_path} распакован в {extract_dir}.')
+    zip_db = staticmethod(zip_db)
+    unzip_db = staticmethod(unzip_db)
 
     def data_not_in_db(self) -> list[str]:
         """
         Поиск файлов .csv или .gz, не вошедших в БД.
-        Если для месяца уже есть zip-архив, тогда этот архив будет
+        Если для месяца (шарда) уже есть zip-архив, тогда этот архив будет
         разархивирован для проверки данных.
         Файлы, относящиеся к месяцам старше Config.MONTH_AGO месяцев назад,
         пропускаются.
@@ -403,32 +719,20 @@ class CountersStatisticDB(Config):
         cutoff_date = dt.datetime.now() - relativedelta(
             months=Config.MONTH_AGO)
 
-        for filename in os.listdir(Config.DATA_DIR):
-            if not filename.startswith(f'{Config.DB_PREFIX}_'):
-                continue
-            if not (filename.endswith('.db') or filename.endswith('.zip')):
-                continue
-
-            file_prefix = filename.replace('.zip', '').replace('.db', '')
-            parts = file_prefix.split('_')
-            if len(parts) < 4:
-                continue
-
-            try:
-                year = int(parts[2])
-                month = int(parts[3])
-            except ValueError:
+        for db_file in find_month_sources(('.db', '.zip'), self.DATA_DIR):
+            if dt.datetime(db_file.year, db_file.month, 1) <= cutoff_date:
                 continue
 
-            file_month_date = dt.datetime(year, month, 1)
-            if file_month_date <= cutoff_date:
-                continue
-
-            db_path = os.path.join(Config.DATA_DIR, filename)
-            self.switch_database(db_path)
+            # Границы месяца собираются по всем его шардам
+            self.switch_database(db_file.path)
             min_ts, max_ts = self.border_timestamp
-            if min_ts and max_ts:
-                db_date_ranges[(year, month)] = (min_ts, max_ts)
+            if not (min_ts and max_ts):
+                continue
+            month = (db_file.year, db_file.month)
+            if month in db_date_ranges:
+                month_min, month_max = db_date_ranges[month]
+                min_ts, max_ts = min(min_ts, month_min), max(max_ts, month_max)
+            db_date_ranges[month] = (min_ts, max_ts)
 
         for filename in os.listdir(self.STATISTIC_DIR):
             if filename.endswith('.csv.gz'):
@@ -456,6 +760,7 @@ class CountersStatisticDB(Config):
 
         return unprocessed_files
 
+    @profile_stage
     def read_statistics(self, file_path: str) -> pd.DataFrame:
         """Чтение содержимого .csv файла (в т.ч. из gzip архива)"""
         zip_file: bool = file_path.endswith('.gz')
@@ -474,15 +779,7 @@ class CountersStatisticDB(Config):
                         values = line[2:].split(',')
                         yield [current_time] + values
 
-        return pd.DataFrame(
-            line_generator(),
-            columns=[
-                'timestamp', 'modem_ip', 'mac', 'local_id',
-                'voltage_1', 'current_1', 'angle_1',
-                'voltage_2', 'current_2', 'angle_2',
-                'voltage_3', 'current_3', 'angle_3',
-            ]
-        )
+        return pd.DataFrame(line_generator(), columns=STATISTIC_COLUMNS)
 
     @staticmethod
     def hex_to_bytes(hex_str: str) -> bytes | None:
@@ -514,27 +811,80 @@ class CountersStatisticDB(Config):
             angle_3=self.hex_to_bytes(row.angle_3),
         )
 
-    def statistics_2_db(self):
-        """Запись статистики из .gz и .csv по БД распределенным по месяцам."""
-        batch_size = 100_000
-        data_not_in_db = self.data_not_in_db()
+    def ingest_file(
+        self,
+        file_path: str,
+        first_row: int = 0,
+        batch_size: int | None = None,
+    ) -> Iterator[int]:
+        """
+        Загружает файл статистики в месячные БД порциями по batch_size
+        строк (по умолчанию размер подбирается по скорости и памяти, см.
+        BatchTuner), начиная с first_row. После записи каждой порции
+        возвращает номер следующей строки файла (для контрольной точки или
+        продления аренды файла).
+        """
+        df = self.read_statistics(file_path)
+        total = len(df)
+        tuner = get_tuner('ingest_batch')
+
+        start = first_row
+        while start < total:
+            tuner.start()
+            end = min(start + (batch_size or tuner.size), total)
+            batch_df = df.iloc[start:end]
+
+            statistics = []
+            for i, row in enumerate(batch_df.itertuples(index=False)):
+                progress_bar(
+                    start + i, total,
+                    f'Подготовка {file_path} для записи в БД: '
+                )
+                stat = self.prepare_statistic_from_row(row)
+                statistics.append(stat)
+
+            self.add_statistics_to_monthly_db(statistics)
+            if batch_size is None:
+                tuner.record(end - start)
+            yield end
+            start = end
+
+    def statistics_2_db(self, resume: bool = False):
+        """
+        Запись статистики из .gz и .csv по БД распределенным по месяцам.
+        После каждой записанной порции сохраняется контрольная точка
+        (файл и количество обработанных строк); при resume=True загрузка
+        продолжается с неё.
+        """
+        job = 'statistics_2_db'
+        store = CheckpointStore()
+        state = store.load(job) if resume else None
+        if state is None:
+            state = {'completed': {}, 'file_path': None, 'rows': 0}
+
+        data_not_in_db = [
+            file_path for file_path in self.data_not_in_db()
+            if state['completed'].get(file_path) != file_signature(file_path)
+        ]
 
         for index, file_path in enumerate(data_not_in_db):
             print(f'Файл {file_path} ({index + 1}/{len(data_not_in_db)})')
-            df = self.read_statistics(file_path)
-            total = len(df)
-
-            for start in range(0, total, batch_size):
-                end = min(start + batch_size, total)
-                batch_df = df.iloc[start:end]
-
-                statistics = []
-                for i, row in enumerate(batch_df.itertuples(index=False)):
-                    progress_bar(
-                        start + i, total,
-                        f'Подготовка {file_path} для записи в БД: '
-                    )
-                    stat = self.prepare_statistic_from_row(row)
-                    statistics.append(stat)
-
-                self.add_statistics_to_monthly_db(statistics)
+            signature = file_signature(file_path)
+            first_row = 0
+            if (
+                state['file_path'] == file_path
+                and state.get('signature') == signature
+            ):
+                first_row = state['rows']
+                print(f'Продолжение со строки {first_row}')
+
+            for rows in self.ingest_file(file_path, first_row):
+                state.update(
+                    file_path=file_path, signature=signature, rows=rows)
+                store.save(job, state)
+
+            state['completed'][file_path] = signature
+            state.update(file_path=None, signature=None, rows=0)
+            store.save(job, state)
+
+        store.clear(job)
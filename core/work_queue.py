@@ -0,0 +1,366 @@
+import datetime as dt
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator
+
+from .checkpoint import file_signature
+from .config import Config
+from .db_files import find_monthly_dbs, find_partition_path
+from .delta import merge_rows
+from .lock import db_lock
+from .utils import CountersStatisticDB
+
+
+# Очередь распределённой загрузки в общем каталоге Config.QUEUE_DIR:
+#   leases/<файл>.lease  — аренда файла-источника узлом (JSON, срок действия)
+#   done/<файл>.json     — файл загружен в промежуточные БД (с сигнатурой)
+#   staging/<узел>/      — промежуточные месячные БД каждого узла
+# Сроки аренды сравниваются по часам узлов, поэтому часы должны быть
+# синхронизированы (NTP). Существующий файл аренды меняется (перехват,
+# продление, освобождение) только под блокировкой аренды (db_lock на
+# <файл>.lock) с повторной проверкой владельца, а новый создаётся через
+# O_EXCL, поэтому файл одновременно арендует не больше одного узла.
+
+
+class LeaseLostError(RuntimeError):
+    pass
+
+
+def _read_json(path: str) -> dict | None:
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: dict, tmp_suffix: str):
+    """Атомарная запись: временный файл + fsync + os.replace."""
+    tmp_path = f'{path}.{tmp_suffix}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class Lease:
+    """
+    Аренда файла-источника одним узлом. Владелец продлевает аренду, пока
+    обрабатывает файл; аренду с истёкшим сроком может забрать другой узел.
+    """
+
+    def __init__(
+        self, path: str, source_path: str, worker_id: str, ttl: float
+    ):
+        self.path = path
+        self.source_path = source_path
+        self.worker_id = worker_id
+        self.ttl = ttl
+        self.lost = False
+        self.expires = 0.0
+
+    def new_content(self) -> dict:
+        """Содержимое аренды со сроком ttl от текущего момента."""
+        return {
+            'source': self.source_path,
+            'worker': self.worker_id,
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'expires': time.time() + self.ttl,
+        }
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Блокировка файла аренды на время его изменения."""
+        with db_lock(self.path, timeout=self.ttl, retry_interval=0.05):
+            yield
+
+    def is_owned(self) -> bool:
+        lease = _read_json(self.path)
+        return lease is not None and lease.get('worker') == self.worker_id
+
+    def renew(self):
+        """
+        Продлевает аренду, если она всё ещё принадлежит этому узлу: новый
+        срок записывается во временный файл и заменяет аренду после
+        проверки владельца под блокировкой аренды.
+        """
+        content = self.new_content()
+        tmp_path = f'{self.path}.{self.worker_id}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(content, file, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+
+        with self.locked():
+            if not self.is_owned():
+                os.remove(tmp_path)
+                self.lost = True
+                raise LeaseLostError(
+                    f'Аренда {self.source_path} перехвачена другим узлом')
+            os.replace(tmp_path, self.path)
+        self.expires = content['expires']
+
+    def check(self):
+        """
+        Вызывается между порциями: аренда, не продлённая до своего срока,
+        могла быть перехвачена, поэтому обработка прекращается.
+        """
+        if not self.lost and self.expires < time.time():
+            self.lost = True
+        if self.lost:
+            raise LeaseLostError(
+                f'Аренда {self.source_path} перехвачена другим узлом')
+
+    def release(self):
+        with self.locked():
+            if self.is_owned():
+                os.remove(self.path)
+
+    @contextmanager
+    def keep_alive(
+        self, interval: float | None = None
+    ) -> Iterator['Lease']:
+        """
+        Продлевает аренду в фоновом потоке каждые interval сек. (по
+        умолчанию Config.LEASE_RENEW_INTERVAL, но не реже трёх раз за срок
+        аренды).
+        """
+        if interval is None:
+            interval = min(Config.LEASE_RENEW_INTERVAL, self.ttl / 3)
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(interval):
+                try:
+                    self.renew()
+                except LeaseLostError:
+                    return
+                except OSError:
+                    # Сбой сетевой ФС: повтор при следующем продлении
+                    continue
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
+
+
+class WorkQueue:
+    """Аренды, отметки о загрузке и промежуточные БД в общем каталоге."""
+
+    def __init__(
+        self,
+        queue_dir: str | None = None,
+        worker_id: str | None = None,
+        ttl: float = Config.LEASE_TTL,
+    ):
+        self.queue_dir = queue_dir or Config.QUEUE_DIR
+        self.lease_dir = os.path.join(self.queue_dir, 'leases')
+        self.done_dir = os.path.join(self.queue_dir, 'done')
+        self.staging_dir = os.path.join(self.queue_dir, 'staging')
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.ttl = ttl
+        for path in (self.lease_dir, self.done_dir, self.staging_dir):
+            os.makedirs(path, exist_ok=True)
+
+    def lease_path(self, source_path: str) -> str:
+        return os.path.join(
+            self.lease_dir, f'{os.path.basename(source_path)}.lease')
+
+    def done_path(self, source_path: str) -> str:
+        return os.path.join(
+            self.done_dir, f'{os.path.basename(source_path)}.json')
+
+    @property
+    def worker_staging_dir(self) -> str:
+        return os.path.join(self.staging_dir, self.worker_id)
+
+    def is_done(self, source_path: str) -> bool:
+        marker = _read_json(self.done_path(source_path))
+        return (
+            marker is not None
+            and marker.get('signature') == file_signature(source_path)
+        )
+
+    def mark_done(self, source_path: str, signature: list[int]):
+        _write_json(self.done_path(source_path), {
+            'signature': signature,
+            'worker': self.worker_id,
+            'finished': dt.datetime.now().isoformat(),
+        }, self.worker_id)
+
+    def _is_expired(self, path: str) -> bool:
+        lease = _read_json(path)
+        if lease is not None:
+            return lease.get('expires', 0) < time.time()
+        # Файл аренды только что создан и ещё не записан владельцем
+        try:
+            return os.path.getmtime(path) + self.ttl < time.time()
+        except FileNotFoundError:
+            return False
+
+    def claim(self, source_path: str) -> Lease | None:
+        """
+        Захватывает файл-источник: новая аренда создаётся атомарно
+        (O_EXCL), а истёкшая заменяется (os.replace) под блокировкой аренды
+        после повторной проверки срока — продление и освобождение идут под
+        той же блокировкой, поэтому не могут вклиниться между проверкой и
+        заменой. Возвращает None, если файл обрабатывает другой узел.
+        """
+        path = self.lease_path(source_path)
+        lease = Lease(path, source_path, self.worker_id, self.ttl)
+
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o664)
+        except FileExistsError:
+            return self._take_over(lease)
+
+        content = lease.new_content()
+        try:
+            os.write(fd, json.dumps(content).encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        lease.expires = content['expires']
+        return lease
+
+    def _take_over(self, lease: Lease) -> Lease | None:
+        if not self._is_expired(lease.path):
+            return None
+        with lease.locked():
+            # Аренду могли продлить, освободить или перехватить, пока
+            # ожидалась блокировка
+            if not os.path.exists(lease.path) or not self._is_expired(
+                lease.path
+            ):
+                return None
+            content = lease.new_content()
+            _write_json(lease.path, content, self.worker_id)
+        lease.expires = content['expires']
+        return lease
+
+    def prune_done(self):
+        """Удаляет отметки о файлах, которых больше нет в источнике."""
+        for filename in os.listdir(self.done_dir):
+            source_path = os.path.join(
+                Config.STATISTIC_DIR, filename[:-len('.json')])
+            if filename.endswith('.json') and not os.path.exists(source_path):
+                os.remove(os.path.join(self.done_dir, filename))
+
+
+class StagingDB(CountersStatisticDB):
+    """
+    Промежуточные БД узла: по одному файлу на месяц в каталоге узла.
+    Журнал DELETE, так как WAL не работает на сетевой ФС.
+    """
+    DB_PARTITION = 'month'
+    DB_JOURNAL_MODE = 'DELETE'
+
+    def __init__(self, staging_dir: str):
+        os.makedirs(staging_dir, exist_ok=True)
+        self.DATA_DIR = staging_dir
+        super().__init__()
+
+
+def run_worker(queue: WorkQueue | None = None) -> int:
+    """
+    Загружает незагруженные файлы статистики, захватывая каждый через
+    аренду, в промежуточные БД узла. Возвращает число загруженных файлов.
+    """
+    queue = queue or WorkQueue()
+    candidates = [
+        file_path for file_path in CountersStatisticDB().data_not_in_db()
+        if not queue.is_done(file_path)
+    ]
+    staging = StagingDB(queue.worker_staging_dir)
+    processed = 0
+
+    for file_path in candidates:
+        lease = queue.claim(file_path)
+        if lease is None:
+            print(f'Файл {file_path} обрабатывает другой узел.')
+            continue
+
+        try:
+            # Файл мог быть загружен другим узлом после составления списка
+            if queue.is_done(file_path):
+                continue
+            signature = file_signature(file_path)
+            print(f'Узел {queue.worker_id} загружает {file_path}')
+            with lease.keep_alive():
+                for _ in staging.ingest_file(file_path):
+                    lease.check()
+            # Отметка ставится, только если аренда не перехвачена
+            lease.renew()
+            queue.mark_done(file_path, signature)
+            processed += 1
+        except LeaseLostError as e:
+            print(e)
+        finally:
+            lease.release()
+
+    return processed
+
+
+def merge_staging(queue: WorkQueue | None = None) -> dict[str, int]:
+    """
+    Переносит промежуточные БД всех узлов в основные месячные БД (с учётом
+    Config.DB_PARTITION) и удаляет перенесённые файлы. Одновременно
+    выполняется только одно слияние. Возвращает {файл БД: добавлено строк}.
+    """
+    queue = queue or WorkQueue()
+    report: dict[str, int] = defaultdict(int)
+
+    with db_lock(os.path.join(queue.queue_dir, 'merge')):
+        for worker_id in sorted(os.listdir(queue.staging_dir)):
+            worker_dir = os.path.join(queue.staging_dir, worker_id)
+            if not os.path.isdir(worker_dir):
+                continue
+
+            for staging_file in find_monthly_dbs(worker_dir):
+                # Узел не пишет в файл, пока идёт его перенос
+                with db_lock(staging_file.path):
+                    connection = sqlite3.connect(
+                        staging_file.path, timeout=Config.DB_BUSY_TIMEOUT)
+                    try:
+                        days = [
+                            row[0] for row in connection.execute(
+                                'SELECT DISTINCT substr(timestamp, 1, 10) '
+                                'FROM statistic')
+                        ]
+                    finally:
+                        connection.close()
+
+                    targets = defaultdict(list)
+                    for day in days:
+                        target_path = find_partition_path(
+                            dt.date.fromisoformat(day),
+                            Config.DATA_DIR, Config.DB_PARTITION)
+                        targets[target_path].append(day)
+
+                    for target_path, target_days in targets.items():
+                        with db_lock(target_path):
+                            # Создаёт схему (в т.ч. дельта-файла
+                            # заархивированного месяца)
+                            CountersStatisticDB(target_path).engine.dispose()
+                            report[os.path.basename(target_path)] += (
+                                merge_rows(
+                                    target_path, staging_file.path,
+                                    target_days)
+                            )
+
+                    os.remove(staging_file.path)
+
+        queue.prune_done()
+    return dict(report)
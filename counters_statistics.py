@@ -1,47 +1,104 @@
 import os
+import sys
 import datetime as dt
 
-from pandas import DataFrame
-from dateutil.relativedelta import relativedelta
-from core.utils import CountersStatisticDB
 from core.config import Config
 from core.logger import FileRotatingLogger
-from sqlalchemy.exc import OperationalError
+from core.profiling import enable_profiling
 from core.timer import execution_time
-from core.progress_bar import progress_bar
-from core.save_df_2_excel import save_df_2_excel
 from core.argparser import parse_args
 
+# Тяжёлые зависимости (pandas, SQLAlchemy, openpyxl) импортируются внутри
+# команд, чтобы лёгкие команды из cron запускались быстро
+# (см. core.import_benchmark).
+
+# Версия контрольной точки split_statistics_by_month: 2 — позиция keyset
+# (timestamp и key), 1 — (timestamp, id) таблицы rowid
+SPLIT_CHECKPOINT_VERSION = 2
+
 
 @execution_time
-def split_statistics_by_month(db_path: str):
+def split_statistics_by_month(db_path: str, resume: bool = False):
     """
     Загружает показания счётчиков из тяжелой БД,
     разбивает их по месяцам и сохраняет в отдельные месячные базы данных.
 
     Логика работы:
     - Определяет граничеые временные интервалы.
-    - Загружает данные порциями (пагинация) по N записей.
+    - Загружает данные порциями (keyset-пагинация по timestamp, id);
+    размер порции подбирается по скорости и памяти (core.autotune).
     - Группирует и добавляет статистику в соответствующие месячные БД.
+    - После каждой порции сохраняет позицию в контрольной точке; при
+    resume=True продолжает с сохранённой позиции.
     - Отображает прогресс выполнения.
     """
+    from core.utils import CountersStatisticDB
+    from core.autotune import get_tuner
+    from core.checkpoint import CheckpointStore
+    from core.progress_bar import progress_bar
+
+    job = f'split_statistics_by_month_{os.path.basename(db_path)}'
+    store = CheckpointStore()
     db = CountersStatisticDB(db_path)
+    # Позиция keyset хранится без timestamp (key) и должна подходить к
+    # структуре таблицы (её могли перестроить через --convert_layout)
+    key_size = len(db.keyset_columns) - 1
+
+    def upgrade(state: dict) -> dict | None:
+        # Версия 1 хранила позицию как id таблицы rowid
+        if state.get('version', 1) == 1 and 'id' in state and key_size == 1:
+            return {
+                'timestamp': state['timestamp'],
+                'key': [state['id']],
+                'processed': state['processed'],
+            }
+        return None
+
+    state = (
+        store.load(job, SPLIT_CHECKPOINT_VERSION, upgrade) if resume
+        else None
+    )
+    if state is not None and len(state.get('key', ())) != key_size:
+        print('Контрольная точка не подходит к таблице и не используется.')
+        state = None
+
     start, end = db.border_timestamp
     total = db.count_records(start, dt.datetime.now())
-    step = 100_000
-
-    for index in range(0, total, step):
-        progress_bar(index-1, total, 'Добавление статистики по месяцам: ')
-        page_number = (index // step) + 1
-        statistics = db.get_statistics_by_period(
-            start=start,
+    tuner = get_tuner('split_page')
+
+    after = None
+    processed = 0
+    if state is not None:
+        # Позиция keyset: timestamp и остальные колонки ключа обхода
+        # (id или modem_ip, mac, local_id для кластеризованной таблицы)
+        after = (
+            dt.datetime.fromisoformat(state['timestamp']), *state['key'])
+        processed = state['processed']
+        print(f'Продолжение после записи {after[0]} {list(after[1:])}')
+
+    while True:
+        progress_bar(processed-1, total, 'Добавление статистики по месяцам: ')
+        tuner.start()
+        statistics = db.get_statistics_after(
+            after=after,
             end=end,
-            page_number=page_number,
-            page_size=step
+            page_size=tuner.size
         )
+        if not statistics:
+            break
+
         db.add_statistics_to_monthly_db(statistics)
+        tuner.record(len(statistics))
+        processed += len(statistics)
+        after = db.keyset(statistics[-1])
+        store.save(job, {
+            'timestamp': after[0].isoformat(),
+            'key': list(after[1:]),
+            'processed': processed,
+        }, SPLIT_CHECKPOINT_VERSION)
 
     progress_bar((total-1), total, 'Добавление статистики по месяцам: ')
+    store.clear(job)
 
 
 @execution_time
@@ -59,78 +116,63 @@ def save_counter_statistic(
 
     Логика работы:
     - Удаляет существующий Excel-файл статистики, если он есть.
-    - Подключается к базам данных которые соотв. фильтру по дате.
-    - Загружает данные порциями по N записей с пагинацией.
-    - Преобразует данные в DataFrame и подготавливает к сохранению.
+    - Подключается к базам данных которые соотв. фильтру по дате
+    (заархивированные в .cols месяцы читаются из архива по модему).
+    - Берёт показания модема за завершённые месяцы из кэша экспорта
+    (Config.EXPORT_CACHE_DIR), если БД месяца не менялась; остальные
+    месяцы загружает и подготавливает заново и сохраняет в кэш.
     - Сохраняет каждый набор данных на отдельный лист Excel-файла с именем
     листа, включающим IP и номер страницы.
     - Выводит сообщение о результате сохранения.
     """
-    databases = []
+    from pandas import DataFrame
+    from core.db_files import find_month_sources
+    from core.export_cache import ExportCache
+    from core.progress_bar import progress_bar
+    from core.save_df_2_excel import save_df_2_excel
 
-    for filename in os.listdir(Config.DATA_DIR):
-        if (
-            not filename.startswith(f'{Config.DB_PREFIX}_')
-            or not filename.endswith('.db')
-        ):
-            continue
-
-        parts = filename.replace('.db', '').split('_')
-        if len(parts) < 4:
-            continue
-
-        try:
-            year = int(parts[2])
-            month = int(parts[3])
-            file_date = dt.datetime(year, month, 1)
-        except ValueError:
-            continue
-
-        if start <= file_date <= end:
-            full_path = os.path.join(Config.DATA_DIR, filename)
-            databases.append(full_path)
+    databases = [
+        db_file for db_file in find_month_sources(('.db', '.cols'))
+        if db_file.start <= end and db_file.end > start
+    ]
 
     if os.path.isfile(Config.STATISTIC_PATH):
         os.remove(Config.STATISTIC_PATH)
 
     if not databases:
-        print('Нет подходящих незаархивированных БД для выбранного периода.')
+        print('Нет подходящих БД или архивов .cols для выбранного периода.')
         return
 
     step = 10_000
     page_number = 1
     modem_dates: dict[dt.date, int] = {}
 
-    for index, db_file in enumerate(sorted(databases)):
+    def save_page(df: DataFrame, sheet_prefix: str):
+        nonlocal page_number
+        counts = df['timestamp'].dt.date.value_counts()
+        for date, count in counts.items():
+            modem_dates[date] = modem_dates.get(date, 0) + count
+        sheet_name = f'{sheet_prefix} ({page_number})'
+        save_df_2_excel(df, Config.STATISTIC_PATH, sheet_name)
+        page_number += 1
+
+    cache = ExportCache()
+    cached = 0
+    for index, db_file in enumerate(databases):
         progress_bar(index, len(databases), 'Поиск данных: ')
-        db = CountersStatisticDB(db_file)
-        filename = os.path.basename(db_file)
-        parts = filename.replace('.db', '').split('_')
-        year = int(parts[2])
-        month = int(parts[3])
-        sheet_prefix = f'{year}_{month:02d}'
-
-        while True:
-            statistics = db.get_statistics_by_period(
-                start=start,
-                end=end,
-                page_number=page_number,
-                page_size=step,
-                modem_ip=modem_ip
-            )
-            if not statistics:
-                break
 
-            df = db.prepare_statistics(db.statistics_to_dataframe(statistics))
-            counts = df['timestamp'].dt.date.value_counts()
-            for date, count in counts.items():
-                modem_dates[date] = modem_dates.get(date, 0) + count
-            sheet_name = f'{sheet_prefix} ({page_number})'
-            save_df_2_excel(df, Config.STATISTIC_PATH, sheet_name)
+        # Месяц читается целиком (из .cols — только блоки этого модема) и
+        # кэшируется на диске, затем обрезается по периоду
+        df, from_cache = cache.read_month(db_file, modem_ip)
+        cached += from_cache
+        df = df[df['timestamp'].between(start, end)]
+        for page_start in range(0, len(df), step):
+            save_page(df.iloc[page_start:page_start + step], db_file.label)
 
-            page_number += 1
+    if cached:
+        print(f'Из кэша экспорта взято месяцев: {cached}')
 
-    if statistics or page_number > 1:
+    if page_number > 1:
         print(
             f'Показания счетчика с ip: {modem_ip} '
             f'сохранены: {Config.STATISTIC_PATH}'
@@ -146,39 +188,68 @@ def save_counter_statistic(
 
 
 @execution_time
-def zip_and_remove_old_dbs():
+def zip_and_remove_old_dbs(
+    vacuum: bool = Config.ZIP_VACUUM,
+    workers: int = Config.ZIP_WORKERS,
+    method: str = Config.ZIP_METHOD,
+    level: int | None = Config.ZIP_LEVEL,
+    archive_format: str = Config.ARCHIVE_FORMAT,
+):
     """
     Архивирует базы данных из папки Config.DATA_DIR, имена которых имеют формат
-    Config.PREFIX_YYYY_MM.db и дата которых старше Config.MONTH_AGO
+    Config.PREFIX_YYYY_MM[_шард].db и дата которых старше Config.MONTH_AGO
     месяцев, затем удаляет исходные .db файлы.
+
+    Аргументы:
+        vacuum (bool): Выполнить ANALYZE и VACUUM перед архивацией.
+        workers (int): Количество параллельных процессов архивации.
+        method (str): Метод сжатия (deflate, bzip2, lzma).
+        level (int | None): Уровень сжатия.
+        archive_format (str): zip или columnar — колоночный формат .cols,
+        из которого можно прочитать один модем без распаковки месяца.
+
+    Каждый архив проверяется по CRC перед удалением исходной БД, по каждому
+    месяцу выводится степень сжатия и скорость архивации.
     """
+    from core.archive import zip_dbs
+    from core.db_files import find_monthly_dbs
+
     now = dt.datetime.now()
+    db_paths = []
 
-    for filename in os.listdir(Config.DATA_DIR):
-        if (
-            not filename.startswith(f'{Config.DB_PREFIX}_')
-            or not filename.endswith('.db')
-        ):
-            continue
+    for db_file in find_monthly_dbs():
+        months_diff = (
+            (now.year - db_file.year) * 12 + (now.month - db_file.month))
+        if months_diff > Config.MONTH_AGO:
+            db_paths.append(db_file.path)
 
-        parts = filename[:-3].split('_')
-        if len(parts) < 4:
-            continue
+    zip_dbs(
+        sorted(db_paths), Config.DATA_DIR,
+        workers=workers, method=method, level=level, vacuum=vacuum,
+        archive_format=archive_format
+    )
 
-        try:
-            year = int(parts[2])
-            month = int(parts[3])
-        except ValueError:
-            continue
 
-        months_diff = (now.year - year) * 12 + (now.month - month)
-        if months_diff > Config.MONTH_AGO:
-            db_path = os.path.join(Config.DATA_DIR, filename)
-            CountersStatisticDB.zip_db(db_path, Config.DATA_DIR)
+@execution_time
+def compact_deltas():
+    """
+    Переносит дельта-файлы (поздние строки заархивированных месяцев) в их
+    архивы .zip или .cols; архив пересобирается и заменяется только после
+    проверки.
+    """
+    from core.delta import (
+        compact_deltas as compact_delta_files, print_compact_report
+    )
+
+    reports = compact_delta_files()
+    for report in reports:
+        print_compact_report(report)
+    if not reports:
+        print('Дельта-файлов для переноса нет.')
 
 
 @execution_time
-def statistics_2_db():
+def statistics_2_db(resume: bool = False):
     """
     Загружает данные счётчиков из .csv или .gz файлов в основную базу данных,
     распределяя записи по отдельным месячным БД.
@@ -187,11 +258,46 @@ def statistics_2_db():
     - Создаёт/подключается к основной БД текущего месяца.
     - Ищет не обработанные файлы статистики (файлы, не вошедшие в БД).
     - Читает данные из каждого файла в виде DataFrame.
-    - Разбивает DataFrame на порции по 100 000 записей.
+    - Разбивает DataFrame на порции (размер подбирается по скорости и
+    памяти, см. core.autotune).
     - Каждую порцию преобразует в объекты модели Statistic.
     - Добавляет записи в соответствующие месячные БД, исключая дубликаты.
+    - После каждой порции сохраняет контрольную точку; при resume=True
+    продолжает с неё.
+    """
+    from core.utils import CountersStatisticDB
+
+    CountersStatisticDB().statistics_2_db(resume=resume)
+
+
+@execution_time
+def ingest_worker():
     """
-    CountersStatisticDB().statistics_2_db()
+    Узел распределённой загрузки. Файлы статистики из общего каталога
+    Config.STATISTIC_DIR захватываются через файлы аренды в
+    Config.QUEUE_DIR (аренда продлевается во время загрузки, истёкшую
+    аренду забирает другой узел) и загружаются в промежуточные месячные БД
+    узла. Перенос в основные БД выполняет merge_staging.
+    """
+    from core.work_queue import run_worker
+
+    processed = run_worker()
+    print(f'Загружено файлов: {processed}.')
+
+
+@execution_time
+def merge_staging():
+    """
+    Переносит промежуточные БД всех узлов в основные месячные БД без
+    дубликатов и удаляет перенесённые файлы.
+    """
+    from core.work_queue import merge_staging as merge_staging_dbs
+
+    report = merge_staging_dbs()
+    for filename, added in sorted(report.items()):
+        print(f'БД {filename}: добавлено строк: {added}.')
+    if not report:
+        print('Промежуточных БД для переноса нет.')
 
 
 @execution_time
@@ -218,20 +324,160 @@ def remove_processed_csv_gz():
         os.remove(os.path.join(Config.STATISTIC_DIR, filename))
 
 
+@execution_time
+def coverage(
+    start: dt.datetime,
+    end: dt.datetime,
+    by: str = 'day',
+    modem_ip: str | None = None,
+):
+    """
+    Выводит отчёт о полноте данных: количество записей по модему и дню (или
+    часу) считается GROUP BY внутри каждой месячной БД (месяцы
+    обрабатываются параллельно) и сравнивается с ожидаемым по интервалу
+    опроса Config.SAMPLING_INTERVAL_MINUTES.
+
+    Аргументы:
+        start (datetime): Начало периода.
+        end (datetime): Конец периода.
+        by (str): Группировка: day или hour.
+        modem_ip (str | None): Ограничить отчёт одним модемом.
+    """
+    from core.coverage import (
+        collect_coverage, find_gaps, print_coverage_report
+    )
+
+    records = collect_coverage(start, end, by, modem_ip)
+    if not records:
+        print('В указанный период не найдено ни одной записи.')
+        return
+
+    print_coverage_report(find_gaps(records, start, end, by))
+
+
+@execution_time
+def backfill_decoded():
+    """
+    Добавляет в незаархивированные месячные БД колонки декодированных
+    значений напряжения, тока и углов и заполняет их для уже загруженных
+    строк. После этого экспорт читает числа из БД без декодирования BLOB.
+    Новые строки заполняются при загрузке, если включён
+    Config.STORE_DECODED или колонки уже есть в месячной БД.
+    """
+    from core.db_files import find_monthly_dbs
+    from core.utils import CountersStatisticDB
+
+    for db_file in find_monthly_dbs():
+        db = CountersStatisticDB(db_file.path)
+        try:
+            updated = db.backfill_decoded()
+        finally:
+            db.engine.dispose()
+        print(
+            f'БД {os.path.basename(db_file.path)}: '
+            f'декодировано строк: {updated}.'
+        )
+
+
+@execution_time
+def convert_layout(layout: str):
+    """
+    Перестраивает таблицу statistic всех незаархивированных месячных БД в
+    структуру layout: rowid (исходная) или clustered (WITHOUT ROWID,
+    строки одного модема хранятся рядом). Новые БД создаются со структурой
+    Config.DB_LAYOUT.
+    """
+    from core.db_files import find_monthly_dbs
+    from core.layout import convert_layout as convert_db_layout
+
+    for db_file in find_monthly_dbs():
+        report = convert_db_layout(db_file.path, layout)
+        if report is None:
+            print(f'БД {os.path.basename(db_file.path)} уже {layout}.')
+            continue
+        print(
+            f'БД {report["filename"]} перестроена в {layout}: '
+            f'{report["rows"]} строк, '
+            f'{report["file_size"] / 1024 ** 2:.1f} -> '
+            f'{report["new_size"] / 1024 ** 2:.1f} МБ '
+            f'за {report["seconds"]:.1f} сек.'
+        )
+
+
+@execution_time
+def benchmark_layout():
+    """
+    Сравнивает на копиях последней месячной БД размер файла и время выборки
+    показаний одного модема для структур rowid и clustered.
+    """
+    from core.db_files import find_monthly_dbs
+    from core.layout import benchmark_layout as benchmark_db_layout
+    from core.layout import print_layout_benchmark
+
+    db_files = find_monthly_dbs()
+    if not db_files:
+        print('Месячные БД не найдены.')
+        return
+
+    db_path = db_files[-1].path
+    print_layout_benchmark(db_path, benchmark_db_layout(db_path))
+
+
+@execution_time
+def power_quality(
+    start: dt.datetime,
+    end: dt.datetime,
+    modem_ip: str | None = None,
+):
+    """
+    Сводка качества электроэнергии по модемам за период: среднее, минимум
+    и максимум напряжения и тока по фазам, средний и максимальный небаланс
+    фаз и число событий (провалы и перенапряжения относительно
+    Config.NOMINAL_VOLTAGE, превышения Config.CURRENT_LIMIT). Месячные БД
+    обрабатываются страницами, показатели считаются векторно (NumPy).
+    Полная таблица сохраняется в Config.POWER_QUALITY_PATH.
+
+    Аргументы:
+        start (datetime): Начало периода.
+        end (datetime): Конец периода.
+        modem_ip (str | None): Ограничить сводку одним модемом.
+    """
+    from core.power_quality import (
+        collect_power_quality, print_power_quality_report
+    )
+    from core.save_df_2_excel import save_df_2_excel
+
+    summary = collect_power_quality(start, end, modem_ip).summary()
+    if summary.empty:
+        print('В указанный период не найдено ни одной записи.')
+        return
+
+    print_power_quality_report(summary)
+    if os.path.isfile(Config.POWER_QUALITY_PATH):
+        os.remove(Config.POWER_QUALITY_PATH)
+    save_df_2_excel(summary, Config.POWER_QUALITY_PATH, 'power_quality')
+    print(f'Сводка сохранена: {Config.POWER_QUALITY_PATH}')
+
+
 if __name__ == '__main__':
     args = parse_args()
     logger = FileRotatingLogger(
         Config.LOG_DIR, debug=Config.DEBUG).get_logger()
+    if args.profile:
+        enable_profiling(memory=args.profile_memory)
 
     if args.split_statistics_by_month:
         db_path = r'data/counters_statistics_2025_01.db'
-        split_statistics_by_month(db_path)
+        split_statistics_by_month(db_path, resume=args.resume)
     elif args.save_counter_statistic:
         if not args.modem_ip:
             raise ValueError(
                 'Ошибка: для --save_counter_statistic '
                 'необходимо указать --modem_ip'
             )
+        from dateutil.relativedelta import relativedelta
+        from sqlalchemy.exc import OperationalError
+
         start = dt.datetime.now() - relativedelta(months=Config.MONTH_AGO)
         end = dt.datetime.now()
         modem_ip = args.modem_ip
@@ -239,25 +485,58 @@ if __name__ == '__main__':
             save_counter_statistic(start, end, modem_ip)
         except OperationalError as e:
             if 'database is locked' in str(e):
-                print('База данных занята, пожалуйста, подождите.')
+                print(
+                    'База данных занята дольше '
+                    f'{Config.DB_BUSY_TIMEOUT} сек., повторите позже.'
+                )
             else:
                 raise
     elif args.zip_and_remove_old_dbs:
         try:
-            zip_and_remove_old_dbs()
+            zip_and_remove_old_dbs(
+                vacuum=args.vacuum,
+                workers=args.zip_workers,
+                method=args.zip_method,
+                level=args.zip_level,
+                archive_format=args.archive_format,
+            )
         except Exception:
             logger.exception('Ошибка при архивации БД')
             raise
         else:
             logger.info('Архивация баз данных завершена')
+    elif args.compact_deltas:
+        try:
+            compact_deltas()
+        except Exception:
+            logger.exception('Ошибка при переносе дельта-файлов в архивы')
+            raise
+        else:
+            logger.info('Дельта-файлы перенесены в архивы')
     elif args.statistics_2_db:
         try:
-            statistics_2_db()
+            statistics_2_db(resume=args.resume)
         except Exception:
             logger.exception('Ошибка при добавлении данных в БД')
             raise
         else:
             logger.info('Базы данных с показаниями счётчиков обновлены')
+    elif args.ingest_worker:
+        try:
+            ingest_worker()
+        except Exception:
+            logger.exception('Ошибка узла распределённой загрузки')
+            raise
+        else:
+            logger.info('Узел распределённой загрузки завершил работу')
+    elif args.merge_staging:
+        try:
+            merge_staging()
+        except Exception:
+            logger.exception('Ошибка при переносе промежуточных БД')
+            raise
+        else:
+            logger.info('Промежуточные БД перенесены в основные')
     elif args.remove_processed_csv_gz:
         try:
             remove_processed_csv_gz()
@@ -266,5 +545,44 @@ if __name__ == '__main__':
             raise
         else:
             logger.info('Лишние файлы .csv.gz удалены')
+    elif args.coverage:
+        from dateutil.relativedelta import relativedelta
+
+        end = args.end or dt.datetime.now()
+        start = args.start or end - relativedelta(months=Config.MONTH_AGO)
+        coverage(start, end, by=args.coverage_by, modem_ip=args.modem_ip)
+    elif args.power_quality:
+        from dateutil.relativedelta import relativedelta
+
+        end = args.end or dt.datetime.now()
+        start = args.start or end - relativedelta(months=Config.MONTH_AGO)
+        power_quality(start, end, modem_ip=args.modem_ip)
+    elif args.serve:
+        from core.server import serve
+
+        serve()
+    elif args.backfill_decoded:
+        try:
+            backfill_decoded()
+        except Exception:
+            logger.exception('Ошибка при заполнении декодированных значений')
+            raise
+        else:
+            logger.info('Декодированные значения в БД заполнены')
+    elif args.convert_layout:
+        try:
+            convert_layout(args.convert_layout)
+        except Exception:
+            logger.exception('Ошибка при перестроении таблиц БД')
+            raise
+        else:
+            logger.info('Структура таблиц БД обновлена')
+    elif args.benchmark_layout:
+        benchmark_layout()
+    elif args.benchmark_import_time:
+        from core.import_benchmark import benchmark_import_time
+
+        if not benchmark_import_time():
+            sys.exit(1)
     else:
         print('Не указана команда. Используйте --help для справки.')
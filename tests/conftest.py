@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from core.config import Config  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Каталоги Config во временном каталоге теста."""
+    for name in dir(Config):
+        if name.endswith('_DIR') and name != 'ROOT_DIR':
+            monkeypatch.setattr(Config, name, str(tmp_path / name.lower()))
+            os.makedirs(getattr(Config, name), exist_ok=True)
+    monkeypatch.setattr(Config, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(
+        Config, 'AUTOTUNE_PATH', str(tmp_path / 'autotune.json'))
+    return tmp_path
@@ -0,0 +1,60 @@
+import datetime as dt
+import sqlite3
+
+from core.columnar import COLUMNS
+from core.utils import CountersStatisticDB
+
+
+def statistic_rows(
+    count: int,
+    start: dt.datetime = dt.datetime(2024, 1, 1),
+    modems: int = 3,
+    seed: int = 0,
+) -> list[dict]:
+    """Показания нескольких модемов с пустыми и короткими BLOB."""
+    rows = []
+    for index in range(count):
+        value = bytes([7, index % 256, (index * 7) % 256, seed % 256])
+        rows.append({
+            'timestamp': start + dt.timedelta(minutes=30 * index),
+            'modem_ip': f'10.0.0.{index % modems}',
+            'mac': f'mac{index % 2}',
+            'local_id': index % 4,
+            'voltage_1': value,
+            'current_1': None if index % 5 == 0 else value[1:],
+            'angle_1': b'' if index % 7 == 0 else value,
+            'voltage_2': value, 'current_2': value, 'angle_2': value,
+            'voltage_3': value, 'current_3': value, 'angle_3': value,
+        })
+    return rows
+
+
+def write_db(path: str, rows: list[dict]) -> str:
+    """БД со схемой statistic (Config.DB_LAYOUT) и строками rows."""
+    db = CountersStatisticDB(path)
+    with db.session() as session:
+        session.add_all([db.model(**row) for row in rows])
+        session.commit()
+    db.engine.dispose()
+    return path
+
+
+def as_tuples(rows: list[dict]) -> list[tuple]:
+    return sorted(tuple(row[column] for column in COLUMNS) for row in rows)
+
+
+def read_db(path: str) -> list[tuple]:
+    """Строки таблицы statistic в порядке as_tuples."""
+    connection = sqlite3.connect(path)
+    try:
+        rows = connection.execute(
+            f'SELECT {", ".join(COLUMNS)} FROM statistic').fetchall()
+    finally:
+        connection.close()
+    return sorted(
+        (dt.datetime.fromisoformat(row[0]),) + row[1:] for row in rows)
+
+
+def read_columns(columns: dict[str, list]) -> list[tuple]:
+    """Строки результата ColumnarArchive.read_modem в порядке as_tuples."""
+    return sorted(zip(*(columns[column] for column in COLUMNS)))
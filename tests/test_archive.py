@@ -0,0 +1,50 @@
+import sqlite3
+import zipfile
+
+import pytest
+
+from core.archive import check_zip_level, zip_db
+
+
+def make_db(path):
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute('CREATE TABLE t (x)')
+        connection.executemany(
+            'INSERT INTO t VALUES (?)', [(i,) for i in range(1000)])
+    connection.close()
+
+
+@pytest.mark.parametrize('method, level, archive_format', [
+    ('lzma', 5, 'zip'),
+    ('deflate', 10, 'zip'),
+    ('bzip2', 0, 'columnar'),
+])
+def test_check_zip_level_rejects(method, level, archive_format):
+    with pytest.raises(ValueError):
+        check_zip_level(method, level, archive_format)
+
+
+def test_check_zip_level_accepts():
+    check_zip_level('lzma', 9, 'columnar')
+    check_zip_level('lzma', None, 'zip')
+    check_zip_level('bzip2', 1, 'zip')
+
+
+def test_zip_db_reports_compress_time(tmp_path):
+    db_path = tmp_path / 'counters_statistics_2024_01.db'
+    make_db(db_path)
+    report = zip_db(str(db_path), str(tmp_path), 'bzip2', 1)
+
+    assert not db_path.exists()
+    assert 0 < report['compress_seconds'] <= report['seconds']
+    with zipfile.ZipFile(tmp_path / 'counters_statistics_2024_01.zip') as z:
+        assert z.getinfo(db_path.name).compress_type == zipfile.ZIP_BZIP2
+
+
+def test_zip_db_rejects_lzma_level(tmp_path):
+    db_path = tmp_path / 'counters_statistics_2024_01.db'
+    make_db(db_path)
+    with pytest.raises(ValueError):
+        zip_db(str(db_path), str(tmp_path), 'lzma', 9)
+    assert db_path.exists()
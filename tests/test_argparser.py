@@ -0,0 +1,25 @@
+import sys
+
+import pytest
+
+from core.argparser import parse_args
+
+
+def parse(monkeypatch, *argv: str):
+    monkeypatch.setattr(sys, 'argv', ['counters_statistics.py', *argv])
+    return parse_args()
+
+
+@pytest.mark.parametrize('command', ['--serve', '--benchmark_import_time'])
+def test_profile_is_rejected_for_unprofiled_commands(monkeypatch, command):
+    with pytest.raises(SystemExit):
+        parse(monkeypatch, command, '--profile')
+
+
+def test_profile_memory_requires_profile(monkeypatch):
+    with pytest.raises(SystemExit):
+        parse(monkeypatch, '--statistics_2_db', '--profile_memory')
+
+    args = parse(
+        monkeypatch, '--statistics_2_db', '--profile', '--profile_memory')
+    assert args.profile and args.profile_memory
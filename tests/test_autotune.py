@@ -0,0 +1,100 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from core import autotune
+from core.autotune import BatchTuner
+from core.config import Config
+
+
+@pytest.fixture
+def rss(data_dir, monkeypatch):
+    """Подменённый RSS процесса: rss['value'] в байтах."""
+    value = {'value': 0}
+    monkeypatch.setattr(autotune, 'current_rss', lambda: value['value'])
+    monkeypatch.setattr(autotune, 'peak_rss', lambda: None)
+    return value
+
+
+def run_batch(
+    tuner: BatchTuner, rss: dict, rows: int, seconds: float,
+    bytes_per_row: int = 0,
+):
+    tuner.start()
+    tuner._start_time = time.perf_counter() - seconds
+    rss['value'] += rows * bytes_per_row
+    tuner.record(rows)
+
+
+def saved_state(name: str) -> dict:
+    with open(Config.AUTOTUNE_PATH, encoding='utf-8') as file:
+        return json.load(file)[socket.gethostname()][name]
+
+
+def test_memory_budget_counts_only_batch_growth(rss):
+    # Процесс уже больше бюджета: прочитан большой файл
+    rss['value'] = 10 * 1024 ** 3
+    tuner = BatchTuner('test', 500, 10, 100_000, memory_budget=100_000)
+
+    run_batch(tuner, rss, 500, 1.0, bytes_per_row=100)
+
+    assert tuner.state['bytes_per_row'] == 100
+    assert tuner.size == 1_000
+    assert tuner.state['best_size'] == 500
+
+
+def test_bytes_per_row_follows_recent_batches(rss):
+    tuner = BatchTuner('test', 500, 10, 100_000, memory_budget=10 ** 9)
+
+    run_batch(tuner, rss, 500, 1.0, bytes_per_row=1_000)
+    for _ in range(10):
+        run_batch(tuner, rss, tuner.size, 1.0, bytes_per_row=10)
+
+    assert tuner.state['bytes_per_row'] < 100
+
+
+def test_small_batches_are_tuned_and_saved(rss):
+    tuner = BatchTuner('test', 10_000, 10, 100_000)
+
+    for _ in range(autotune.SHORT_BATCHES):
+        run_batch(tuner, rss, 300, 0.1)
+
+    assert tuner.size < 300
+    assert saved_state('test')['size'] == tuner.size
+
+    run_batch(tuner, rss, tuner.size, 0.1)
+    assert tuner.state['best_speed'] > 0
+
+
+def test_settled_size_is_tuned_again_after_drift(rss):
+    tuner = BatchTuner('test', 1_000, 10, 100_000)
+    tuner.state.update(settled=True, best_size=1_000, best_speed=10_000)
+
+    for _ in range(autotune.DRIFT_BATCHES - 1):
+        run_batch(tuner, rss, 1_000, 1.0)
+    assert tuner.state['settled']
+
+    run_batch(tuner, rss, 1_000, 1.0)
+    assert not tuner.state['settled']
+    assert tuner.state['best_speed'] == pytest.approx(1_000, rel=0.1)
+    assert tuner.size == 2_000
+
+
+def test_concurrent_saves_keep_every_tuner(data_dir):
+    def save(thread: int):
+        for index in range(20):
+            autotune._save_state(f'tuner_{thread}_{index}', {'size': index})
+
+    threads = [
+        threading.Thread(target=save, args=(thread,)) for thread in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(Config.AUTOTUNE_PATH, encoding='utf-8') as file:
+        assert len(json.load(file)[socket.gethostname()]) == 160
@@ -0,0 +1,35 @@
+import datetime as dt
+
+import pandas as pd
+
+from core.utils import CountersStatisticDB
+from tests.helpers import statistic_rows, write_db
+
+
+def read_month(path: str) -> pd.DataFrame:
+    db = CountersStatisticDB(path)
+    try:
+        return db.get_statistics_dataframe(
+            dt.datetime(2024, 1, 1), dt.datetime(2024, 2, 1))
+    finally:
+        db.engine.dispose()
+
+
+def test_backfill_is_idempotent(data_dir):
+    rows = statistic_rows(200)
+    # Недекодируемые значения напряжения: NULL, пустое и короткое
+    for row, value in zip(rows, [None, b'', b'\x07\x01', b'\x01\x02']):
+        row['voltage_1'] = value
+    path = write_db(str(data_dir / 'counters_statistics_2024_01.db'), rows)
+    expected = read_month(path)
+
+    db = CountersStatisticDB(path)
+    try:
+        assert db.backfill_decoded(page_size=30) == len(rows)
+        assert db.backfill_decoded(page_size=30) == 0
+    finally:
+        db.engine.dispose()
+
+    result = read_month(path)
+    pd.testing.assert_frame_equal(result, expected)
+    assert result['decimal_voltage_1_1'].iloc[:4].isna().all()
@@ -0,0 +1,134 @@
+import datetime as dt
+import glob
+import json
+import os
+import sqlite3
+
+import pytest
+
+import counters_statistics
+from core import autotune
+from core.checkpoint import CheckpointStore
+from core.models import Statistic
+from core.utils import CountersStatisticDB
+
+ROWS = 1000
+PAGE = 100
+JOB = 'split_statistics_by_month_big.sqlite'
+
+
+@pytest.fixture
+def source_db(data_dir, monkeypatch):
+    """Тяжёлая БД за два месяца и страницы разбиения по PAGE строк."""
+    monkeypatch.setitem(autotune.BATCH_LIMITS, 'split_page', (PAGE,) * 3)
+    monkeypatch.setattr(autotune, '_tuners', {})
+    path = str(data_dir / 'big.sqlite')
+    db = CountersStatisticDB(path)
+    with db.session() as session:
+        session.add_all([
+            Statistic(
+                timestamp=dt.datetime(2024, 1, 20) + dt.timedelta(hours=i),
+                modem_ip=f'10.0.0.{i % 5}',
+                mac='mac',
+                local_id=i % 3,
+                voltage_1=b'\x07\x01\x02\x03',
+            )
+            for i in range(ROWS)
+        ])
+        session.commit()
+    db.engine.dispose()
+    return path
+
+
+def monthly_rows(data_dir) -> list[tuple]:
+    rows = []
+    pattern = str(data_dir / 'counters_statistics_*.db')
+    for path in sorted(glob.glob(pattern)):
+        connection = sqlite3.connect(path)
+        rows += connection.execute(
+            'SELECT timestamp, modem_ip, local_id FROM statistic').fetchall()
+        connection.close()
+    return rows
+
+
+def fail_after(monkeypatch, calls: int):
+    original = CountersStatisticDB.add_statistics_to_monthly_db
+    counter = {'calls': 0}
+
+    def add(self, statistics):
+        counter['calls'] += 1
+        if counter['calls'] > calls:
+            raise RuntimeError('сбой')
+        return original(self, statistics)
+
+    monkeypatch.setattr(
+        CountersStatisticDB, 'add_statistics_to_monthly_db', add)
+    return original
+
+
+def test_store_versions(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    store.save('job', {'a': 1}, version=2)
+
+    assert store.load('job', version=2) == {'a': 1, 'version': 2}
+    assert store.load('job', version=3) is None
+    assert store.load(
+        'job', version=3, upgrade=lambda state: {'a': state['a'] + 1}
+    ) == {'a': 2, 'version': 3}
+
+    with open(store.path('broken'), 'w') as file:
+        file.write('{')
+    assert store.load('broken') is None
+
+
+def test_split_resumes_after_crash(source_db, data_dir, monkeypatch):
+    original = fail_after(monkeypatch, 3)
+    with pytest.raises(RuntimeError):
+        counters_statistics.split_statistics_by_month(source_db)
+
+    state = CheckpointStore().load(JOB, version=2)
+    assert state['processed'] == 3 * PAGE
+    assert len(monthly_rows(data_dir)) == 3 * PAGE
+
+    resumed = []
+
+    def add(self, statistics):
+        resumed.append(len(statistics))
+        return original(self, statistics)
+
+    monkeypatch.setattr(
+        CountersStatisticDB, 'add_statistics_to_monthly_db', add)
+    counters_statistics.split_statistics_by_month(source_db, resume=True)
+
+    assert sum(resumed) == ROWS - 3 * PAGE
+    rows = monthly_rows(data_dir)
+    assert len(rows) == len(set(rows)) == ROWS
+    assert not os.path.exists(CheckpointStore().path(JOB))
+
+
+def test_split_resumes_from_version_1_checkpoint(source_db, data_dir):
+    db = CountersStatisticDB(source_db)
+    last = db.get_statistics_after(page_size=PAGE)[-1]
+    db.engine.dispose()
+    os.makedirs(CheckpointStore().checkpoint_dir, exist_ok=True)
+    with open(CheckpointStore().path(JOB), 'w') as file:
+        json.dump({
+            'timestamp': last.timestamp.isoformat(),
+            'id': last.id,
+            'processed': PAGE,
+        }, file)
+
+    counters_statistics.split_statistics_by_month(source_db, resume=True)
+
+    assert len(monthly_rows(data_dir)) == ROWS - PAGE
+
+
+def test_split_discards_unknown_checkpoint(source_db, data_dir, capsys):
+    os.makedirs(CheckpointStore().checkpoint_dir, exist_ok=True)
+    with open(CheckpointStore().path(JOB), 'w') as file:
+        json.dump({'version': 99, 'position': 'x'}, file)
+
+    counters_statistics.split_statistics_by_month(source_db, resume=True)
+
+    assert 'неизвестном формате' in capsys.readouterr().out
+    assert len(monthly_rows(data_dir)) == ROWS
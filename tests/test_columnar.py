@@ -0,0 +1,69 @@
+import datetime as dt
+import os
+
+import pytest
+
+from core.columnar import ColumnarArchive, columnar_db, write_columnar
+from tests.helpers import (
+    as_tuples, read_columns, read_db, statistic_rows, write_db
+)
+
+
+@pytest.fixture
+def month_db(tmp_path):
+    rows = statistic_rows(500)
+    path = write_db(str(tmp_path / 'counters_statistics_2024_01.db'), rows)
+    return path, rows
+
+
+@pytest.mark.parametrize('method', ['deflate', 'bzip2', 'lzma'])
+def test_round_trip(month_db, tmp_path, method):
+    path, rows = month_db
+    expected = read_db(path)
+    assert expected == as_tuples(rows)
+    cols_path = str(tmp_path / 'counters_statistics_2024_01.cols')
+
+    assert write_columnar(path, cols_path, method, chunk_rows=40) == len(rows)
+
+    archive = ColumnarArchive(cols_path)
+    assert archive.method == method
+    assert archive.rows == archive.verify() == len(rows)
+    assert archive.modems() == ['10.0.0.0', '10.0.0.1', '10.0.0.2']
+    assert len(archive.index['10.0.0.0']) > 1
+    result = []
+    for _, columns in archive.iter_modems():
+        result += read_columns(columns)
+    assert sorted(result) == expected
+
+
+def test_read_modem_period(month_db, tmp_path):
+    path, rows = month_db
+    report = columnar_db(path, str(tmp_path), 'deflate')
+    assert report['file_size'] > 0 and not os.path.exists(path)
+    archive = ColumnarArchive(
+        str(tmp_path / 'counters_statistics_2024_01.cols'))
+
+    start = dt.datetime(2024, 1, 3)
+    end = dt.datetime(2024, 1, 5, 12)
+    expected = as_tuples([
+        row for row in rows
+        if row['modem_ip'] == '10.0.0.1' and start <= row['timestamp'] <= end
+    ])
+
+    assert read_columns(archive.read_modem('10.0.0.1', start, end)) == expected
+    assert read_columns(archive.read_modem('10.9.9.9')) == []
+
+
+def test_corrupted_chunk_is_detected(month_db, tmp_path):
+    path, _ = month_db
+    columnar_db(path, str(tmp_path), 'deflate')
+    cols_path = tmp_path / 'counters_statistics_2024_01.cols'
+    archive = ColumnarArchive(str(cols_path))
+    chunk = archive.index['10.0.0.0'][0]
+
+    data = bytearray(cols_path.read_bytes())
+    data[chunk['offset']] ^= 0xFF
+    cols_path.write_bytes(bytes(data))
+
+    with pytest.raises(ValueError):
+        ColumnarArchive(str(cols_path)).read_modem('10.0.0.0')
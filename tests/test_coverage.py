@@ -0,0 +1,74 @@
+import datetime as dt
+
+from core.coverage import collect_coverage, expected_periods, find_gaps
+from tests.helpers import write_db
+
+START = dt.datetime(2024, 1, 1)
+END = dt.datetime(2024, 1, 5)
+
+
+def polled_rows(modem_ip: str, skip) -> list[dict]:
+    """
+    Опрос двух счётчиков модема каждые 30 мин. с START до END, кроме
+    моментов, для которых skip(timestamp) истинно.
+    """
+    rows = []
+    timestamp = START
+    while timestamp < END:
+        if not skip(timestamp):
+            for local_id in (1, 2):
+                rows.append({
+                    'timestamp': timestamp,
+                    'modem_ip': modem_ip,
+                    'mac': 'mac',
+                    'local_id': local_id,
+                    'voltage_1': b'\x07\x00\x59\xd8',
+                })
+        timestamp += dt.timedelta(minutes=30)
+    return rows
+
+
+def write_month(data_dir):
+    rows = polled_rows(
+        '10.0.0.1',
+        lambda timestamp: timestamp.day == 2 or (
+            timestamp.day == 3 and timestamp.hour == 10),
+    ) + polled_rows('10.0.0.2', lambda timestamp: False)
+    write_db(str(data_dir / 'counters_statistics_2024_01.db'), rows)
+
+
+def test_expected_periods_cut_partial_days():
+    expected = expected_periods(
+        dt.datetime(2024, 1, 1, 12), dt.datetime(2024, 1, 3), 'day')
+    assert expected == {'2024-01-01': 24.0, '2024-01-02': 48.0}
+
+
+def test_missing_day_and_hour_are_reported(data_dir):
+    write_month(data_dir)
+
+    by_day = find_gaps(
+        collect_coverage(START, END, 'day', workers=1), START, END, 'day')
+    assert [(row[0], row[2], row[4]) for row in by_day] == [
+        ('10.0.0.1', 2, [('2024-01-02', '2024-01-02', 0.0)]),
+        ('10.0.0.2', 2, []),
+    ]
+    assert by_day[0][1] == 2 * (48 * 3 - 2)
+    assert by_day[1][3] == 1.0
+
+    by_hour = find_gaps(
+        collect_coverage(START, END, 'hour', workers=1), START, END, 'hour')
+    assert by_hour[0][4] == [
+        ('2024-01-02 00', '2024-01-02 23', 0.0),
+        ('2024-01-03 10', '2024-01-03 10', 0.0),
+    ]
+    assert by_hour[1][4] == []
+
+
+def test_coverage_filters_by_modem(data_dir):
+    write_month(data_dir)
+
+    coverage = collect_coverage(
+        START, END, 'day', modem_ip='10.0.0.2', workers=1)
+
+    assert list(coverage) == ['10.0.0.2']
+    assert coverage['10.0.0.2']['2024-01-04'] == (96, 2)
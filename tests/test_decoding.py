@@ -0,0 +1,61 @@
+import random
+
+import pandas as pd
+import pytest
+
+from core.decoding import (
+    DECODED_COLUMNS, decode_bytes_column, decode_statistics,
+    pack_statistics, unpack_statistics,
+)
+from core.utils import CountersStatisticDB
+
+
+def random_values(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    values = [None, b'', b'\x07', b'\x07\x01\x02', b'\x01\x02']
+    for _ in range(count):
+        value = bytes(rng.randrange(256) for _ in range(rng.randrange(7)))
+        if rng.random() < 0.5:
+            value = b'\x07' + value
+        values.append(value)
+    return values
+
+
+def expected(value) -> tuple:
+    return CountersStatisticDB._bytes_to_float(None, value)
+
+
+def actual(components: list[pd.Series], index: int) -> tuple:
+    return tuple(
+        None if pd.isna(series.iloc[index]) else int(series.iloc[index])
+        for series in components
+    )
+
+
+@pytest.mark.parametrize('as_hex', [False, True])
+def test_decode_bytes_column_matches_bytes_to_float(as_hex):
+    values = random_values(2000)
+    if as_hex:
+        values = [
+            value.hex() if isinstance(value, bytes) else value
+            for value in values
+        ]
+    components = decode_bytes_column(pd.Series(values, dtype=object))
+
+    for index, value in enumerate(values):
+        assert actual(components, index) == expected(value), value
+
+
+def test_unpack_statistics_matches_decode_statistics():
+    columns = [name[len('decoded_'):] for name in DECODED_COLUMNS]
+    df = pd.DataFrame({
+        column: pd.Series(random_values(300, seed), dtype=object)
+        for seed, column in enumerate(columns)
+    })
+    packed = pack_statistics(df)
+    # Часть строк без сохранённого значения декодируется из BLOB
+    packed.iloc[::3] = pd.NA
+
+    result = unpack_statistics(pd.concat([df, packed], axis=1))
+
+    pd.testing.assert_frame_equal(result, decode_statistics(df))
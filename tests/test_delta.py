@@ -0,0 +1,92 @@
+import datetime as dt
+import os
+import zipfile
+
+import pytest
+
+from core.archive import unzip_db, zip_db
+from core.columnar import ColumnarArchive, write_columnar
+from core.config import Config
+from core.db_files import delta_path, find_monthly_dbs
+from core.delta import compact_delta, compact_deltas, read_modem_rows
+from core.models import Statistic
+from core.utils import CountersStatisticDB
+from tests.helpers import as_tuples, read_columns, read_db, statistic_rows, \
+    write_db
+
+START = dt.datetime(2024, 1, 1)
+LATE = START + dt.timedelta(days=20)
+
+
+@pytest.fixture
+def month_path(data_dir, monkeypatch):
+    monkeypatch.setattr(Config, 'DB_PARTITION', 'month')
+    # Уровень 0 не подходит bzip2: пересборка не должна на нём падать
+    monkeypatch.setattr(Config, 'ZIP_METHOD', 'deflate')
+    monkeypatch.setattr(Config, 'ZIP_LEVEL', 0)
+    return str(data_dir / 'counters_statistics_2024_01.db')
+
+
+def test_late_rows_of_zipped_month_keep_zip_method(data_dir, month_path):
+    rows = statistic_rows(40)
+    late_rows = statistic_rows(10, LATE, seed=1)
+    write_db(month_path, rows)
+    zip_db(month_path, str(data_dir), 'bzip2', None, False)
+    zip_path = month_path[:-len('.db')] + '.zip'
+    zip_mtime = os.path.getmtime(zip_path)
+
+    CountersStatisticDB().add_statistics_to_monthly_db(
+        [Statistic(**row) for row in late_rows])
+
+    assert read_db(delta_path(month_path)) == as_tuples(late_rows)
+    assert os.path.getmtime(zip_path) == zip_mtime
+
+    reports = compact_deltas(str(data_dir))
+    assert [report['rows'] for report in reports] == [10]
+    assert not os.path.exists(delta_path(month_path))
+    with zipfile.ZipFile(zip_path) as zipf:
+        assert zipf.infolist()[0].compress_type == zipfile.ZIP_BZIP2
+
+    unzip_dir = str(data_dir / 'unzip')
+    unzip_db(zip_path, unzip_dir)
+    assert read_db(os.path.join(unzip_dir, os.path.basename(month_path))) \
+        == as_tuples(rows + late_rows)
+
+
+def test_delta_is_folded_on_unzip(data_dir, month_path):
+    rows = statistic_rows(30)
+    late_rows = statistic_rows(5, LATE, seed=1)
+    write_db(month_path, rows)
+    zip_db(month_path, str(data_dir), 'deflate', None, False)
+    write_db(delta_path(month_path), late_rows)
+
+    CountersStatisticDB(month_path[:-len('.db')] + '.zip').engine.dispose()
+
+    assert read_db(month_path) == as_tuples(rows + late_rows)
+    assert not os.path.exists(delta_path(month_path))
+
+
+def test_columnar_delta_is_read_and_compacted(data_dir, month_path):
+    rows = statistic_rows(60)
+    # Первая строка дельты уже есть в архиве
+    late_rows = rows[:1] + statistic_rows(8, LATE, seed=1)
+    cols_path = month_path[:-len('.db')] + '.cols'
+    write_db(month_path, rows)
+    write_columnar(month_path, cols_path, 'bzip2')
+    os.remove(month_path)
+    write_db(delta_path(cols_path), late_rows)
+
+    db_file = find_monthly_dbs(str(data_dir), ('.cols',))[0]
+    modem_ip = rows[0]['modem_ip']
+    expected = as_tuples([
+        row for row in rows + late_rows[1:] if row['modem_ip'] == modem_ip])
+    assert read_columns(read_modem_rows(db_file, modem_ip)) == expected
+
+    report = compact_delta(delta_path(cols_path))
+    assert report['rows'] == 8
+    assert not os.path.exists(delta_path(cols_path))
+
+    archive = ColumnarArchive(cols_path)
+    assert archive.method == 'bzip2'
+    assert archive.rows == 68
+    assert read_columns(read_modem_rows(db_file, modem_ip)) == expected
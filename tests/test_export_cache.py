@@ -0,0 +1,125 @@
+import os
+import sqlite3
+
+import pandas as pd
+
+from core.columnar import write_columnar
+from core.db_files import delta_path, find_monthly_dbs
+from core.export_cache import ENTRY_SUFFIX, ExportCache
+from core.utils import CountersStatisticDB
+from tests.helpers import statistic_rows, write_db
+
+MODEM_IP = '10.0.0.1'
+
+
+def month_file(data_dir, rows: list[dict], extension: str = '.db'):
+    path = write_db(str(data_dir / 'counters_statistics_2024_01.db'), rows)
+    if extension == '.cols':
+        write_columnar(path, path[:-len('.db')] + '.cols')
+        os.remove(path)
+    return find_monthly_dbs(str(data_dir), (extension,))[0]
+
+
+def entries(cache: ExportCache) -> list[str]:
+    return [
+        filename for filename in os.listdir(cache.cache_dir)
+        if filename.endswith(ENTRY_SUFFIX)
+    ]
+
+
+def add_row(path: str, row: dict):
+    connection = sqlite3.connect(path)
+    try:
+        with connection:
+            connection.execute(
+                f'INSERT INTO statistic ({", ".join(row)}) '
+                f'VALUES ({", ".join("?" * len(row))})',
+                [
+                    value.strftime('%Y-%m-%d %H:%M:%S.%f')
+                    if column == 'timestamp' else value
+                    for column, value in row.items()
+                ]
+            )
+    finally:
+        connection.close()
+
+
+def test_cache_hit_returns_uncached_frame(data_dir):
+    db_file = month_file(data_dir, statistic_rows(90))
+    cache = ExportCache()
+
+    df, from_cache = cache.read_month(db_file, MODEM_IP)
+    cached, from_cache_again = cache.read_month(db_file, MODEM_IP)
+
+    assert not from_cache and from_cache_again
+    assert len(df) == 30
+    pd.testing.assert_frame_equal(cached, df)
+    assert len(entries(cache)) == 1
+
+
+def test_write_to_month_invalidates_entry(data_dir):
+    rows = statistic_rows(90)
+    db_file = month_file(data_dir, rows)
+    cache = ExportCache()
+    cache.read_month(db_file, MODEM_IP)
+
+    late_row = dict(rows[1], timestamp=rows[-1]['timestamp'].replace(day=30))
+    add_row(db_file.path, late_row)
+    df, from_cache = cache.read_month(db_file, MODEM_IP)
+
+    assert not from_cache
+    assert len(df) == 31
+    assert len(entries(cache)) == 1
+
+
+def test_new_delta_invalidates_columnar_entry(data_dir):
+    rows = statistic_rows(90)
+    db_file = month_file(data_dir, rows, '.cols')
+    cache = ExportCache()
+    cache.read_month(db_file, MODEM_IP)
+
+    late_rows = statistic_rows(6, rows[-1]['timestamp'].replace(day=30))
+    write_db(delta_path(db_file.path), late_rows)
+    df, from_cache = cache.read_month(db_file, MODEM_IP)
+
+    assert not from_cache
+    assert len(df) == 32
+    assert cache.read_month(db_file, MODEM_IP)[1]
+    assert len(entries(cache)) == 1
+
+
+def test_entry_is_not_saved_if_month_changes_during_read(
+    data_dir, monkeypatch
+):
+    rows = statistic_rows(90)
+    db_file = month_file(data_dir, rows)
+    cache = ExportCache()
+    read = CountersStatisticDB.get_statistics_dataframe
+
+    def read_and_write(self, *args, **kwargs):
+        df = read(self, *args, **kwargs)
+        add_row(db_file.path, dict(
+            rows[1], timestamp=rows[-1]['timestamp'].replace(day=30)))
+        return df
+
+    monkeypatch.setattr(
+        CountersStatisticDB, 'get_statistics_dataframe', read_and_write)
+    df, from_cache = cache.read_month(db_file, MODEM_IP)
+
+    assert not from_cache and len(df) == 30
+    assert entries(cache) == []
+
+
+def test_evict_removes_least_recently_read(data_dir):
+    cache = ExportCache(str(data_dir / 'cache'), max_size=250)
+    for index in range(5):
+        path = os.path.join(cache.cache_dir, f'{index}{ENTRY_SUFFIX}')
+        with open(path, 'wb') as file:
+            file.write(b'x' * 100)
+        # Запись 0 прочитана последней
+        mtime = 2_000_000_000 if index == 0 else 1_000_000_000 + index
+        os.utime(path, (mtime, mtime))
+
+    cache.evict()
+
+    assert sorted(entries(cache)) == [f'0{ENTRY_SUFFIX}', f'4{ENTRY_SUFFIX}']
@@ -0,0 +1,12 @@
+import pytest
+
+from core.import_benchmark import (
+    HEAVY_MODULES, LIGHTWEIGHT_COMMANDS, measure_command
+)
+
+
+@pytest.mark.parametrize('command', LIGHTWEIGHT_COMMANDS)
+def test_lightweight_command_skips_heavy_modules(command):
+    _, modules = measure_command(command)
+    heavy = {module.split('.')[0] for module in modules} & set(HEAVY_MODULES)
+    assert not heavy
@@ -0,0 +1,88 @@
+import os
+import sqlite3
+import threading
+
+from core import layout
+from core.layout import benchmark_layout, convert_layout, detect_layout
+from core.lock import db_lock
+from core.utils import CountersStatisticDB
+from tests.helpers import as_tuples, read_db, statistic_rows, write_db
+
+
+def table_schema(path: str) -> tuple[str, list[str]]:
+    """SQL таблицы statistic и колонки её первичного ключа."""
+    connection = sqlite3.connect(path)
+    try:
+        sql, = connection.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'statistic'"
+        ).fetchone()
+        key = [
+            row[1] for row in sorted(
+                connection.execute('PRAGMA table_info(statistic)'),
+                key=lambda row: row[5])
+            if row[5]
+        ]
+    finally:
+        connection.close()
+    return sql, key
+
+
+def assert_no_wal(path: str):
+    for suffix in ('-wal', '-shm', '.tmp'):
+        assert not os.path.exists(path + suffix), suffix
+
+
+def test_convert_layout_round_trip(data_dir):
+    rows = statistic_rows(120)
+    path = write_db(str(data_dir / 'counters_statistics_2024_01.db'), rows)
+    db = CountersStatisticDB(path)
+    try:
+        db.backfill_decoded()
+    finally:
+        db.engine.dispose()
+
+    report = convert_layout(path, 'clustered')
+    assert report['rows'] == len(rows)
+    sql, key = table_schema(path)
+    assert 'WITHOUT ROWID' in sql
+    assert key == ['modem_ip', 'mac', 'local_id', 'timestamp']
+    assert 'decoded_voltage_1' in sql
+    assert read_db(path) == as_tuples(rows)
+    assert_no_wal(path)
+    assert convert_layout(path, 'clustered') is None
+
+    report = convert_layout(path, 'rowid')
+    assert report['rows'] == len(rows)
+    sql, key = table_schema(path)
+    assert 'WITHOUT ROWID' not in sql
+    assert key == ['id']
+    assert detect_layout(path) == 'rowid'
+    assert read_db(path) == as_tuples(rows)
+    assert_no_wal(path)
+
+
+def test_benchmark_does_not_lock_month_while_timing(data_dir, monkeypatch):
+    path = write_db(
+        str(data_dir / 'counters_statistics_2024_01.db'), statistic_rows(60))
+    time_queries = layout._time_modem_queries
+    locked = []
+
+    def try_lock():
+        try:
+            with db_lock(path, timeout=0.5, retry_interval=0.05):
+                locked.append(True)
+        except TimeoutError:
+            locked.append(False)
+
+    def timed(*args):
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        return time_queries(*args)
+
+    monkeypatch.setattr(layout, '_time_modem_queries', timed)
+    results = benchmark_layout(path, repeat=1)
+
+    assert [row[0] for row in results] == ['rowid', 'clustered']
+    assert locked and all(locked)
+    assert read_db(path) == as_tuples(statistic_rows(60))
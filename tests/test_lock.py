@@ -0,0 +1,41 @@
+import threading
+
+from core.lock import DBLockTimeoutError, db_lock
+
+
+def lock_in_thread(path: str) -> bool:
+    """Удалось ли другому потоку захватить блокировку path."""
+    acquired = []
+
+    def target():
+        try:
+            with db_lock(path, timeout=0.2, retry_interval=0.05):
+                acquired.append(True)
+        except DBLockTimeoutError:
+            pass
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    return bool(acquired)
+
+
+def test_lock_is_reentrant_in_same_thread(tmp_path):
+    path = str(tmp_path / 'counters_statistics_2024_01.db')
+    with db_lock(path, timeout=0.1):
+        with db_lock(path, timeout=0.1):
+            pass
+
+
+def test_lock_blocks_other_thread(tmp_path):
+    path = str(tmp_path / 'counters_statistics_2024_01.db')
+    with db_lock(path):
+        assert not lock_in_thread(path)
+    assert lock_in_thread(path)
+
+
+def test_lock_shared_by_month_files(tmp_path):
+    stem = str(tmp_path / 'counters_statistics_2024_01')
+    with db_lock(stem + '.db'):
+        assert not lock_in_thread(stem + '.delta.db')
+        assert not lock_in_thread(stem + '.zip')
@@ -0,0 +1,47 @@
+import datetime as dt
+
+import pytest
+
+from core.autotune import BatchTuner
+from core.columnar import COLUMNS
+from core.config import Config
+from core.utils import CountersStatisticDB
+from tests.helpers import as_tuples, statistic_rows, write_db
+
+
+def tied_rows(count: int) -> list[dict]:
+    """Показания, у которых по 5 строк приходится на один timestamp."""
+    rows = statistic_rows(count)
+    for index, row in enumerate(rows):
+        row['timestamp'] = dt.datetime(2024, 1, 1) + dt.timedelta(
+            minutes=30 * (index // 5))
+    return rows
+
+
+@pytest.mark.parametrize('layout', ['rowid', 'clustered'])
+def test_pages_keep_rows_with_tied_timestamps(data_dir, monkeypatch, layout):
+    monkeypatch.setattr(Config, 'DB_LAYOUT', layout)
+    rows = tied_rows(53)
+    path = write_db(str(data_dir / 'counters_statistics_2024_01.db'), rows)
+    # Размер страницы меняется между страницами
+    tuner = BatchTuner('test', 3, 2, 7, enabled=False)
+    sizes = iter([3, 7, 2, 4] * 20)
+
+    def start():
+        tuner.state['size'] = next(sizes)
+
+    monkeypatch.setattr(tuner, 'start', start)
+
+    db = CountersStatisticDB(path)
+    try:
+        pages = list(db.iter_statistics_pages(
+            dt.datetime(2024, 1, 1), dt.datetime(2024, 2, 1), tuner=tuner))
+    finally:
+        db.engine.dispose()
+
+    result = [
+        tuple(getattr(row, column) for column in COLUMNS)
+        for page in pages for row in page.itertuples(index=False)
+    ]
+    assert sorted(result) == as_tuples(rows)
+    assert len(pages) > 10
@@ -0,0 +1,48 @@
+import datetime as dt
+import os
+
+from core.config import Config
+from core.models import Statistic
+from core.utils import CountersStatisticDB
+from tests.helpers import read_db, statistic_rows, write_db
+
+
+def test_db_without_path_creates_no_files(data_dir, monkeypatch):
+    monkeypatch.setattr(Config, 'DB_PARTITION', 'day')
+    before = sorted(os.listdir(data_dir))
+
+    db = CountersStatisticDB()
+    assert db.data_not_in_db() == []
+
+    assert sorted(os.listdir(data_dir)) == before
+
+
+def test_ingest_keeps_writing_to_month_file(data_dir, monkeypatch):
+    monkeypatch.setattr(Config, 'DB_PARTITION', 'day')
+    now = dt.datetime.now()
+    start = dt.datetime(now.year, now.month, 1)
+    month_path = write_db(
+        str(data_dir / f'counters_statistics_{now:%Y_%m}.db'),
+        statistic_rows(10, start))
+    rows = statistic_rows(20, start + dt.timedelta(hours=5), seed=1)
+
+    CountersStatisticDB().add_statistics_to_monthly_db(
+        [Statistic(**row) for row in rows])
+
+    assert len(read_db(month_path)) == 30
+    assert not [
+        filename for filename in os.listdir(data_dir)
+        if filename.startswith(f'counters_statistics_{now:%Y_%m}_')
+        and filename.endswith('.db')
+    ]
+
+
+def test_ingest_creates_shard_for_new_period(data_dir, monkeypatch):
+    monkeypatch.setattr(Config, 'DB_PARTITION', 'day')
+    rows = statistic_rows(5, dt.datetime(2030, 3, 7))
+
+    CountersStatisticDB().add_statistics_to_monthly_db(
+        [Statistic(**row) for row in rows])
+
+    assert len(read_db(
+        str(data_dir / 'counters_statistics_2030_03_07.db'))) == 5
@@ -0,0 +1,122 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.config import Config
+from core.decoding import PHASES
+from core.power_quality import EVENTS, collect_power_quality, imbalance, \
+    measurement_values
+from core.utils import CountersStatisticDB
+from tests.helpers import write_db
+
+START = dt.datetime(2024, 1, 30)
+MEASUREMENTS = {'voltage': 100, 'current': 1000}
+
+
+def encode(value: float, scale: int) -> bytes:
+    """BLOB ответа счётчика: старший, младший и средний байты."""
+    number = round(value * scale)
+    return bytes([number >> 16, number & 255, (number >> 8) & 255])
+
+
+def meter_rows(count: int, seed: int = 0) -> list[dict]:
+    """
+    Показания двух модемов по два счётчика с общими timestamp: напряжение
+    вокруг номинала с провалами и перенапряжениями, ток с превышениями и
+    пропущенные значения.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for index in range(count):
+        row = {
+            'timestamp': START + dt.timedelta(minutes=30 * (index // 4)),
+            'modem_ip': f'10.0.0.{index % 2}',
+            'mac': f'mac{index // 2 % 2}',
+            'local_id': 1,
+        }
+        for phase in PHASES:
+            row[f'voltage_{phase}'] = encode(rng.uniform(195, 265), 100)
+            row[f'current_{phase}'] = encode(rng.uniform(0, 130), 1000)
+            row[f'angle_{phase}'] = encode(rng.uniform(0, 360), 100)
+        if index % 11 == 0:
+            row[f'voltage_{PHASES[index % 3]}'] = None
+        rows.append(row)
+    return rows
+
+
+def expected_summary(rows: list[dict]) -> dict[str, dict]:
+    """Показатели по всем строкам сразу, без страниц (pandas)."""
+    df = CountersStatisticDB.prepare_statistics(
+        pd.DataFrame(rows), drop_duplicates=False)
+    df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    values = {
+        measurement: measurement_values(df, measurement)
+        for measurement in MEASUREMENTS
+    }
+    voltage, current = values['voltage'], values['current']
+    flags = pd.DataFrame({
+        'sag': (voltage < Config.NOMINAL_VOLTAGE * Config.VOLTAGE_SAG).any(
+            axis=1),
+        'swell': (voltage > Config.NOMINAL_VOLTAGE * Config.VOLTAGE_SWELL)
+        .any(axis=1),
+        'overcurrent': (current > Config.CURRENT_LIMIT).any(axis=1),
+    })
+    meters = df.groupby(['modem_ip', 'mac', 'local_id']).ngroup()
+    crossings = flags & ~flags.groupby(meters).shift(fill_value=False)
+
+    result = {}
+    for modem_ip, group in df.groupby('modem_ip'):
+        index = group.index.to_numpy()
+        stats = {
+            'records': len(group),
+            'meters': len(group[['mac', 'local_id']].drop_duplicates()),
+        }
+        for measurement, measured in values.items():
+            phases = pd.DataFrame(measured[index])
+            for column, phase in enumerate(PHASES):
+                stats[f'{measurement}_mean_{phase}'] = phases[column].mean()
+                stats[f'{measurement}_min_{phase}'] = phases[column].min()
+                stats[f'{measurement}_max_{phase}'] = phases[column].max()
+            ratio = pd.Series(imbalance(measured[index]))
+            stats[f'{measurement}_imbalance_mean'] = ratio.mean()
+            stats[f'{measurement}_imbalance_max'] = ratio.max()
+        for event in EVENTS:
+            stats[event] = int(crossings.loc[index, event].sum())
+        result[modem_ip] = stats
+    return result
+
+
+def test_paged_stats_match_single_pass(data_dir):
+    rows = meter_rows(400)
+    # Строки расходятся по двум месяцам, а страницы месяца — по 7 строк
+    january = [row for row in rows if row['timestamp'].month == 1]
+    february = [row for row in rows if row['timestamp'].month == 2]
+    write_db(str(data_dir / 'counters_statistics_2024_01.db'), january)
+    write_db(str(data_dir / 'counters_statistics_2024_02.db'), february)
+    assert january and february
+
+    summary = collect_power_quality(
+        START, dt.datetime(2024, 3, 1), page_size=7).summary()
+
+    expected = expected_summary(rows)
+    assert list(summary['modem_ip']) == sorted(expected)
+    for row in summary.to_dict('records'):
+        stats = expected[row['modem_ip']]
+        assert sum(stats[event] for event in EVENTS) > 0
+        for name, value in stats.items():
+            assert row[name] == pytest.approx(value, abs=0.01), name
+
+
+def test_imbalance_skips_missing_phase():
+    values = np.array([
+        [220.0, 230.0, 240.0],
+        [230.0, np.nan, 230.0],
+        [0.0, 0.0, 0.0],
+    ])
+
+    result = imbalance(values)
+
+    assert result[0] == pytest.approx(20 / 230 * 100)
+    assert np.isnan(result[1:]).all()
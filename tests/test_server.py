@@ -0,0 +1,81 @@
+import datetime as dt
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from core import server
+from core.db_files import MonthlyDBFile
+from core.models import Statistic
+from core.server import StatisticsRequestHandler, StatisticsService
+from core.utils import CountersStatisticDB
+
+
+@pytest.fixture
+def month_file(data_dir) -> MonthlyDBFile:
+    """БД текущего месяца (держится в пуле движков) с одной строкой."""
+    now = dt.datetime.now()
+    path = str(data_dir / f'counters_statistics_{now:%Y_%m}.db')
+    db = CountersStatisticDB(path)
+    with db.session() as session:
+        session.add(Statistic(
+            timestamp=now.replace(day=1), modem_ip='10.0.0.1', mac='mac',
+            local_id=1, voltage_1=b'\x07\x01\x02\x03',
+        ))
+        session.commit()
+    db.engine.dispose()
+    return MonthlyDBFile(path, now.year, now.month, '.db')
+
+
+def missing_file(data_dir) -> MonthlyDBFile:
+    path = str(data_dir / 'counters_statistics_2024_01.db')
+    return MonthlyDBFile(path, 2024, 1, '.db')
+
+
+def test_get_db_does_not_create_missing_file(data_dir):
+    db_file = missing_file(data_dir)
+    with pytest.raises(FileNotFoundError):
+        StatisticsService().get_db(db_file)
+    assert not os.path.exists(db_file.path)
+
+
+def test_get_db_refreshes_decoded_columns(month_file):
+    service = StatisticsService()
+    assert not service.get_db(month_file).has_decoded
+
+    CountersStatisticDB(month_file.path).backfill_decoded()
+
+    db = service.get_db(month_file)
+    assert db.has_decoded
+    df = service.query_month(month_file, '10.0.0.1', None)
+    assert df['decimal_voltage_1_1'].tolist() == [1]
+
+
+def test_missing_month_returns_404(data_dir, monkeypatch):
+    monkeypatch.setattr(
+        server, 'find_month_sources', lambda extensions: [
+            missing_file(data_dir)])
+    handler = type(
+        'Handler', (StatisticsRequestHandler,),
+        {'service': StatisticsService()}
+    )
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = (
+            f'http://127.0.0.1:{http_server.server_port}/statistics'
+            '?modem_ip=10.0.0.1&start=2024-01-01&end=2024-01-31'
+        )
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url)
+        assert error.value.code == 404
+        assert 'error' in json.loads(error.value.read())
+    finally:
+        http_server.shutdown()
+        http_server.server_close()
+    assert not os.path.exists(missing_file(data_dir).path)
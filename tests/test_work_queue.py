@@ -0,0 +1,137 @@
+import datetime as dt
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import pytest
+
+from core.config import Config
+from core.db_files import find_monthly_dbs
+from core.work_queue import LeaseLostError, WorkQueue, merge_staging, \
+    run_worker
+from tests.helpers import read_db
+
+WORKERS = 4
+SOURCES = 6
+ROWS_PER_SOURCE = 300
+
+
+def write_csv(path: str, day: dt.date, rows: int) -> list[tuple]:
+    """Файл статистики за день; возвращает ключи записанных строк."""
+    keys = []
+    with open(path, 'w') as file:
+        for index in range(rows):
+            timestamp = dt.datetime.combine(day, dt.time()) + dt.timedelta(
+                seconds=index * 60)
+            file.write(f'T:{timestamp:%d.%m.%Y_%H:%M:%S}\n')
+            modem_ip = f'10.0.0.{index % 5}'
+            values = ','.join(['0a0b0c0d'] * 9)
+            file.write(f'D:{modem_ip},mac,1,{values}\n')
+            keys.append((timestamp, modem_ip))
+    return keys
+
+
+def expired_lease(queue: WorkQueue, source_path: str):
+    """Аренда «упавшего» узла со сроком в прошлом."""
+    with open(queue.lease_path(source_path), 'w') as file:
+        json.dump({
+            'source': source_path, 'worker': 'dead', 'expires': 0,
+        }, file)
+
+
+def _claim(queue_dir: str, worker_id: str, source_path: str, start: float):
+    time.sleep(max(0.0, start - time.time()))
+    lease = WorkQueue(queue_dir, worker_id, ttl=30).claim(source_path)
+    sys.exit(0 if lease is not None else 1)
+
+
+def _work(queue_dir: str, worker_id: str):
+    run_worker(WorkQueue(queue_dir, worker_id, ttl=1))
+
+
+@pytest.fixture
+def fork():
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        pytest.skip('нужен fork: Config подменяется в процессе теста')
+    return multiprocessing.get_context('fork')
+
+
+def test_expired_lease_is_taken_over_by_one_worker(data_dir, fork):
+    queue_dir = str(data_dir / 'queue')
+    source_path = os.path.join(Config.STATISTIC_DIR, '2024-01-01.csv')
+    queue = WorkQueue(queue_dir, 'main')
+
+    for _ in range(5):
+        expired_lease(queue, source_path)
+        start = time.time() + 0.3
+        processes = [
+            fork.Process(
+                target=_claim,
+                args=(queue_dir, f'w{index}', source_path, start))
+            for index in range(WORKERS * 2)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        assert [process.exitcode for process in processes].count(0) == 1
+        os.remove(queue.lease_path(source_path))
+
+
+def test_lost_lease_is_not_renewed_or_released(data_dir):
+    queue_dir = str(data_dir / 'queue')
+    source_path = os.path.join(Config.STATISTIC_DIR, '2024-01-01.csv')
+
+    old = WorkQueue(queue_dir, 'old', ttl=0.2).claim(source_path)
+    assert WorkQueue(queue_dir, 'other', ttl=0.2).claim(source_path) is None
+    time.sleep(0.3)
+    with pytest.raises(LeaseLostError):
+        old.check()
+
+    new = WorkQueue(queue_dir, 'new', ttl=30).claim(source_path)
+    assert new is not None
+    with pytest.raises(LeaseLostError):
+        old.renew()
+    old.release()
+    assert new.is_owned()
+    new.renew()
+    new.release()
+    assert not os.path.exists(new.path)
+
+
+def test_workers_merge_every_source_once(data_dir, fork):
+    queue_dir = str(data_dir / 'queue')
+    queue = WorkQueue(queue_dir, 'main')
+    first_day = dt.date.today().replace(day=1)
+
+    keys = []
+    for index in range(SOURCES):
+        day = first_day + dt.timedelta(days=index)
+        source_path = os.path.join(Config.STATISTIC_DIR, f'{day}.csv')
+        keys += write_csv(source_path, day, ROWS_PER_SOURCE)
+        # Все узлы одновременно перехватывают аренды упавшего узла
+        expired_lease(queue, source_path)
+
+    processes = [
+        fork.Process(target=_work, args=(queue_dir, f'w{index}'))
+        for index in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    merge_staging(queue)
+
+    merged = []
+    for db_file in find_monthly_dbs(Config.DATA_DIR):
+        merged += [(row[0], row[1]) for row in read_db(db_file.path)]
+    assert sorted(merged) == sorted(keys)
+    for filename in os.listdir(Config.STATISTIC_DIR):
+        source_path = os.path.join(Config.STATISTIC_DIR, filename)
+        assert queue.is_done(source_path)
+        assert not os.path.exists(queue.lease_path(source_path))